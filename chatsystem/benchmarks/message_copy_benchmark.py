@@ -0,0 +1,87 @@
+"""
+Allocations of the delivery and replication paths, deep copies versus views
+
+delivery: an INSERT change delivered with its previous_message_id, as a deep
+copy of the stored message or as a message_view overlay
+replication: a received message kept for log_message, as a deep copy that is
+encoded later or as the payload encoded up front
+
+run from the chatsystem directory:
+    python -m benchmarks.message_copy_benchmark -messages 100000
+"""
+import argparse
+import copy
+import json
+import time
+import tracemalloc
+
+from server.storage.utils import message_view
+
+
+def make_message(i):
+    return {
+        'group_id': 'group',
+        'user_id': f'user{i % 10}',
+        'creation_time': 1_700_000_000_000_000 + i,
+        'text': [f'message number {i} ' * 4],
+        'message_id': format(i, '016x'),
+        'likes': {f'user{j}': 1 for j in range(i % 5)},
+        'message_type': 'new',
+        'vector_timestamp': {str(j): i for j in range(1, 6)},
+        'server_id': '1',
+        'server_time': 1_700_000_000_000_000 + i,
+    }
+
+
+def deliver_copy(message, previous_message_id):
+    message = copy.deepcopy(message)
+    message['previous_message_id'] = previous_message_id
+    return message
+
+
+def deliver_view(message, previous_message_id):
+    return message_view(message, previous_message_id=previous_message_id)
+
+
+def replicate_copy(message):
+    message_copy = copy.deepcopy(message)
+    return json.dumps(message_copy).encode('utf-8')
+
+
+def replicate_encode(message):
+    return json.dumps(message).encode('utf-8')
+
+
+def measure(function, messages, *args):
+    """
+    returns (seconds, peak bytes allocated while all results are alive)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = [function(message, *args) for message in messages]
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return seconds, peak
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark of message copies on the delivery and replication paths")
+    parser.add_argument('-messages', type=int, default=100_000, help='Messages delivered / replicated')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    messages = [make_message(i) for i in range(args.messages)]
+    print(f"{args.messages} messages")
+    print("path\tvariant\tseconds\tpeak MB")
+    for path, variant, function, extra in (
+        ('delivery', 'deepcopy', deliver_copy, ('previous',)),
+        ('delivery', 'view', deliver_view, ('previous',)),
+        ('replication', 'deepcopy', replicate_copy, ()),
+        ('replication', 'encode', replicate_encode, ()),
+    ):
+        seconds, peak = measure(function, messages, *extra)
+        print(f"{path}\t{variant}\t{seconds:.3f}\t{peak / 2**20:.1f}")
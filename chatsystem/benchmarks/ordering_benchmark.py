@@ -0,0 +1,65 @@
+"""
+Out of order insert throughput of a group's message ordering, list versus BlockList
+
+the insert position is found the way Datastore.binary_search finds it,
+index lookups for the list and BlockList.bisect for the BlockList
+
+run from the chatsystem directory:
+    python -m benchmarks.ordering_benchmark -messages 1000000 -inserts 100000
+"""
+import argparse
+import random
+import time
+
+import server.constants as C
+from server.storage.block_list import BlockList
+
+
+def binary_search(sequence, key):
+    if isinstance(sequence, BlockList):
+        return sequence.bisect(lambda item: key < item)
+    left = 0
+    right = len(sequence)
+    while left < right:
+        mid = (left + right) // 2
+        if key < sequence[mid]:
+            right = mid
+        else:
+            left = mid + 1
+    return left
+
+
+def run(sequence, num_messages, inserts, tail_window):
+    """
+    appends num_messages even keys, then inserts odd keys placed in the last
+    tail_window positions (0 = anywhere), returns (append seconds, insert seconds)
+    """
+    start = time.perf_counter()
+    for i in range(num_messages):
+        sequence.append(2 * i)
+    appended = time.perf_counter()
+    rng = random.Random(0)
+    low = 0 if not tail_window else max(0, num_messages - tail_window)
+    for _ in range(inserts):
+        key = 2 * rng.randrange(low, num_messages) + 1
+        sequence.insert(binary_search(sequence, key), key)
+    return appended - start, time.perf_counter() - appended
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark of out of order inserts into the message ordering")
+    parser.add_argument('-messages', type=int, default=1_000_000, help='Messages already in the group')
+    parser.add_argument('-inserts', type=int, default=100_000, help='Out of order messages inserted')
+    parser.add_argument('-tail_window', type=int, default=0, help='Insert only among the last N messages, 0 for anywhere')
+    parser.add_argument('-block_size', type=int, default=C.BLOCK_LIST_BLOCK_SIZE)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    print(f"{args.messages} messages, {args.inserts} out of order inserts")
+    print("structure\tappend s\tinsert s\tinserts/s")
+    for name, sequence in (('list', []), ('BlockList', BlockList(block_size=args.block_size))):
+        append_seconds, insert_seconds = run(sequence, args.messages, args.inserts, args.tail_window)
+        assert all(sequence[i] <= sequence[i + 1] for i in range(0, len(sequence) - 1, 997))
+        print(f"{name}\t{append_seconds:.3f}\t{insert_seconds:.3f}\t{args.inserts / insert_seconds:.0f}")
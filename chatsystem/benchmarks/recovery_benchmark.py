@@ -0,0 +1,88 @@
+"""
+Recovery time versus number of worker processes on a synthetic data directory
+
+run from the chatsystem directory:
+    python -m benchmarks.recovery_benchmark -groups 200 -messages 500
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import server.constants as C
+from server.storage.file_manager import FileManager
+from server.storage.data_store import Datastore
+
+
+def build_data_dir(root, num_groups, messages_per_group, record_format):
+    file_manager = FileManager(root)
+    data_store = Datastore(file_manager, server_id='1', record_format=record_format, lazy_recovery=True, message_storage=C.MESSAGE_STORAGE_MEMORY)
+    clock = 0
+    for i in range(messages_per_group):
+        for g in range(num_groups):
+            clock += 1
+            vector_timestamp = {server_id: 0 for server_id in C.SERVER_IDS}
+            vector_timestamp['1'] = clock
+            data_store.save_message({
+                'group_id': f'group{g}',
+                'user_id': f'user{i % 7}',
+                'creation_time': clock,
+                'text': [f'message {i} of group {g}'],
+                'message_id': f'group{g}-{i}',
+                'likes': {},
+                'message_type': C.NEW,
+                'server_id': '1',
+                'vector_timestamp': vector_timestamp
+            })
+            # every fourth message gets liked once
+            if i % 4 == 0:
+                clock += 1
+                updated_timestamp = dict(vector_timestamp, **{'1': clock})
+                data_store.save_message({
+                    'group_id': f'group{g}',
+                    'user_id': f'user{(i + 1) % 7}',
+                    'creation_time': clock,
+                    'message_id': f'group{g}-{i}',
+                    'likes': {f'user{(i + 1) % 7}': 1},
+                    'message_type': C.LIKE_COMMANDS[0],
+                    'server_id': '1',
+                    'vector_timestamp': vector_timestamp,
+                    'vector_timestamp_2': updated_timestamp,
+                    'updated_time': clock
+                })
+    file_manager.close()
+
+
+def time_recovery(root, workers):
+    start = time.perf_counter()
+    file_manager = FileManager(root)
+    data_store = Datastore(file_manager, server_id='1', lazy_recovery=False, recovery_workers=workers, message_storage=C.MESSAGE_STORAGE_MEMORY)
+    elapsed = time.perf_counter() - start
+    file_manager.close()
+    return elapsed, len(data_store.messages.keys())
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark of parallel recovery")
+    parser.add_argument('-groups', type=int, default=200, help='Number of groups')
+    parser.add_argument('-messages', type=int, default=500, help='Messages per group')
+    parser.add_argument('-format', type=str, default=C.RECORD_FORMAT, choices=[C.RECORD_FORMAT_TEXT, C.RECORD_FORMAT_BINARY])
+    parser.add_argument('-max_workers', type=int, default=os.cpu_count() or 1)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    root = tempfile.mkdtemp(prefix='chat_recovery_benchmark')
+    try:
+        build_data_dir(root, args.groups, args.messages, args.format)
+        print(f"{args.groups} groups x {args.messages} messages, {args.format} format")
+        print("workers\tseconds\tmessages")
+        workers = 1
+        while workers <= args.max_workers:
+            elapsed, count = time_recovery(root, workers)
+            print(f"{workers}\t{elapsed:.3f}\t{count}")
+            workers *= 2
+    finally:
+        shutil.rmtree(root)
@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11\x63hat_system.proto\x12\nchatsystem\"\x0e\n\x0c\x42lankMessage\"\xc7\x02\n\x0bPingMessage\x12\x11\n\tserver_id\x18\x01 \x01(\t\x12\x17\n\x0fstart_timestamp\x18\x02 \x01(\x03\x12H\n\x11server_timestamps\x18\x03 \x03(\x0b\x32-.chatsystem.PingMessage.ServerTimestampsEntry\x12<\n\x0bserver_view\x18\x04 \x03(\x0b\x32\'.chatsystem.PingMessage.ServerViewEntry\x12\x18\n\x10replay_server_id\x18\x05 \x01(\t\x1a\x37\n\x15ServerTimestampsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\x1a\x31\n\x0fServerViewEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x08:\x02\x38\x01\"#\n\rActiveSession\x12\x12\n\nsession_id\x18\x01 \x01(\t\"C\n\x06Status\x12\x0e\n\x06status\x18\x01 \x01(\x08\x12\x15\n\rstatusMessage\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\"Y\n\x05Group\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x19\n\x11message_start_idx\x18\x03 \x01(\x05\x12\x12\n\nsession_id\x18\x04 \x01(\t\"?\n\x0cGroupDetails\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\r\n\x05users\x18\x02 \x03(\t\x12\x0e\n\x06status\x18\x03 \x01(\x08\"+\n\x04User\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nsession_id\x18\x02 \x01(\t\"\x84\x02\n\x07Message\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x15\n\rcreation_time\x18\x03 \x01(\x04\x12\x0c\n\x04text\x18\x04 \x03(\t\x12\x12\n\nmessage_id\x18\x05 \x01(\t\x12-\n\x05likes\x18\x07 \x03(\x0b\x32\x1e.chatsystem.Message.LikesEntry\x12\x14\n\x0cmessage_type\x18\x06 \x01(\t\x12\x1b\n\x13previous_message_id\x18\x08 \x01(\t\x12\r\n\x05users\x18\t \x03(\t\x1a,\n\nLikesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"\xec\x04\n\rServerMessage\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x15\n\rcreation_time\x18\x03 \x01(\x04\x12\x0c\n\x04text\x18\x04 \x03(\t\x12\x12\n\nmessage_id\x18\x05 \x01(\t\x12\x33\n\x05likes\x18\x07 \x03(\x0b\x32$.chatsystem.ServerMessage.LikesEntry\x12\x14\n\x0cmessage_type\x18\x06 \x01(\t\x12H\n\x10vector_timestamp\x18\x08 \x03(\x0b\x32..chatsystem.ServerMessage.VectorTimestampEntry\x12\x12\n\nevent_type\x18\t \x01(\t\x12\r\n\x05users\x18\n \x03(\t\x12\x11\n\tserver_id\x18\x0b \x01(\t\x12\x1d\n\x15\x64\x65stination_server_id\x18\x0c \x01(\t\x12K\n\x12vector_timestamp_2\x18\r \x03(\x0b\x32/.chatsystem.ServerMessage.VectorTimestamp2Entry\x12\x14\n\x0cupdated_time\x18\x0e \x01(\x04\x12\x13\n\x0bserver_time\x18\x0f \x01(\x04\x1a,\n\nLikesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\x1a\x36\n\x14VectorTimestampEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\x1a\x37\n\x15VectorTimestamp2Entry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\x32\xdd\x04\n\nChatServer\x12\x31\n\x07GetUser\x12\x10.chatsystem.User\x1a\x12.chatsystem.Status\"\x00\x12\x34\n\nLogoutUser\x12\x10.chatsystem.User\x1a\x12.chatsystem.Status\"\x00\x12\x39\n\x08GetGroup\x12\x11.chatsystem.Group\x1a\x18.chatsystem.GroupDetails\"\x00\x12\x34\n\tExitGroup\x12\x11.chatsystem.Group\x1a\x12.chatsystem.Status\"\x00\x12\x39\n\x0bGetMessages\x12\x11.chatsystem.Group\x1a\x13.chatsystem.Message\"\x00\x30\x01\x12\x38\n\x0bPostMessage\x12\x13.chatsystem.Message\x1a\x12.chatsystem.Status\"\x00\x12\x35\n\x04Ping\x12\x17.chatsystem.PingMessage\x1a\x12.chatsystem.Status\"\x00\x12@\n\x0bHealthCheck\x12\x19.chatsystem.ActiveSession\x1a\x12.chatsystem.Status\"\x00(\x01\x12\x46\n\x13SyncMessagetoServer\x12\x19.chatsystem.ServerMessage\x1a\x12.chatsystem.Status\"\x00\x12?\n\rGetServerView\x12\x18.chatsystem.BlankMessage\x1a\x12.chatsystem.Status\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11\x63hat_system.proto\x12\nchatsystem\"\x0e\n\x0c\x42lankMessage\"\xc7\x02\n\x0bPingMessage\x12\x11\n\tserver_id\x18\x01 \x01(\t\x12\x17\n\x0fstart_timestamp\x18\x02 \x01(\x03\x12H\n\x11server_timestamps\x18\x03 \x03(\x0b\x32-.chatsystem.PingMessage.ServerTimestampsEntry\x12<\n\x0bserver_view\x18\x04 \x03(\x0b\x32\'.chatsystem.PingMessage.ServerViewEntry\x12\x18\n\x10replay_server_id\x18\x05 \x01(\t\x1a\x37\n\x15ServerTimestampsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\x1a\x31\n\x0fServerViewEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x08:\x02\x38\x01\"#\n\rActiveSession\x12\x12\n\nsession_id\x18\x01 \x01(\t\"C\n\x06Status\x12\x0e\n\x06status\x18\x01 \x01(\x08\x12\x15\n\rstatusMessage\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\"u\n\x05Group\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x19\n\x11message_start_idx\x18\x03 \x01(\x05\x12\x12\n\nsession_id\x18\x04 \x01(\t\x12\x1a\n\x12membership_version\x18\x05 \x01(\x04\"[\n\x0cGroupDetails\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\r\n\x05users\x18\x02 \x03(\t\x12\x0e\n\x06status\x18\x03 \x01(\x08\x12\x1a\n\x12membership_version\x18\x04 \x01(\x04\"+\n\x04User\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nsession_id\x18\x02 \x01(\t\"\xca\x02\n\x07Message\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x15\n\rcreation_time\x18\x03 \x01(\x04\x12\x0c\n\x04text\x18\x04 \x03(\t\x12\x12\n\nmessage_id\x18\x05 \x01(\t\x12-\n\x05likes\x18\x07 \x03(\x0b\x32\x1e.chatsystem.Message.LikesEntry\x12\x14\n\x0cmessage_type\x18\x06 \x01(\t\x12\x1b\n\x13previous_message_id\x18\x08 \x01(\t\x12\r\n\x05users\x18\t \x03(\t\x12\x14\n\x0cusers_joined\x18\n \x03(\t\x12\x12\n\nusers_left\x18\x0b \x03(\t\x12\x1a\n\x12membership_version\x18\x0c \x01(\x04\x1a,\n\nLikesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"}\n\x0eHistoryRequest\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\x12\x0e\n\x06\x63ursor\x18\x04 \x01(\t\x12\x11\n\tpage_size\x18\x05 \x01(\x05\x12\x11\n\tdirection\x18\x06 \x01(\t\"`\n\x0bHistoryPage\x12%\n\x08messages\x18\x01 \x03(\x0b\x32\x13.chatsystem.Message\x12\x14\n\x0colder_cursor\x18\x02 \x01(\t\x12\x14\n\x0cnewer_cursor\x18\x03 \x01(\t\"\x88\x05\n\rServerMessage\x12\x10\n\x08group_id\x18\x01 \x01(\t\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x15\n\rcreation_time\x18\x03 \x01(\x04\x12\x0c\n\x04text\x18\x04 \x03(\t\x12\x12\n\nmessage_id\x18\x05 \x01(\t\x12\x33\n\x05likes\x18\x07 \x03(\x0b\x32$.chatsystem.ServerMessage.LikesEntry\x12\x14\n\x0cmessage_type\x18\x06 \x01(\t\x12H\n\x10vector_timestamp\x18\x08 \x03(\x0b\x32..chatsystem.ServerMessage.VectorTimestampEntry\x12\x12\n\nevent_type\x18\t \x01(\t\x12\r\n\x05users\x18\n \x03(\t\x12\x11\n\tserver_id\x18\x0b \x01(\t\x12\x1d\n\x15\x64\x65stination_server_id\x18\x0c \x01(\t\x12K\n\x12vector_timestamp_2\x18\r \x03(\x0b\x32/.chatsystem.ServerMessage.VectorTimestamp2Entry\x12\x14\n\x0cupdated_time\x18\x0e \x01(\x04\x12\x13\n\x0bserver_time\x18\x0f \x01(\x04\x12\x0b\n\x03hlc\x18\x10 \x01(\x04\x12\r\n\x05hlc_2\x18\x11 \x01(\x04\x1a,\n\nLikesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\x1a\x36\n\x14VectorTimestampEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\x1a\x37\n\x15VectorTimestamp2Entry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"A\n\x12ServerMessageBatch\x12+\n\x08messages\x18\x01 \x03(\x0b\x32\x19.chatsystem.ServerMessage2\xf0\x05\n\nChatServer\x12\x31\n\x07GetUser\x12\x10.chatsystem.User\x1a\x12.chatsystem.Status\"\x00\x12\x34\n\nLogoutUser\x12\x10.chatsystem.User\x1a\x12.chatsystem.Status\"\x00\x12\x39\n\x08GetGroup\x12\x11.chatsystem.Group\x1a\x18.chatsystem.GroupDetails\"\x00\x12\x34\n\tExitGroup\x12\x11.chatsystem.Group\x1a\x12.chatsystem.Status\"\x00\x12\x39\n\x0bGetMessages\x12\x11.chatsystem.Group\x1a\x13.chatsystem.Message\"\x00\x30\x01\x12\x43\n\nGetHistory\x12\x1a.chatsystem.HistoryRequest\x1a\x17.chatsystem.HistoryPage\"\x00\x12\x38\n\x0bPostMessage\x12\x13.chatsystem.Message\x1a\x12.chatsystem.Status\"\x00\x12\x35\n\x04Ping\x12\x17.chatsystem.PingMessage\x1a\x12.chatsystem.Status\"\x00\x12@\n\x0bHealthCheck\x12\x19.chatsystem.ActiveSession\x1a\x12.chatsystem.Status\"\x00(\x01\x12\x46\n\x13SyncMessagetoServer\x12\x19.chatsystem.ServerMessage\x1a\x12.chatsystem.Status\"\x00\x12L\n\x14SyncMessagesToServer\x12\x1e.chatsystem.ServerMessageBatch\x1a\x12.chatsystem.Status\"\x00\x12?\n\rGetServerView\x12\x18.chatsystem.BlankMessage\x1a\x12.chatsystem.Status\"\x00\x62\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'chat_system_pb2', globals())
@@ -45,23 +45,29 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _STATUS._serialized_start=416
   _STATUS._serialized_end=483
   _GROUP._serialized_start=485
-  _GROUP._serialized_end=574
-  _GROUPDETAILS._serialized_start=576
-  _GROUPDETAILS._serialized_end=639
-  _USER._serialized_start=641
-  _USER._serialized_end=684
-  _MESSAGE._serialized_start=687
-  _MESSAGE._serialized_end=947
-  _MESSAGE_LIKESENTRY._serialized_start=903
-  _MESSAGE_LIKESENTRY._serialized_end=947
-  _SERVERMESSAGE._serialized_start=950
-  _SERVERMESSAGE._serialized_end=1570
-  _SERVERMESSAGE_LIKESENTRY._serialized_start=903
-  _SERVERMESSAGE_LIKESENTRY._serialized_end=947
-  _SERVERMESSAGE_VECTORTIMESTAMPENTRY._serialized_start=1459
-  _SERVERMESSAGE_VECTORTIMESTAMPENTRY._serialized_end=1513
-  _SERVERMESSAGE_VECTORTIMESTAMP2ENTRY._serialized_start=1515
-  _SERVERMESSAGE_VECTORTIMESTAMP2ENTRY._serialized_end=1570
-  _CHATSERVER._serialized_start=1573
-  _CHATSERVER._serialized_end=2178
+  _GROUP._serialized_end=602
+  _GROUPDETAILS._serialized_start=604
+  _GROUPDETAILS._serialized_end=695
+  _USER._serialized_start=697
+  _USER._serialized_end=740
+  _MESSAGE._serialized_start=743
+  _MESSAGE._serialized_end=1073
+  _MESSAGE_LIKESENTRY._serialized_start=1029
+  _MESSAGE_LIKESENTRY._serialized_end=1073
+  _HISTORYREQUEST._serialized_start=1075
+  _HISTORYREQUEST._serialized_end=1200
+  _HISTORYPAGE._serialized_start=1202
+  _HISTORYPAGE._serialized_end=1298
+  _SERVERMESSAGE._serialized_start=1301
+  _SERVERMESSAGE._serialized_end=1949
+  _SERVERMESSAGE_LIKESENTRY._serialized_start=1029
+  _SERVERMESSAGE_LIKESENTRY._serialized_end=1073
+  _SERVERMESSAGE_VECTORTIMESTAMPENTRY._serialized_start=1838
+  _SERVERMESSAGE_VECTORTIMESTAMPENTRY._serialized_end=1892
+  _SERVERMESSAGE_VECTORTIMESTAMP2ENTRY._serialized_start=1894
+  _SERVERMESSAGE_VECTORTIMESTAMP2ENTRY._serialized_end=1949
+  _SERVERMESSAGEBATCH._serialized_start=1951
+  _SERVERMESSAGEBATCH._serialized_end=2016
+  _CHATSERVER._serialized_start=2019
+  _CHATSERVER._serialized_end=2771
 # @@protoc_insertion_point(module_scope)
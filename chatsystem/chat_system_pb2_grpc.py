@@ -41,6 +41,11 @@ class ChatServerStub(object):
                 request_serializer=chat__system__pb2.Group.SerializeToString,
                 response_deserializer=chat__system__pb2.Message.FromString,
                 )
+        self.GetHistory = channel.unary_unary(
+                '/chatsystem.ChatServer/GetHistory',
+                request_serializer=chat__system__pb2.HistoryRequest.SerializeToString,
+                response_deserializer=chat__system__pb2.HistoryPage.FromString,
+                )
         self.PostMessage = channel.unary_unary(
                 '/chatsystem.ChatServer/PostMessage',
                 request_serializer=chat__system__pb2.Message.SerializeToString,
@@ -61,6 +66,11 @@ class ChatServerStub(object):
                 request_serializer=chat__system__pb2.ServerMessage.SerializeToString,
                 response_deserializer=chat__system__pb2.Status.FromString,
                 )
+        self.SyncMessagesToServer = channel.unary_unary(
+                '/chatsystem.ChatServer/SyncMessagesToServer',
+                request_serializer=chat__system__pb2.ServerMessageBatch.SerializeToString,
+                response_deserializer=chat__system__pb2.Status.FromString,
+                )
         self.GetServerView = channel.unary_unary(
                 '/chatsystem.ChatServer/GetServerView',
                 request_serializer=chat__system__pb2.BlankMessage.SerializeToString,
@@ -103,6 +113,12 @@ class ChatServerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetHistory(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def PostMessage(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -127,6 +143,12 @@ class ChatServerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SyncMessagesToServer(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GetServerView(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -161,6 +183,11 @@ def add_ChatServerServicer_to_server(servicer, server):
                     request_deserializer=chat__system__pb2.Group.FromString,
                     response_serializer=chat__system__pb2.Message.SerializeToString,
             ),
+            'GetHistory': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetHistory,
+                    request_deserializer=chat__system__pb2.HistoryRequest.FromString,
+                    response_serializer=chat__system__pb2.HistoryPage.SerializeToString,
+            ),
             'PostMessage': grpc.unary_unary_rpc_method_handler(
                     servicer.PostMessage,
                     request_deserializer=chat__system__pb2.Message.FromString,
@@ -181,6 +208,11 @@ def add_ChatServerServicer_to_server(servicer, server):
                     request_deserializer=chat__system__pb2.ServerMessage.FromString,
                     response_serializer=chat__system__pb2.Status.SerializeToString,
             ),
+            'SyncMessagesToServer': grpc.unary_unary_rpc_method_handler(
+                    servicer.SyncMessagesToServer,
+                    request_deserializer=chat__system__pb2.ServerMessageBatch.FromString,
+                    response_serializer=chat__system__pb2.Status.SerializeToString,
+            ),
             'GetServerView': grpc.unary_unary_rpc_method_handler(
                     servicer.GetServerView,
                     request_deserializer=chat__system__pb2.BlankMessage.FromString,
@@ -283,6 +315,23 @@ class ChatServer(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def GetHistory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/chatsystem.ChatServer/GetHistory',
+            chat__system__pb2.HistoryRequest.SerializeToString,
+            chat__system__pb2.HistoryPage.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def PostMessage(request,
             target,
@@ -351,6 +400,23 @@ class ChatServer(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def SyncMessagesToServer(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/chatsystem.ChatServer/SyncMessagesToServer',
+            chat__system__pb2.ServerMessageBatch.SerializeToString,
+            chat__system__pb2.Status.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def GetServerView(request,
             target,
@@ -10,6 +10,7 @@ ACTIVE_USER_KEY = 'active_user_id'
 ACTIVE_GROUP_KEY = 'active_group_id'
 ACTIVE_CHANNEL = 'channel'
 MESSAGE_START_IDX = 'MESSAGE_START_IDX'
+HISTORY_CURSOR = 'HISTORY_CURSOR'
 USER_JOINED_EVENT = 'USER_JOINED_EVENT'
 
 GROUP_DATA = 'group_data'
@@ -29,6 +30,9 @@ STUB = 'stub'
 SERVER_ONLINE = 'server_connection_active'
 SERVER_CONNECTION_STRING = 'server_string'
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_OLDER = 'older'
+
 HEALTH_CHECK_INTERVAL = 60
 MESSAGE_CHECK_INTERVAL = 1
 DEFAULT_SERVER_CONNECTION_STRING = 'localhost:12000'
@@ -57,11 +61,16 @@ NEW = "new"
 USER_JOIN = 'joined'
 USER_LEFT = 'left'
 PARTICIPANT_LIST = 'PARTICIPANT_LIST'
+PARTICIPANT_DELTA = 'PARTICIPANT_DELTA'
+RESYNC = 'RESYNC'
+MEMBERSHIP_VERSION = 'MEMBERSHIP_VERSION'
 
 INPUT_PROMPT = "Enter command"
 NEW_MESSAGE_SCROLL = "New message arrived, scrolling to the bottom"
 SCROLL_REACHED_BOTTOM = "Reached bottom of messages"
 SCROLL_REACHED_TOP = "Reached top of messages"
+HISTORY_REACHED_TOP = "Reached the first message of the group"
+RESYNC_NOTICE = "Missed too many messages, showing the latest ones"
 
 NEGATIVE_MESSAGE_INDEX = 'NEGATIVE_MESSAGE_INDEX'
 
@@ -73,7 +82,7 @@ INIT_MESSAGES = {
     4: "a {message}\t\t send message in the group",
     5: "l {message_id}\t\t like the message with message_id",
     6: "r {message_id}\t\t remove like for the message with message_id",
-    7: "p \t\t\t print message history of the group",
+    7: "p \t\t\t print the previous page of the group's message history",
     8: "v \t\t\t print server's current view of which servers it can currently communicate with",
     9: "q \t\t\t Quit"
 }
\ No newline at end of file
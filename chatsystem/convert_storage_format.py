@@ -0,0 +1,18 @@
+import argparse
+import server.constants as C
+from server.storage.record_format import convert_text_files
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Converts a stopped server's text message and change log files to the binary record format")
+    parser.add_argument('-id', type=str, help='Server Number', required=True)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if args.id not in C.SERVER_IDS:
+        raise Exception("Invalid server id")
+    bytes_before, bytes_after = convert_text_files(C.DATA_STORE_FILE_DIR_PATH.format(args.id))
+    print(f"Converted {bytes_before} bytes of text records to {bytes_after} bytes of binary records")
@@ -1,4 +1,6 @@
 
+# the checked in stubs are generated with grpcio-tools 1.51.3, newer versions
+# emit gencode that only imports with the matching protobuf runtime
 from grpc_tools import protoc
 
 protoc.main((
@@ -143,6 +143,73 @@ def cancel_rpc(event, grpc_context):
     event.clear()
     pass
 
+def apply_participant_delta(message):
+    """
+    applies the users that joined and left to the participant set
+    returns False for deltas the participant set already has
+    """
+    if message.membership_version <= state.get(C.MEMBERSHIP_VERSION):
+        return False
+    participants = state[C.GROUP_DATA]['users']
+    participants.update(message.users_joined)
+    participants.difference_update(message.users_left)
+    state[C.MEMBERSHIP_VERSION] = message.membership_version
+    return True
+
+def display_message(message, msg_dict):
+    """
+    writes message with the number the like commands use for it
+    """
+    if message.message_type in (C.USER_JOIN, C.USER_LEFT):
+        display_manager.write(f"{datetime.fromtimestamp(int(message.creation_time)/10**6)}: {message.user_id} {message.message_type} {message.group_id}.")
+        return
+
+    if message.message_id not in state[C.MESSAGE_ID_TO_NUMBER_MAP]:
+        state[C.MESSAGE_NUMBER] += 1
+        state[C.MESSAGE_ID_TO_NUMBER_MAP][message.message_id] =  state[C.MESSAGE_NUMBER]
+        state[C.MESSAGE_NUMBER_TO_ID_MAP][state[C.MESSAGE_NUMBER]] = message.message_id
+
+    if msg_dict.get("likes"):
+        count = sum(list(map(int, msg_dict.get("likes").values())))
+    else:
+        count = 0
+    if count > 0:
+        like_text = f'\t\t\t Likes: {count}'
+    else: 
+        like_text = ''
+    display_manager.write(f"{state[C.MESSAGE_ID_TO_NUMBER_MAP][message.message_id]}. {message.user_id}: {' '.join(message.text)}{like_text}")
+    state[C.MESSAGES][message.message_id] = msg_dict
+
+def print_history(stub):
+    """
+    prints the page of messages before the last page printed, the newest page the first time
+    """
+    check_state(C.SENT_MESSAGE_CHECK)
+    cursor = state.get(C.HISTORY_CURSOR)
+    if cursor == '':
+        display_manager.info(C.HISTORY_REACHED_TOP)
+        return
+    group_id = state.get(C.ACTIVE_GROUP_KEY)
+    page = stub.GetHistory(chat_system_pb2.HistoryRequest(
+        group_id=group_id, user_id=state.get(C.ACTIVE_USER_KEY), session_id=state[C.SESSION_ID],
+        cursor=cursor or '', page_size=C.HISTORY_PAGE_SIZE, direction=C.HISTORY_OLDER))
+    display_manager.write(f"History of {group_id}:")
+    for message in page.messages:
+        display_message(message, MessageToDict(message, preserving_proto_field_name=True))
+    state[C.HISTORY_CURSOR] = page.older_cursor
+    if page.older_cursor == '':
+        display_manager.info(C.HISTORY_REACHED_TOP)
+
+def clear_message_view():
+    """
+    forgets every message of the active group, e.g. before a resync snapshot
+    """
+    state[C.MESSAGE_ID_TO_NUMBER_MAP] = {}
+    state[C.MESSAGE_NUMBER] = 0
+    state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
+    state[C.MESSAGES] = {}
+    state[C.HISTORY_CURSOR] = None
+
 def get_messages(change_group_event):
     while True:
         stub = state.get(C.STUB)
@@ -153,7 +220,8 @@ def get_messages(change_group_event):
         group_id = state.get(C.ACTIVE_GROUP_KEY)
         message_start_idx = state.get(C.MESSAGE_START_IDX)
         user_id = state.get(C.ACTIVE_USER_KEY)
-        messages = stub.GetMessages(chat_system_pb2.Group(group_id=group_id, user_id=user_id, message_start_idx=message_start_idx, session_id=state[C.SESSION_ID]))
+        messages = stub.GetMessages(chat_system_pb2.Group(group_id=group_id, user_id=user_id, message_start_idx=message_start_idx, session_id=state[C.SESSION_ID],
+                                                          membership_version=state.get(C.MEMBERSHIP_VERSION)))
         # display_manager.write("beginning of new group")
         cancel_messages_thread = Thread(target=cancel_rpc, args=[change_group_event, messages], daemon=True)
         cancel_messages_thread.start()
@@ -161,31 +229,20 @@ def get_messages(change_group_event):
             for message in messages:
                 message_type = message.message_type
                 msg_dict = MessageToDict(message, preserving_proto_field_name=True)
+                if message_type == C.RESYNC:
+                    clear_message_view()
+                    display_manager.info(C.RESYNC_NOTICE)
+                    continue
                 if message_type == C.PARTICIPANT_LIST:
-                    state[C.GROUP_DATA]['users'] = msg_dict['users']
-                    logging.info('Updated participant list: ' + ",".join(msg_dict['users']))
+                    state[C.GROUP_DATA]['users'] = set(msg_dict.get('users', []))
+                    state[C.MEMBERSHIP_VERSION] = message.membership_version
+                    logging.info('Updated participant list: ' + ",".join(state[C.GROUP_DATA]['users']))
                     continue
-                if message.message_type in (C.USER_JOIN, C.USER_LEFT):
-                    display_manager.write(f"{datetime.fromtimestamp(int(message.creation_time)/10**6)}: {message.user_id} {message.message_type} {message.group_id}.")
+                if message_type == C.PARTICIPANT_DELTA:
+                    if apply_participant_delta(message):
+                        logging.info(f'Participants joined: {",".join(message.users_joined)} left: {",".join(message.users_left)}')
                     continue
-                
-                if message.message_id not in state[C.MESSAGE_ID_TO_NUMBER_MAP]:
-                    state[C.MESSAGE_NUMBER] += 1
-                    state[C.MESSAGE_ID_TO_NUMBER_MAP][message.message_id] =  state[C.MESSAGE_NUMBER]
-                    state[C.MESSAGE_NUMBER_TO_ID_MAP][state[C.MESSAGE_NUMBER]] = message.message_id
-
-                
-                if msg_dict.get("likes"):
-                    count = sum(list(map(int, msg_dict.get("likes").values())))
-                else:
-                    count = 0
-                if count > 0:
-                    like_text = f'\t\t\t Likes: {count}'
-                else: 
-                    like_text = ''
-                #  if message_type : 
-                display_manager.write(f"{state[C.MESSAGE_ID_TO_NUMBER_MAP][message.message_id]}. {message.user_id}: {' '.join(message.text)}{like_text}")
-                state[C.MESSAGES][message.message_id] = msg_dict
+                display_message(message, msg_dict)
         except grpc.RpcError as rpc_error:
             display_manager.debug(rpc_error)
         except Exception as e:
@@ -255,12 +312,11 @@ def enter_group_chat(stub, group_id, change_group_event):
         if group_details.status is True:
             display_manager.info(f"Successfully joined group {group_id}")
             display_manager.write(f"Group: {group_id}")
-            display_manager.write(f"Participants: {', '.join(set(group_data['users']))}")
+            group_data['users'] = set(group_data.get('users', []))
+            display_manager.write(f"Participants: {', '.join(group_data['users'])}")
             state[C.GROUP_DATA] = group_data
-            state[C.MESSAGE_ID_TO_NUMBER_MAP] = {}
-            state[C.MESSAGE_NUMBER] = 0
-            state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
-            state[C.MESSAGES] = {}
+            state[C.MEMBERSHIP_VERSION] = group_details.membership_version
+            clear_message_view()
             state[C.MESSAGE_START_IDX] = -10
             state[C.ACTIVE_GROUP_KEY] = group_id
         else:
@@ -435,14 +491,9 @@ def run():
                     raise Exception("Invalid group_id")
                 enter_group_chat(stub, group_id, change_group_event)
 
-            # join group mode: p
+            # history mode: p
             elif command in C.PRINT_HISTORY_COMMANDS:
-                state[C.MESSAGE_START_IDX] = 0
-                state[C.MESSAGE_ID_TO_NUMBER_MAP] = {}
-                state[C.MESSAGE_NUMBER] = 0
-                state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
-                state[C.MESSAGES] = {}
-                change_group_event.set()
+                print_history(stub)
             
             # like mode: l
             elif command in C.LIKE_COMMANDS or command in C.UNLIKE_COMMANDS:
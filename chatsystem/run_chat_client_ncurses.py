@@ -155,25 +155,107 @@ def cancel_rpc(event, grpc_context):
     event.clear()
     pass
 
-def update_participants(message, start_timestamp):
-    if message.group_id == state.get(C.ACTIVE_GROUP_KEY):
-        group_data = state.get(C.GROUP_DATA)
-        if group_data is None: return
-        participants = group_data['users']
-        # print("check 1", participants)
-        if message.message_type == C.USER_JOIN:
-            if int(message.creation_time) > start_timestamp:
-                participants.append(message.user_id)
-        elif message.message_type == C.USER_LEFT:
-            try:
-                if int(message.creation_time) > start_timestamp:
-                    index = participants.index(message.user_id)
-                    del participants[index]
-            except:
-                pass
-        # print("check 2", participants)
-        display_manager.write_header(group_name=f"Group: {state.get(C.ACTIVE_GROUP_KEY)}",
-                    participants=f"Participants: {', '.join(set(participants))}")
+def apply_participant_delta(message):
+    """
+    applies the users that joined and left to the participant set
+    returns False for deltas the participant set already has
+    """
+    if message.membership_version <= state.get(C.MEMBERSHIP_VERSION):
+        return False
+    participants = state[C.GROUP_DATA]['users']
+    participants.update(message.users_joined)
+    participants.difference_update(message.users_left)
+    state[C.MEMBERSHIP_VERSION] = message.membership_version
+    return True
+
+def show_participant_change(joined, left, creation_time):
+    display_manager.write_header(group_name=f"Group: {state.get(C.ACTIVE_GROUP_KEY)}",
+                                    participants=f"Participants: {', '.join(state[C.GROUP_DATA]['users'])}")
+    info_message = ""
+    if len(left) > 0:
+        info_message += " " + ", ".join(left) + " left the chat."
+    if len(joined) > 0:
+        info_message += " " + ", ".join(joined) + " joined the chat. "
+    if len(info_message) > 0:
+        info_message = f'({datetime.fromtimestamp(int(creation_time/10**6))})' + info_message
+    display_manager.info(info_message)
+
+def message_display_text(message, msg_dict):
+    if message.message_type in (C.USER_JOIN, C.USER_LEFT):
+        return f"{message.user_id} {message.message_type} group ({datetime.fromtimestamp(int(message.creation_time/10**6))})."
+    if msg_dict.get("likes"):
+        count = sum(list(map(int, msg_dict.get("likes").values())))
+    else:
+        count = 0
+    if count > 0:
+        like_text = f'\t\t\t Likes: {count}'
+    else: 
+        like_text = ''
+    return f"{message.user_id}: {' '.join(message.text)}{like_text}"
+
+
+def render_message_list():
+    """
+    numbers the messages of the message list in order and displays them
+    """
+    display_counter = 1
+    idx_ = 0
+    for msg_id in state[C.MESSAGE_LIST]:
+        if msg_id in state[C.MESSAGE_DISPLAY_TEXT]:
+            msg_type = state[C.MESSAGES][msg_id]['message_type']
+            if msg_type not in (C.USER_JOIN, C.USER_LEFT):
+                state[C.DISPLAY_MESSAGES][idx_] = f"{display_counter}. {state[C.MESSAGE_DISPLAY_TEXT][msg_id]}"
+                state[C.MESSAGE_NUMBER_TO_ID_MAP][display_counter] = msg_id
+                display_counter += 1
+            else:
+                state[C.DISPLAY_MESSAGES][idx_] = f"\t\t{state[C.MESSAGE_DISPLAY_TEXT][msg_id]}"
+            idx_ += 1
+
+    display_manager.set_message_data(state[C.DISPLAY_MESSAGES])
+    display_manager.write(1, "text")
+
+
+def load_history(stub):
+    """
+    puts the page of messages before the oldest loaded one on top of the
+    message list, the newest page the first time
+    """
+    check_state(C.SENT_MESSAGE_CHECK)
+    cursor = state.get(C.HISTORY_CURSOR)
+    if cursor == '':
+        display_manager.info(C.HISTORY_REACHED_TOP)
+        return
+    page = stub.GetHistory(chat_system_pb2.HistoryRequest(
+        group_id=state.get(C.ACTIVE_GROUP_KEY), user_id=state.get(C.ACTIVE_USER_KEY), session_id=state[C.SESSION_ID],
+        cursor=cursor or '', page_size=C.HISTORY_PAGE_SIZE, direction=C.HISTORY_OLDER))
+    older_ids = []
+    for message in page.messages:
+        if message.message_id in state[C.MESSAGES]:
+            continue
+        msg_dict = MessageToDict(message, preserving_proto_field_name=True)
+        state[C.MESSAGES][message.message_id] = msg_dict
+        state[C.MESSAGE_DISPLAY_TEXT][message.message_id] = message_display_text(message, msg_dict)
+        older_ids.append(message.message_id)
+    state[C.MESSAGE_LIST][:0] = older_ids
+    state[C.HISTORY_CURSOR] = page.older_cursor
+    render_message_list()
+    if page.older_cursor == '':
+        display_manager.info(C.HISTORY_REACHED_TOP)
+    else:
+        display_manager.info(f'Loaded {len(older_ids)} older messages')
+
+
+def clear_message_view():
+    """
+    forgets every message of the active group, e.g. before a resync snapshot
+    """
+    state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
+    state[C.MESSAGES] = {}
+    state[C.MESSAGE_LIST] = []
+    state[C.MESSAGE_DISPLAY_TEXT] = {}
+    state[C.DISPLAY_MESSAGES] = {}
+    state[C.HISTORY_CURSOR] = None
+
 
 def get_messages(change_group_event):
     while True:
@@ -185,30 +267,29 @@ def get_messages(change_group_event):
         group_id = state.get(C.ACTIVE_GROUP_KEY)
         message_start_idx = state.get(C.MESSAGE_START_IDX)
         user_id = state.get(C.ACTIVE_USER_KEY)
-        messages = stub.GetMessages(chat_system_pb2.Group(group_id=group_id, user_id=user_id, message_start_idx=message_start_idx, session_id=state[C.SESSION_ID]))
+        messages = stub.GetMessages(chat_system_pb2.Group(group_id=group_id, user_id=user_id, message_start_idx=message_start_idx, session_id=state[C.SESSION_ID],
+                                                          membership_version=state.get(C.MEMBERSHIP_VERSION)))
         cancel_messages_thread = Thread(target=cancel_rpc, args=[change_group_event, messages], daemon=True)
         cancel_messages_thread.start()
         try:
-            start_timestamp = get_timestamp()
             for message in messages:
                 message_type = message.message_type
+                if message_type == C.RESYNC:
+                    clear_message_view()
+                    render_message_list()
+                    display_manager.info(C.RESYNC_NOTICE)
+                    continue
+                if message_type == C.PARTICIPANT_DELTA:
+                    if apply_participant_delta(message):
+                        show_participant_change(message.users_joined, message.users_left, message.creation_time)
+                    continue
                 msg_dict = MessageToDict(message, preserving_proto_field_name=True)
                 if message_type == C.PARTICIPANT_LIST:
-                    existing_participant_set = set(state[C.GROUP_DATA].get('users', []))
-                    state[C.GROUP_DATA]['users'] = msg_dict['users']
-                    new_participant_set = set(msg_dict['users'])
-                    participants_left_set = existing_participant_set - new_participant_set
-                    participants_joined_set = new_participant_set - existing_participant_set
-                    display_manager.write_header(group_name=f"Group: {state.get(C.ACTIVE_GROUP_KEY)}",
-                                                    participants=f"Participants: {', '.join(set(msg_dict['users']))}")
-                    info_message = ""
-                    if len(participants_left_set) > 0:
-                        info_message += " " + ", ".join(participants_left_set) + " left the chat."
-                    if len(participants_joined_set) > 0:
-                        info_message += " " + ", ".join(participants_joined_set) + " joined the chat. "
-                    if len(info_message) > 0:
-                        info_message = f'({datetime.fromtimestamp(int(message.creation_time/10**6))})' + info_message
-                    display_manager.info(info_message)
+                    existing_participant_set = state[C.GROUP_DATA]['users']
+                    new_participant_set = set(msg_dict.get('users', []))
+                    state[C.GROUP_DATA]['users'] = new_participant_set
+                    state[C.MEMBERSHIP_VERSION] = message.membership_version
+                    show_participant_change(new_participant_set - existing_participant_set, existing_participant_set - new_participant_set, message.creation_time)
                     continue
                 
                 message_id = message.message_id
@@ -229,39 +310,9 @@ def get_messages(change_group_event):
                         message_list.insert(previous_msg_idx+1, message_id)
                 state[C.MESSAGES][message_id] = msg_dict
                 
-                if message.message_type in (C.USER_JOIN, C.USER_LEFT):
-                    # display_manager.write(msg_indx, f"{message.user_id} {message.message_type} group ({datetime.fromtimestamp(int(message.creation_time/10**6))}).")
-                    update_participants(message, start_timestamp)
-                    state[C.MESSAGE_DISPLAY_TEXT][message_id] = f"{message.user_id} {message.message_type} group ({datetime.fromtimestamp(int(message.creation_time/10**6))})."
-
-                if message_type not in (C.USER_JOIN, C.USER_LEFT):
-                    if msg_dict.get("likes"):
-                        count = sum(list(map(int, msg_dict.get("likes").values())))
-                    else:
-                        count = 0
-                    if count > 0:
-                        like_text = f'\t\t\t Likes: {count}'
-                    else: 
-                        like_text = ''
-                    # #  if message_type : 
-                    # text_idx = state[C.TEXT_ID_TO_NUMBER_MAP][message.message_id]
-                    state[C.MESSAGE_DISPLAY_TEXT][message_id] = f"{message.user_id}: {' '.join(message.text)}{like_text}"
-
-                display_counter = 1
-                idx_ = 0
-                for msg_id in message_list:
-                    if msg_id in state[C.MESSAGE_DISPLAY_TEXT]:
-                        msg_type = state[C.MESSAGES][msg_id]['message_type']
-                        if msg_type not in (C.USER_JOIN, C.USER_LEFT):
-                            state[C.DISPLAY_MESSAGES][idx_] = f"{display_counter}. {state[C.MESSAGE_DISPLAY_TEXT][msg_id]}"
-                            state[C.MESSAGE_NUMBER_TO_ID_MAP][display_counter] = msg_id
-                            display_counter += 1
-                        else:
-                            state[C.DISPLAY_MESSAGES][idx_] = f"\t\t{state[C.MESSAGE_DISPLAY_TEXT][msg_id]}"
-                        idx_ += 1
-                
-                display_manager.set_message_data(state[C.DISPLAY_MESSAGES])
-                display_manager.write(1, "text")
+                state[C.MESSAGE_DISPLAY_TEXT][message_id] = message_display_text(message, msg_dict)
+
+                render_message_list()
 
                 
         except grpc.RpcError as rpc_error:
@@ -335,17 +386,15 @@ def enter_group_chat(stub, group_id, change_group_event):
         group_data = MessageToDict(group_details, preserving_proto_field_name=True)
         if group_details.status is True:
             display_manager.info(f"Successfully joined group {group_id}")
-            display_manager.write_header(f"Group: {group_id}", f"Participants: {', '.join(set(group_data['users']))}")
+            group_data['users'] = set(group_data.get('users', []))
+            display_manager.write_header(f"Group: {group_id}", f"Participants: {', '.join(group_data['users'])}")
             state[C.GROUP_DATA] = group_data
+            state[C.MEMBERSHIP_VERSION] = group_details.membership_version
             state[C.MESSAGE_ID_TO_NUMBER_MAP] = {}
             state[C.TEXT_ID_TO_NUMBER_MAP] = {}
             state[C.MESSAGE_NUMBER] = 0
             state[C.TEXT_MSG_IDX] = 0
-            state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
-            state[C.MESSAGES] = {}
-            state[C.MESSAGE_LIST] = []
-            state[C.MESSAGE_DISPLAY_TEXT] = {}
-            state[C.DISPLAY_MESSAGES] = {}
+            clear_message_view()
             state[C.MESSAGE_START_IDX] = -10
             state[C.ACTIVE_GROUP_KEY] = group_id
         else:
@@ -519,20 +568,9 @@ def run():
                     raise Exception("Invalid group_id")
                 enter_group_chat(stub, group_id, change_group_event)
 
-            # join group mode: p
+            # history mode: p
             elif command in C.PRINT_HISTORY_COMMANDS:
-                state[C.MESSAGE_START_IDX] = 0
-                state[C.MESSAGE_ID_TO_NUMBER_MAP] = {}
-                state[C.TEXT_ID_TO_NUMBER_MAP] = {}
-                state[C.MESSAGE_NUMBER] = 0
-                state[C.TEXT_MSG_IDX] = 0
-                state[C.MESSAGE_NUMBER_TO_ID_MAP] = {}
-                state[C.MESSAGES] = {}
-                state[C.MESSAGE_LIST] = []
-                state[C.DISPLAY_MESSAGES] = {}
-                state[C.MESSAGE_DISPLAY_TEXT] = {}
-                change_group_event.set()
-                display_manager.info('Chat History is printed successfully')
+                load_history(stub)
             
             # like mode: l
             elif command in C.LIKE_COMMANDS or command in C.UNLIKE_COMMANDS:
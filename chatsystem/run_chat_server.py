@@ -1,52 +1,131 @@
 
 import argparse
+import asyncio
 import logging
 import threading
+from collections import OrderedDict
+from time import sleep
 from concurrent import futures
-import copy
 import chat_system_pb2
 import chat_system_pb2_grpc
 import grpc
 import server.constants as C
 from google.protobuf.json_format import MessageToDict
-from server.storage.data_store import Datastore, ServerCollection
+from server.storage.data_store import Datastore
 from server.storage.file_manager import FileManager
-from server.storage.utils import get_unique_id, get_timestamp, clean_message
+from server.storage import record_format as RF
+from server.storage.sqlite_store import SqliteDatastore
+from server.storage.utils import get_unique_id, get_monotonically_increasing_timestamp, clean_message
 from server.server_pool_manager import ServerPoolManager
+from server.group_notifier import GroupNotifier
+from server.snowflake import SnowflakeIdGenerator
 
 # data_store = Datastore()
 
 
 class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
 
-    def __init__(self, data_store: Datastore, spm: ServerPoolManager, file_manager: FileManager, server_id) -> None:
+    def __init__(self, data_store: Datastore, spm: ServerPoolManager, file_manager: FileManager, server_id, slow_consumer_policy=C.SLOW_CONSUMER_POLICY, coalesce_updates=C.COALESCE_UPDATES) -> None:
         super().__init__()
         self.data_store = data_store
         # self.new_message_event = threading.Event()
         self._lock = threading.Lock()
-        self.timestamp_lock = threading.Lock()
-        self.group_message_events = ServerCollection()
+        self.notifier = GroupNotifier()
         self.spm = spm
         self.file_manager = file_manager
         self.server_id = server_id
+        self.message_ids = SnowflakeIdGenerator(server_id)
+        # client message id -> snowflake id of the most recent posts
+        self.posted_message_ids = OrderedDict()
+        if slow_consumer_policy not in C.SLOW_CONSUMER_POLICIES:
+            raise Exception(f"Unknown slow consumer policy {slow_consumer_policy}")
+        self.slow_consumer_policy = slow_consumer_policy
+        self.coalesce_updates = coalesce_updates
+        # lag and delivery counters of the open GetMessages streams by session
+        self.stream_stats = {}
         self.spm.register_callback(C.SERVER_DIED_CALLBACK, self.remove_group_participants_server_disconnected)
+        threading.Thread(target=self.log_stream_stats, daemon=True).start()
+
+    def get_stream_stats(self):
+        with self._lock:
+            return {session_id: dict(stats) for session_id, stats in self.stream_stats.items()}
+
+    def log_stream_stats(self):
+        while True:
+            sleep(C.STREAM_STATS_INTERVAL)
+            stats = self.get_stream_stats()
+            lagging = [session_id for session_id, stream in stats.items() if stream['lag'] > C.STREAM_BUFFER_SIZE]
+            max_lag = max((stream['max_lag'] for stream in stats.values()), default=0)
+            logging.info(f'GetMessages streams: {len(stats)} open, {len(lagging)} lagging, max lag {max_lag}')
+
+    def open_stream(self, group_id, user_id, session_id):
+        stats = {
+            'group_id': group_id,
+            'user_id': user_id,
+            'lag': 0,
+            'max_lag': 0,
+            'slow_reads': 0,
+            'messages': 0,
+            'bytes': 0,
+            'coalesced': 0,
+        }
+        with self._lock:
+            self.stream_stats[session_id] = stats
+        return stats
+
+    def close_stream(self, group_id, session_id, stats):
+        """
+        change log cursors are kept per session, a newer stream of the session
+        reading the same group keeps using the cursor
+        """
+        with self._lock:
+            current = self.stream_stats.get(session_id)
+            if current is stats:
+                del self.stream_stats[session_id]
+            elif current is not None and current['group_id'] == group_id:
+                return
+            self.data_store.release_change_log(group_id, session_id)
+
+    def read_stream(self, stats, group_id, session_id, last_msg_idx, updated_idx, membership_version=None):
+        """
+        next serialized messages of a GetMessages stream, streams more than
+        C.STREAM_BUFFER_SIZE changes behind are handled by the slow consumer policy
+        membership_version: participant list version the client got from GetGroup,
+        the first read sends the full list only if it changed since
+        returns (change log index, messages), messages is None if the stream has to be closed
+        """
+        lag = self.data_store.change_log_lag(group_id, updated_idx) if last_msg_idx > 0 else 0
+        stats['lag'] = lag
+        stats['max_lag'] = max(stats['max_lag'], lag)
+        # a client catching up gets each liked message and the participant list once per read
+        options = {'coalesce': self.coalesce_updates}
+        if lag > C.STREAM_BUFFER_SIZE:
+            stats['slow_reads'] += 1
+            logging.debug(f"{session_id} is {lag} changes behind in {group_id}, policy {self.slow_consumer_policy}")
+            if self.slow_consumer_policy == C.SLOW_CONSUMER_DISCONNECT:
+                return updated_idx, None
+            if self.slow_consumer_policy == C.SLOW_CONSUMER_BLOCK:
+                options['limit'] = C.STREAM_BUFFER_SIZE
+            elif self.slow_consumer_policy == C.SLOW_CONSUMER_COALESCE:
+                options['coalesce'] = True
+            elif self.slow_consumer_policy == C.SLOW_CONSUMER_SNAPSHOT:
+                options['resync'] = True
+        # messages come serialized, each change is serialized once for all streams of the group
+        read_idx = updated_idx
+        updated_idx, new_messages = self.data_store.get_messages(group_id, start_index=last_msg_idx, change_log_index=updated_idx, subscriber=session_id, encoded=True,
+            membership_version=membership_version if last_msg_idx <= 0 else None, **options)
+        if last_msg_idx > 0 and not options.get('resync'):
+            stats['coalesced'] += max(0, updated_idx - read_idx - len(new_messages))
+        stats['messages'] += len(new_messages)
+        stats['bytes'] += sum(map(len, new_messages))
+        return updated_idx, new_messages
 
     def remove_group_participants_server_disconnected(self, server_id):
         logging.info(f'server died {server_id}')
         event_group_ids = self.data_store.remove_group_participants_server_disconnected(server_id=server_id)
         # logging.info(f'{event_group_ids} events')
         for group_id in event_group_ids:
-            self.group_message_events[group_id].set()
-    
-    def get_group_message_event(self, group_id):
-        event = self.group_message_events.get(group_id)
-        if event:
-            return event
-        else:
-            with self._lock:
-                if group_id not in self.group_message_events:
-                    self.group_message_events[group_id] = threading.Event()
-                return self.group_message_events[group_id]
+            self.notifier.notify(group_id)
 
     def get_group_details(self, group_id: str, user_id: str) -> chat_system_pb2.GroupDetails:
 
@@ -65,12 +144,12 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
             }
             self.spm.send_msg_to_connected_servers(server_message, event_type=C.GROUP_EVENT)
 
-        group = self.data_store.get_group(group_id)
-        users_list = self.data_store.expand_user_list(group_id, group.get('updated_time'))
+        users_list, membership_version = self.data_store.get_participants(group_id)
         group_details = chat_system_pb2.GroupDetails(
             group_id=group_id, 
             users=users_list, 
-            status=True
+            status=True,
+            membership_version=membership_version
             )
         return group_details
 
@@ -97,7 +176,7 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         self.new_message({"group_id": group_id, 
         "user_id": user_id,
         "creation_time": self.get_timestamp(),
-        "message_id": get_unique_id(),
+        "message_id": self.message_ids.next_string_id(),
         "text":[],
         "message_type": C.USER_JOIN})
         # self.new_message_event.set()
@@ -113,8 +192,8 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         logging.info(f"{user_id} exited from group {group_id}")
         self.new_message({"group_id": group_id, 
         "user_id": user_id,
-        "creation_time": get_timestamp(),
-        "message_id": get_unique_id(),
+        "creation_time": self.get_timestamp(),
+        "message_id": self.message_ids.next_string_id(),
         "text":[],
         "message_type": C.USER_LEFT})
         self.data_store.save_session_info(session_id, user_id, is_active=True)
@@ -128,7 +207,7 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         
 
         # self.new_message_event.set()
-        self.get_group_message_event(group_id).set()
+        self.notifier.notify(group_id)
         self.data_store.save_session_info(request.session_id, user_id)
         return status
 
@@ -142,46 +221,73 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         session_id = request.session_id
 
         self.data_store.save_session_info(session_id, user_id=user_id, group_id=group_id, context=context)
+        # wake the stream when the client goes away so it can clean up
+        context.add_callback(lambda: self.notifier.notify(group_id))
+        stats = self.open_stream(group_id, user_id, session_id)
+        try:
+            yield from self.stream_messages(stats, group_id, user_id, session_id, last_msg_idx, updated_idx, context, request.membership_version)
+        finally:
+            self.close_stream(group_id, session_id, stats)
+
+    def GetHistory(self, request, context):
+        """
+        one page of the group's history next to request.cursor, empty cursor for the newest page
+        """
+        group_id = request.group_id
+        direction = request.direction or C.HISTORY_OLDER
+        if direction not in C.HISTORY_DIRECTIONS:
+            return unary_error(context, grpc.StatusCode.INVALID_ARGUMENT, f'Unknown history direction {direction}', chat_system_pb2.HistoryPage())
+        page_size = min(request.page_size or C.HISTORY_PAGE_SIZE, C.HISTORY_MAX_PAGE_SIZE)
+        if page_size < 0:
+            return unary_error(context, grpc.StatusCode.INVALID_ARGUMENT, f'Invalid page size {page_size}', chat_system_pb2.HistoryPage())
+        if self.data_store.get_group(group_id) is None:
+            return unary_error(context, grpc.StatusCode.NOT_FOUND, f'Group {group_id} not found', chat_system_pb2.HistoryPage())
+        try:
+            messages, older_cursor, newer_cursor = self.data_store.get_history(group_id, request.cursor, page_size, direction)
+        except Exception as ex:
+            logging.info(f"History request of {request.user_id} for group {group_id} failed: {ex}")
+            return unary_error(context, grpc.StatusCode.INVALID_ARGUMENT, str(ex), chat_system_pb2.HistoryPage())
+        return chat_system_pb2.HistoryPage(
+            messages=[RF.message_to_client(message, group_id) for message in messages],
+            older_cursor=older_cursor,
+            newer_cursor=newer_cursor
+        )
 
+    def stream_ended(self, group_id, user_id, session_id, ended_context=None):
+        """
+        the user leaves the group if the latest GetMessages stream of the session has ended
+        ended_context: context of a stream known to have ended
+        """
+        session_info = self.data_store.get_session_info(session_id)
+        if session_info["group_id"] == group_id:
+            context = session_info.get('context')
+            if context and (context is ended_context or not is_context_active(context)):
+                self.data_store.remove_user_from_group(group_id, user_id, server_id=self.server_id)
+                self.data_store.save_session_info(session_id, user_id, is_active=False)
+                # self.new_message_event.set()
+                self.notifier.notify(group_id)
+
+    def stream_messages(self, stats, group_id, user_id, session_id, last_msg_idx, updated_idx, context, membership_version=None):
+        seen = self.notifier.sequence(group_id)
         while True:
             if not context.is_active():
-                session_info = self.data_store.get_session_info(session_id)
-                if session_info["group_id"] == group_id:
-                    session_info = self.data_store.get_session_info(session_id)
-                    if session_info.get('context') and not session_info.get('context').is_active():
-                        self.data_store.remove_user_from_group(group_id, user_id, server_id=self.server_id)
-                        self.data_store.save_session_info(session_id, user_id, is_active=False)
-                        # self.new_message_event.set()
-                        self.get_group_message_event(group_id).set()
+                self.stream_ended(group_id, user_id, session_id)
                 break
-            updated_idx, new_messages = self.data_store.get_messages(group_id, start_index=last_msg_idx, change_log_index=updated_idx)
+            updated_idx, new_messages = self.read_stream(stats, group_id, session_id, last_msg_idx, updated_idx, membership_version)
+            if new_messages is None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f'More than {C.STREAM_BUFFER_SIZE} messages behind')
             
             last_msg_idx = 1
             
-            for new_message in new_messages:
-                # print(new_message)
-                message_grpc = chat_system_pb2.Message(
-                    group_id=new_message.get("group_id", group_id),
-                    user_id=new_message.get("user_id"),
-                    users=new_message.get("users"),
-                    creation_time=new_message.get("creation_time"),
-                    text=new_message.get("text", []),
-                    message_id=new_message.get("message_id"),
-                    likes=new_message.get("likes"),
-                    message_type=new_message["message_type"],
-                    previous_message_id=new_message.get('previous_message_id')
-                )
-
-                yield message_grpc
-
-            # self.new_message_event.clear()
-            # self.new_message_event.wait()
-            self.get_group_message_event(group_id).clear()
-            self.get_group_message_event(group_id).wait()
+            yield from new_messages
+
+            # a stream reading its backlog in parts goes on without waiting
+            if self.data_store.change_log_lag(group_id, updated_idx) <= 0:
+                seen = self.notifier.wait(group_id, seen)
 
 
     def new_message(self, message):
-        message['vector_timestamp'] = self.spm.update_vector_timestamp()
+        self.spm.timestamp_message(message)
         clean_message(message)
         
         server_message = self.data_store.save_message(message)
@@ -191,11 +297,10 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
             # self.new_message_event.set()
             group_id = message.get("group_id")
             if group_id:
-                self.get_group_message_event(group_id).set()
+                self.notifier.notify(group_id)
 
     def get_timestamp(self):
-        with self.timestamp_lock:
-            return get_timestamp()
+        return get_monotonically_increasing_timestamp()
 
     def PostMessage(self, request, context):
         status = chat_system_pb2.Status(status=True, statusMessage = "")
@@ -203,8 +308,28 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         # add vector timestamp to message
         message['server_id'] = self.server_id
         message['creation_time'] = self.get_timestamp()
+        if message.get('message_type') == C.NEW:
+            message['message_id'] = self.posted_message_id(message.get('message_id'))
         self.new_message(message)
         return status
+
+    def posted_message_id(self, client_message_id):
+        """
+        snowflake id of a new message posted by a client, a retry of the
+        same client message id gets the id of the first attempt
+        """
+        if not client_message_id:
+            return self.message_ids.next_string_id()
+        with self._lock:
+            message_id = self.posted_message_ids.get(client_message_id)
+            if message_id is not None:
+                self.posted_message_ids.move_to_end(client_message_id)
+                return message_id
+            message_id = self.message_ids.next_string_id()
+            self.posted_message_ids[client_message_id] = message_id
+            if len(self.posted_message_ids) > C.POSTED_MESSAGE_IDS_SIZE:
+                self.posted_message_ids.popitem(last=False)
+            return message_id
     
     def HealthCheck(self, request_iter, context):
         status = chat_system_pb2.Status(status=True, statusMessage = "")
@@ -214,21 +339,27 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
                 session_id = request.session_id
         except Exception:
             if session_id is not None:
-                session_info = self.data_store.get_session_info(session_id)
-                # if session_info.get('context') and not session_info.get('context').is_active():
-                group_id, user_id = session_info.get('group_id'), session_info.get('user_id')
-                if group_id is not None:
-                    self.new_message({"group_id": group_id, 
-                    "user_id": user_id,
-                    "creation_time": self.get_timestamp(),
-                    "message_id": get_unique_id(),
-                    "text":[],
-                    "message_type": C.USER_LEFT})
-                    self.data_store.remove_user_from_group(group_id, user_id, server_id=self.server_id)
-                    self.data_store.save_session_info(session_id, user_id, is_active=False)
-                    # self.new_message_event.set()
-                    self.get_group_message_event(group_id).set()
+                self.session_lost(session_id)
         return status
+
+    def session_lost(self, session_id):
+        """
+        the client of the session stopped sending health checks
+        """
+        session_info = self.data_store.get_session_info(session_id)
+        # if session_info.get('context') and not session_info.get('context').is_active():
+        group_id, user_id = session_info.get('group_id'), session_info.get('user_id')
+        if group_id is not None:
+            self.new_message({"group_id": group_id, 
+            "user_id": user_id,
+            "creation_time": self.get_timestamp(),
+            "message_id": self.message_ids.next_string_id(),
+            "text":[],
+            "message_type": C.USER_LEFT})
+            self.data_store.remove_user_from_group(group_id, user_id, server_id=self.server_id)
+            self.data_store.save_session_info(session_id, user_id, is_active=False)
+            # self.new_message_event.set()
+            self.notifier.notify(group_id)
     
     def Ping(self, request, context):
         # print(request)
@@ -260,7 +391,50 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
         status = chat_system_pb2.Status(status=True, statusMessage = "")
         message = MessageToDict(request, preserving_proto_field_name=True)
         clean_message(message)
-        message_copy = copy.deepcopy(message)
+        self.apply_server_message(message)
+        return status
+
+    def SyncMessagesToServer(self, request, context):
+        """
+        batch of messages from another server, e.g. queued up during an outage
+        consecutive message events are saved with one bulk insert per group
+        """
+        status = chat_system_pb2.Status(status=True, statusMessage = "")
+        message_events = []
+        for server_message in request.messages:
+            message = MessageToDict(server_message, preserving_proto_field_name=True)
+            clean_message(message)
+            if message['event_type'] == C.MESSAGE_EVENT:
+                message_events.append(message)
+                continue
+            self.apply_message_events(message_events)
+            message_events = []
+            self.apply_server_message(message)
+        self.apply_message_events(message_events)
+        return status
+
+    def apply_message_events(self, messages):
+        if not messages:
+            return
+        payloads = [self.spm.encode_message(message) for message in messages]
+        messages_by_group = {}
+        for message in messages:
+            self.spm.update_clock(message)
+            messages_by_group.setdefault(message.get('group_id'), []).append(message)
+        for group_id, group_messages in messages_by_group.items():
+            self.data_store.save_messages_bulk(group_id, group_messages)
+        for message, payload in zip(messages, payloads):
+            message_type = message.get('message_type')
+            if message_type == C.USER_LEFT:
+                self.data_store.remove_user_from_group(message.get('group_id'), message.get('user_id'), server_id=message["server_id"])
+            if message_type == C.USER_JOIN:
+                self.data_store.add_user_to_group(message.get('group_id'), message.get('user_id'), server_id=message["server_id"])
+            self.spm.log_message(message, payload)
+        for group_id in messages_by_group:
+            self.notifier.notify(group_id)
+
+    def apply_server_message(self, message):
+        payload = self.spm.encode_message(message)
         event_type = message['event_type']
         message_type = message.get('message_type')
         group_id = message.get('group_id')
@@ -269,7 +443,7 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
 
         # logging.info('msg received')
 
-        self.spm.update_vector_timestamp(message)
+        self.spm.update_clock(message)
 
         if event_type == C.MESSAGE_EVENT:
             # add vector timestamp to message
@@ -280,15 +454,15 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
                 self.data_store.add_user_to_group(group_id, user_id, server_id=incoming_server_id)
             # trigger new message event i.e. calling getmessages
             # self.new_message_event.set()
-            self.get_group_message_event(group_id).set()
-            self.spm.log_message(message_copy)
+            self.notifier.notify(group_id)
+            self.spm.log_message(message, payload)
         elif event_type == C.GROUP_EVENT:
             users = message.get('users', {})
             creation_time = message.get('creation_time')
             if not self.data_store.get_group(group_id):
                 # print(f'creating group {group_id}')
                 self.data_store.create_group(group_id, users, creation_time)
-            self.spm.log_message(message_copy)
+            self.spm.log_message(message, payload)
         elif event_type == C.GET_GROUP_META_DATA:
             all_groups_data = self.data_store.get_groups_meta_data()
             for group_meta in all_groups_data:
@@ -299,45 +473,175 @@ class ChatServerServicer(chat_system_pb2_grpc.ChatServerServicer):
             # source_server_id = message['server_id']
             # if source_server_id in self.spm.get_connected_servers_view():
             if self.data_store.update_group_meta_data(group_id, group_meta_data, incoming_server_id):
-                self.get_group_message_event(group_id).set()
-            self.spm.log_message(message_copy)
+                self.notifier.notify(group_id)
+            self.spm.log_message(message, payload)
         else:
             raise Exception('Unknown event type')
+
+class AsyncChatServerServicer(ChatServerServicer):
+    """
+    ChatServerServicer for the grpc.aio server, the streaming RPCs are
+    coroutines so idle streams do not hold a thread, unary RPCs run the
+    ChatServerServicer methods in the server's thread pool
+    """
+    async def GetMessages(self, request, context):
+        last_msg_idx = request.message_start_idx
+        updated_idx = None
+
+        user_id = request.user_id
+        group_id = request.group_id
+        session_id = request.session_id
+
+        await asyncio.to_thread(self.data_store.save_session_info, session_id, user_id=user_id, group_id=group_id, context=context)
+        stats = self.open_stream(group_id, user_id, session_id)
+        seen = self.notifier.sequence(group_id)
+        too_slow = False
+        try:
+            while True:
+                updated_idx, new_messages = await asyncio.to_thread(self.read_stream, stats, group_id, session_id, last_msg_idx, updated_idx, request.membership_version)
+                if new_messages is None:
+                    # the client reconnects, it stays in the group
+                    too_slow = True
+                    await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f'More than {C.STREAM_BUFFER_SIZE} messages behind')
+                last_msg_idx = 1
+                for new_message in new_messages:
+                    yield new_message
+                if self.data_store.change_log_lag(group_id, updated_idx) <= 0:
+                    seen = await self.notifier.wait_async(group_id, seen)
+        finally:
+            self.close_stream(group_id, session_id, stats)
+            if not too_slow:
+                self.stream_ended(group_id, user_id, session_id, ended_context=context)
+
+    async def HealthCheck(self, request_iter, context):
+        status = chat_system_pb2.Status(status=True, statusMessage = "")
+        session_id = None
+        try:
+            async for request in request_iter:
+                session_id = request.session_id
+        except asyncio.CancelledError:
+            # a client that goes away cancels the RPC instead of failing the iterator,
+            # the cancellation still has to reach grpc once the session is cleaned up
+            if session_id is not None:
+                await asyncio.to_thread(self.session_lost, session_id)
+            raise
+        except Exception:
+            if session_id is not None:
+                await asyncio.to_thread(self.session_lost, session_id)
         return status
 
+
+def is_context_active(context):
+    """
+    works for the contexts of both the thread pool and the asyncio server
+    """
+    if hasattr(context, 'is_active'):
+        return context.is_active()
+    return not context.done()
+
+
+def unary_error(context, code, details, response):
+    """
+    fails a unary call with code, unlike context.abort this also works for
+    the plain methods the asyncio server runs on its thread pool
+    """
+    context.set_code(code)
+    context.set_details(details)
+    return response
+
+
+def serialize_response(message):
+    """
+    response serializer of GetMessages, which streams already serialized messages
+    """
+    if isinstance(message, bytes):
+        return message
+    return message.SerializeToString()
+
+
+RPC_METHOD_HANDLERS = {
+    (False, False): grpc.unary_unary_rpc_method_handler,
+    (False, True): grpc.unary_stream_rpc_method_handler,
+    (True, False): grpc.stream_unary_rpc_method_handler,
+    (True, True): grpc.stream_stream_rpc_method_handler,
+}
+
+
+def add_chat_servicer_to_server(servicer, server):
+    """
+    add_ChatServerServicer_to_server, except that GetMessages may yield serialized messages
+    the handlers are built from the service descriptor so this does not depend
+    on the grpcio-tools version that generated chat_system_pb2_grpc
+    """
+    service = chat_system_pb2.DESCRIPTOR.services_by_name['ChatServer']
+    method_handlers = {}
+    for method in service.methods:
+        request_class = getattr(chat_system_pb2, method.input_type.name)
+        response_class = getattr(chat_system_pb2, method.output_type.name)
+        method_handlers[method.name] = RPC_METHOD_HANDLERS[method.client_streaming, method.server_streaming](
+            getattr(servicer, method.name),
+            request_deserializer=request_class.FromString,
+            response_serializer=serialize_response if method.name == 'GetMessages' else response_class.SerializeToString)
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service.full_name, method_handlers),))
+    # servers of newer grpc versions look registered methods up without going through the generic handlers
+    if hasattr(server, 'add_registered_method_handlers'):
+        server.add_registered_method_handlers(service.full_name, method_handlers)
+
+
 def get_args():
     parser = argparse.ArgumentParser(description="Script for running CS 2510 Project 2 servers")
     parser.add_argument('-id', type=str, help='Server Number', required=True)
+    parser.add_argument('-durability', type=str, choices=C.DURABILITY_MODES, default=C.DURABILITY_MODE, help='When appended data is flushed / fsynced to disk')
+    parser.add_argument('-ordering', type=str, choices=C.ORDERING_MODES, default=C.ORDERING_MODE, help='Clock used to order messages, has to be the same on all servers')
+    parser.add_argument('-async', dest='use_async', action='store_true', help='Serve with grpc.aio, streams wait without holding a thread')
+    parser.add_argument('-slow_consumer', type=str, choices=C.SLOW_CONSUMER_POLICIES, default=C.SLOW_CONSUMER_POLICY, help='What GetMessages streams that fall behind do')
+    parser.add_argument('-storage', type=str, choices=C.STORAGE_BACKENDS, default=C.STORAGE_BACKEND, help='Storage backend for messages and groups')
     args = parser.parse_args()
     print(args)
     return args
 
 
+async def serve_async(servicer, address):
+    server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=C.ASYNC_SERVER_WORKERS))
+    add_chat_servicer_to_server(servicer, server)
+    server.add_insecure_port(address)
+    await server.start()
+    print(f"Async server {address} started")
+    await server.wait_for_termination()
+
+
 def serve():
     data_store = None
+    file_manager = None
     args = get_args()
     if args.id not in C.SERVER_IDS:
         raise Exception("Invalid server id")
     try:
-        file_manager = FileManager(root=C.DATA_STORE_FILE_DIR_PATH.format(args.id))
-        data_store = Datastore(file_manager, server_id=args.id)
-        spm = ServerPoolManager(args.id, file_manager, data_store)
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10000))
-        chat_system_pb2_grpc.add_ChatServerServicer_to_server(
-            ChatServerServicer(data_store, spm, file_manager, args.id), server
-        )
+        file_manager = FileManager(root=C.DATA_STORE_FILE_DIR_PATH.format(args.id), durability=args.durability)
+        if args.storage == C.STORAGE_SQLITE:
+            data_store = SqliteDatastore(file_manager, server_id=args.id, ordering=args.ordering)
+        else:
+            data_store = Datastore(file_manager, server_id=args.id, ordering=args.ordering)
+        spm = ServerPoolManager(args.id, file_manager, data_store, ordering=args.ordering)
         if C.USE_DIFFERENT_PORTS:
-            id = int(args.id)
-            server.add_insecure_port(f'[::]:{(11999+id)}')
-            print(f"Server [::]:{(11999+id)} started")
+            address = f'[::]:{(11999+int(args.id))}'
         else:
-            server.add_insecure_port('[::]:12000')
-            print("Server started")
+            address = '[::]:12000'
+        if args.use_async:
+            asyncio.run(serve_async(AsyncChatServerServicer(data_store, spm, file_manager, args.id, args.slow_consumer), address))
+            return
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10000))
+        add_chat_servicer_to_server(ChatServerServicer(data_store, spm, file_manager, args.id, args.slow_consumer), server)
+        server.add_insecure_port(address)
+        print(f"Server {address} started")
         server.start()
         
         server.wait_for_termination()
     finally:
-        pass
+        if data_store is not None:
+            data_store.close()
+        if file_manager is not None:
+            file_manager.close()
         # if data_store is not None:
             # data_store.save_on_file()
 
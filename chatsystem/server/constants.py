@@ -12,6 +12,126 @@ DATA_STORE_FILE_DIR_PATH = os.path.join(os.path.expanduser('~'), 'chat_server_da
 
 # os.makedirs(DATA_STORE_FILE_DIR_PATH, exist_ok=True)
 
+APPEND_LOG_MAX_OPEN_FILES = 256
+APPEND_LOG_SEGMENT_SIZE = 64 * 1024 * 1024
+
+DURABILITY_NONE = 'none'
+DURABILITY_FLUSH = 'flush'
+DURABILITY_FSYNC_PER_BATCH = 'fsync-per-batch'
+DURABILITY_FSYNC_PER_MESSAGE = 'fsync-per-message'
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_FLUSH, DURABILITY_FSYNC_PER_BATCH, DURABILITY_FSYNC_PER_MESSAGE)
+DURABILITY_MODE = os.getenv('DURABILITY_MODE', DURABILITY_FLUSH)
+
+RECORD_FORMAT_TEXT = 'text'
+RECORD_FORMAT_BINARY = 'binary'
+RECORD_FORMAT = os.getenv('RECORD_FORMAT', RECORD_FORMAT_BINARY)
+
+TEXT_MESSAGES_FILE_SUFFIX = '_messages.txt'
+TEXT_CHANGE_LOG_FILE_SUFFIX = '_change_log.log'
+MESSAGES_FILE_SUFFIX = '_messages.bin'
+CHANGE_LOG_FILE_SUFFIX = '_change_log.bin'
+CHECKPOINT_FILE_SUFFIX = '.checkpoint'
+
+# a group's ordering is checkpointed after this many change log entries,
+# or after len(message_ids) // CHANGE_LOG_CHECKPOINT_GROWTH_FACTOR entries for large groups
+CHANGE_LOG_CHECKPOINT_INTERVAL = 1000
+CHANGE_LOG_CHECKPOINT_GROWTH_FACTOR = 10
+
+# load only group metadata at startup, messages are read on first access to a group
+LAZY_GROUP_RECOVERY = os.getenv('LAZY_GROUP_RECOVERY', '1') == '1'
+# worker processes used to parse group files when recovery is not lazy
+RECOVERY_WORKERS = int(os.getenv('RECOVERY_WORKERS', os.cpu_count() or 1))
+
+# mmap keeps messages in memory mapped segment files with an in-memory offset
+# index and a bounded cache of decoded messages, memory keeps every message dict in RAM
+MESSAGE_STORAGE_MEMORY = 'memory'
+MESSAGE_STORAGE_MMAP = 'mmap'
+MESSAGE_STORAGE = os.getenv('MESSAGE_STORAGE', MESSAGE_STORAGE_MMAP)
+MESSAGE_STORE_DIR = 'message_store'
+MESSAGE_STORE_SEGMENT_SIZE = 256 * 1024 * 1024
+# sealed segments with at least this fraction of superseded versions are compacted
+MESSAGE_STORE_MIN_GARBAGE_RATIO = 0.5
+
+# memory budget of decoded messages kept by the mapped store, counted as serialized size
+MESSAGE_CACHE_POLICY_LRU = 'lru'
+MESSAGE_CACHE_POLICY_AGE = 'age'
+MESSAGE_CACHE_POLICIES = (MESSAGE_CACHE_POLICY_LRU, MESSAGE_CACHE_POLICY_AGE)
+MESSAGE_CACHE_POLICY = os.getenv('MESSAGE_CACHE_POLICY', MESSAGE_CACHE_POLICY_LRU)
+MESSAGE_CACHE_MAX_BYTES = int(os.getenv('MESSAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+MESSAGE_CACHE_STATS_INTERVAL = 60
+
+# rewrite group message files keeping only the latest version of every message
+MESSAGE_COMPACTION = os.getenv('MESSAGE_COMPACTION', '1') == '1'
+COMPACTION_INTERVAL = 60
+COMPACTION_MIN_SUPERSEDED_VERSIONS = 1000
+
+# max message ids per block of a group's ordering
+BLOCK_LIST_BLOCK_SIZE = 1024
+
+# GetMessages streams skip updates of a message superseded by a later update or by the
+# message's append or insert within the same read, participant deltas are always sent
+COALESCE_UPDATES = os.getenv('COALESCE_UPDATES', '1') == '1'
+
+# what a GetMessages stream more than STREAM_BUFFER_SIZE changes behind does:
+# block reads the backlog STREAM_BUFFER_SIZE changes at a time, coalesce skips
+# superseded updates, snapshot resends the latest messages, disconnect ends the stream
+SLOW_CONSUMER_BLOCK = 'block'
+SLOW_CONSUMER_COALESCE = 'coalesce'
+SLOW_CONSUMER_SNAPSHOT = 'snapshot'
+SLOW_CONSUMER_DISCONNECT = 'disconnect'
+SLOW_CONSUMER_POLICIES = (SLOW_CONSUMER_BLOCK, SLOW_CONSUMER_COALESCE, SLOW_CONSUMER_SNAPSHOT, SLOW_CONSUMER_DISCONNECT)
+SLOW_CONSUMER_POLICY = os.getenv('SLOW_CONSUMER_POLICY', SLOW_CONSUMER_BLOCK)
+STREAM_BUFFER_SIZE = 256
+STREAM_STATS_INTERVAL = 60
+
+# threads running the unary RPCs of the asyncio server, streams need none
+ASYNC_SERVER_WORKERS = 64
+
+# change log entries kept in memory per group, subscribers that fall further
+# behind get the last CHANGE_LOG_RESYNC_MESSAGES messages again
+CHANGE_LOG_CAPACITY = 10000
+CHANGE_LOG_RESYNC_MESSAGES = 10
+
+# GetHistory pages, a cursor names the message at the edge of a page and
+# where it was, the message is looked up from there in windows of
+# HISTORY_CURSOR_WINDOW ids, growing each time it is not found
+HISTORY_OLDER = 'older'
+HISTORY_NEWER = 'newer'
+HISTORY_DIRECTIONS = (HISTORY_OLDER, HISTORY_NEWER)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_CURSOR_WINDOW = 64
+
+# snowflake message ids: 41 bits milliseconds since the epoch, server id, sequence
+SNOWFLAKE_EPOCH_MS = 1_672_531_200_000
+SNOWFLAKE_SERVER_BITS = 10
+SNOWFLAKE_SEQUENCE_BITS = 12
+# client message ids of recent posts remembered with the snowflake id they got,
+# a retried PostMessage reuses the id and is dropped as a duplicate
+POSTED_MESSAGE_IDS_SIZE = 65536
+
+# vector orders messages by per-server vector clocks, hlc by one hybrid
+# logical clock plus server id, all servers of a cluster must use the same mode
+ORDERING_VECTOR = 'vector'
+ORDERING_HLC = 'hlc'
+ORDERING_MODES = (ORDERING_VECTOR, ORDERING_HLC)
+ORDERING_MODE = os.getenv('ORDERING_MODE', ORDERING_VECTOR)
+HLC_LOGICAL_BITS = 16
+
+# files keeps messages in memory backed by flat files, sqlite keeps them in a SQLite database
+STORAGE_FILES = 'files'
+STORAGE_SQLITE = 'sqlite'
+STORAGE_BACKENDS = (STORAGE_FILES, STORAGE_SQLITE)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', STORAGE_FILES)
+SQLITE_DB_FILE = 'chat.db'
+# sort keys of consecutive messages in a group's ordering
+SQLITE_SORT_KEY_GAP = 1 << 20
+# rows of the ordering read at once when placing an out of order message
+SQLITE_ORDERING_WINDOW = 64
+
+GROUP_COMMIT_WRITES = os.getenv('GROUP_COMMIT_WRITES', '1') == '1'
+COMMIT_WRITER_MAX_BATCH_SIZE = 1024
+
 DATA_STORE_FILE_PATH = os.path.join(DATA_STORE_FILE_DIR_PATH, 'server_datastore.json')
 
 CONNECTION_COMMANDS = ['c']
@@ -25,6 +145,9 @@ NEW = 'new'
 USER_JOIN = 'joined'
 USER_LEFT = 'left'
 PARTICIPANT_LIST = 'PARTICIPANT_LIST'
+PARTICIPANT_DELTA = 'PARTICIPANT_DELTA'
+# first message of a resync snapshot, clients drop their view of the group and rebuild it from the messages that follow
+RESYNC = 'RESYNC'
 
 MESSAGE_UPDATE_INTERVAL = 50
 
@@ -33,6 +156,9 @@ PING_INTERVAL = 1
 PING_TIMEOUT = 0.2
 
 MESSAGE_TIMEOUT = 0.5
+# queued messages sent to another server in one SyncMessagesToServer call
+SYNC_BATCH_SIZE = 256
+BATCH_MESSAGE_TIMEOUT = 5
 
 DELETE_MESSAGE_FROM_DISK_INTERVAL = 5
 
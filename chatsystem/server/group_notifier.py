@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class GroupNotifier:
+    """
+    Wakes the GetMessages streams of a group.
+
+    Every notify increments the group's sequence number and a stream waits
+    until the sequence number passes the last one it has seen, so a notify
+    between two reads of a stream is never lost and streams do not reset
+    each other's wakeups like with a shared threading.Event.
+    Streams of the asyncio server wait on futures instead of threads.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sequences = {}
+        self._conditions = {}
+        self._async_waiters = {}
+
+    def _condition(self, group_id):
+        condition = self._conditions.get(group_id)
+        if condition is None:
+            with self._lock:
+                condition = self._conditions.setdefault(group_id, threading.Condition())
+                self._sequences.setdefault(group_id, 0)
+        return condition
+
+    def sequence(self, group_id):
+        """
+        current sequence number, read it before reading the group's messages
+        """
+        with self._condition(group_id):
+            return self._sequences[group_id]
+
+    def notify(self, group_id):
+        condition = self._condition(group_id)
+        with condition:
+            self._sequences[group_id] += 1
+            condition.notify_all()
+            async_waiters = self._async_waiters.pop(group_id, [])
+        for loop, future in async_waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def wait(self, group_id, seen, timeout=None):
+        """
+        waits until the sequence number is past seen, returns the current one
+        """
+        condition = self._condition(group_id)
+        with condition:
+            condition.wait_for(lambda: self._sequences[group_id] > seen, timeout)
+            return self._sequences[group_id]
+
+    async def wait_async(self, group_id, seen):
+        """
+        wait for coroutines, returns the current sequence number once it is past seen
+        """
+        condition = self._condition(group_id)
+        with condition:
+            if self._sequences[group_id] > seen:
+                return self._sequences[group_id]
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._async_waiters.setdefault(group_id, []).append(waiter)
+        try:
+            await future
+        finally:
+            if future.cancelled():
+                # a stream whose client went away leaves no waiter behind in a quiet group
+                with condition:
+                    waiters = self._async_waiters.get(group_id, [])
+                    if waiter in waiters:
+                        waiters.remove(waiter)
+                    if not waiters:
+                        self._async_waiters.pop(group_id, None)
+        return self.sequence(group_id)
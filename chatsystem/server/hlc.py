@@ -0,0 +1,45 @@
+"""
+Hybrid logical clock
+
+a timestamp is one 64-bit integer, wall clock milliseconds in the high bits
+and a logical counter in the low HLC_LOGICAL_BITS bits. Timestamps never go
+backwards and exceed every timestamp received, so comparing two of them
+(with the server id as tie-break) orders causally related messages in O(1)
+"""
+import threading
+
+import server.constants as C
+from server.storage.utils import get_timestamp
+
+
+def physical_time():
+    return (get_timestamp() // 1000) << C.HLC_LOGICAL_BITS
+
+
+def split(hlc):
+    """
+    returns (milliseconds, logical counter)
+    """
+    return hlc >> C.HLC_LOGICAL_BITS, hlc & ((1 << C.HLC_LOGICAL_BITS) - 1)
+
+
+class HybridLogicalClock:
+    def __init__(self, last=0) -> None:
+        self._lock = threading.Lock()
+        self.last = last
+
+    def now(self):
+        """
+        timestamp for a local event
+        """
+        with self._lock:
+            self.last = max(self.last + 1, physical_time())
+            return self.last
+
+    def update(self, remote):
+        """
+        advances past a timestamp received from another server
+        """
+        with self._lock:
+            self.last = max(self.last + 1, remote + 1, physical_time())
+            return self.last
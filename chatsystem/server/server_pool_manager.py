@@ -9,8 +9,11 @@ import chat_system_pb2_grpc
 import server.constants as C
 from server.storage.file_manager import FileManager
 from server.storage.data_store import Datastore
-from server.storage.utils import get_timestamp
+from server.storage.utils import get_timestamp, get_monotonically_increasing_timestamp
+from server.hlc import HybridLogicalClock
+from server.vector_clock import VectorClock, to_map
 from queue import Queue
+from itertools import islice
 
 json_config = json.dumps(
     {
@@ -68,9 +71,10 @@ class ThreadSafeDict:
 
 
 class ServerPoolManager:
-    def __init__(self, id, file_manager: FileManager, data_store: Datastore) -> None:
+    def __init__(self, id, file_manager: FileManager, data_store: Datastore, ordering=C.ORDERING_MODE) -> None:
         """
         id: id of current server
+        ordering: C.ORDERING_VECTOR or C.ORDERING_HLC, decides which clock stamps messages
         """
         self.start_timestamp = get_timestamp()
         self.id = id
@@ -92,11 +96,12 @@ class ServerPoolManager:
         self.message_queues = {}
         self.recieved_server_timestamps = ThreadSafeDict()
         self.ping_server_timestamps = ThreadSafeDict()
-        self.vector_timestamp = {i: 0 for i in self.server_ids}
+        self.vector_timestamp = VectorClock()
+        self.ordering = ordering
+        self.hlc = HybridLogicalClock()
         # self.delete_timestamp_queue = Queue()
         self.delete_timestamp_queues = {i: Queue() for i in self.server_ids}
         self.vector_timestamp_lock = threading.Lock()
-        self.message_timestamp_lock = threading.Lock()
         self.queue_timestamp_dict = ThreadSafeDict()
         self.create_message_queues()
         self.load_queue_messages_from_disk()
@@ -108,17 +113,39 @@ class ServerPoolManager:
         
     def update_vector_timestamp(self, message=None):
         with self.vector_timestamp_lock:
-            if message:
-                # print(message)
-                # print(self.vector_timestamp)
-                for key in self.vector_timestamp:
-                    self.vector_timestamp[key] = max(self.vector_timestamp[key], message.get('vector_timestamp')[key])
-                # self.vector_timestamp = list(map(max, zip(self.vector_timestamp, message.get('vector_timestamp'))))
-            self.vector_timestamp[str(self.id)] += 1
+            if message and message.get('vector_timestamp') is not None:
+                self.vector_timestamp = self.vector_timestamp.merge(VectorClock.of(message['vector_timestamp']))
+            self.vector_timestamp = self.vector_timestamp.increment(self.id)
             self.file_manager.fast_write(f"{self.id}/{self.id}_vector_timestamp", json.dumps(self.vector_timestamp).encode('utf-8'))
             if not message:
-                return self.vector_timestamp.copy()
+                return self.vector_timestamp
     
+    def update_hlc(self, message=None):
+        if message and message.get('hlc'):
+            timestamp = self.hlc.update(message['hlc'])
+        else:
+            timestamp = self.hlc.now()
+        self.file_manager.fast_write(f"{self.id}/{self.id}_hlc_timestamp", json.dumps(timestamp).encode('utf-8'))
+        return timestamp
+
+    def timestamp_message(self, message):
+        """
+        stamps a local message with the clock of the ordering mode
+        """
+        if self.ordering == C.ORDERING_HLC:
+            message['hlc'] = self.update_hlc()
+        else:
+            message['vector_timestamp'] = self.update_vector_timestamp()
+
+    def update_clock(self, message):
+        """
+        advances the clock of the ordering mode past a message from another server
+        """
+        if self.ordering == C.ORDERING_HLC:
+            self.update_hlc(message)
+        else:
+            self.update_vector_timestamp(message)
+
     def join_server(self, server_string, server_id):
         try:
             # print(f"Trying to connect to server: {server_string}")
@@ -249,34 +276,25 @@ class ServerPoolManager:
                             if self.active_stubs.get(server_id) is None or not self.connected_servers[server_id]:
                                 # if stub is None, don't wait for new messages
                                 break
-                            queue_message = message_queue.queue[0]
-                            timestamp, message = queue_message
-                            source_server_id = message['server_id']
-                            # print('message', message)
-                            server_message = chat_system_pb2.ServerMessage(
-                                group_id=message.get('group_id'),
-                                user_id=message.get('user_id'),
-                                creation_time=message.get('creation_time'),
-                                text=message.get('text'),
-                                message_id=message.get('message_id'),
-                                likes=message.get('likes'),
-                                message_type=message.get('message_type'),
-                                vector_timestamp =message.get('vector_timestamp'),
-                                event_type=message.get('event_type'),
-                                users=message.get('users'),
-                                server_id=message['server_id'],
-                                vector_timestamp_2=message.get('vector_timestamp_2'),
-                                updated_time=message.get('updated_time'),
-                                server_time=message.get('server_time')
-                            )
+                            # everything queued so far goes out in one batch, e.g. after a reconnect
+                            with message_queue.mutex:
+                                queue_messages = list(islice(message_queue.queue, C.SYNC_BATCH_SIZE))
                             try:
-                                status = stub.SyncMessagetoServer(server_message, timeout=C.MESSAGE_TIMEOUT)
+                                if len(queue_messages) == 1:
+                                    status = stub.SyncMessagetoServer(self.to_server_message(queue_messages[0][1]), timeout=C.MESSAGE_TIMEOUT)
+                                else:
+                                    status = stub.SyncMessagesToServer(chat_system_pb2.ServerMessageBatch(
+                                        messages=[self.to_server_message(message) for _, message in queue_messages]
+                                    ), timeout=C.BATCH_MESSAGE_TIMEOUT)
                                 if status.status:
-                                    message_queue.get(0)
-                                    if timestamp > 0 and source_server_id == self.id:
-                                        self.queue_timestamp_dict[server_id] = timestamp
-                                        if timestamp:
-                                            self.file_manager.fast_write(f"{self.id}/{server_id}_last_sent_timestamp", json.dumps(timestamp).encode('utf-8'))
+                                    last_sent_timestamp = 0
+                                    for timestamp, message in queue_messages:
+                                        message_queue.get(0)
+                                        if timestamp > 0 and message['server_id'] == self.id:
+                                            last_sent_timestamp = max(last_sent_timestamp, timestamp)
+                                    if last_sent_timestamp:
+                                        self.queue_timestamp_dict[server_id] = last_sent_timestamp
+                                        self.file_manager.fast_write(f"{self.id}/{server_id}_last_sent_timestamp", json.dumps(last_sent_timestamp).encode('utf-8'))
 
                             except grpc.RpcError as er:
                                 logging.error(f'error sending message to {server_id}')
@@ -300,6 +318,26 @@ class ServerPoolManager:
                 del self.active_stubs[server_id]
         pass
 
+    def to_server_message(self, message):
+        return chat_system_pb2.ServerMessage(
+            group_id=message.get('group_id'),
+            user_id=message.get('user_id'),
+            creation_time=message.get('creation_time'),
+            text=message.get('text'),
+            message_id=message.get('message_id'),
+            likes=message.get('likes'),
+            message_type=message.get('message_type'),
+            vector_timestamp=to_map(message.get('vector_timestamp')),
+            event_type=message.get('event_type'),
+            users=message.get('users'),
+            server_id=message['server_id'],
+            vector_timestamp_2=to_map(message.get('vector_timestamp_2')),
+            updated_time=message.get('updated_time'),
+            server_time=message.get('server_time'),
+            hlc=message.get('hlc'),
+            hlc_2=message.get('hlc_2')
+        )
+
     def send_msg_to_recovered_servers(self, recovered_server_id, server_view, server_timestamps, replay_server_id):
 
         ## Update server view for recovered server
@@ -385,8 +423,7 @@ class ServerPoolManager:
         return sorted([s for s in self.connected_servers.keys() if self.connected_servers[s]])
     
     def get_unique_timestamp(self):
-        with self.message_timestamp_lock:
-            return get_timestamp()
+        return get_monotonically_increasing_timestamp()
         
     def delete_queue_messages(self):
         sleep(10)
@@ -442,7 +479,11 @@ class ServerPoolManager:
                     lines = self.file_manager.fast_read(f"{sid}/{file}")
                     data = json.loads(lines)
                     if data:
-                        self.vector_timestamp = data
+                        # older servers stored a {server_id: counter} map
+                        self.vector_timestamp = VectorClock.of(data)
+
+                if file.endswith('_hlc_timestamp'):
+                    self.hlc = HybridLogicalClock(int(json.loads(self.file_manager.fast_read(f"{sid}/{file}"))))
                     
             for file in queue_msg_files:
                 if not file.endswith('_timestamp'):
@@ -468,14 +509,14 @@ class ServerPoolManager:
         pass
 
     def check_message(self, message, event_type):
-        if 'vector_timestamp' not in message:
-            message['vector_timestamp'] = self.update_vector_timestamp()
+        if 'vector_timestamp' not in message and 'hlc' not in message:
+            self.timestamp_message(message)
         if 'server_id' not in message:
             message['server_id'] = self.id
         if 'event_type' not in message:
             message['event_type'] = event_type
         if 'creation_time' not in message:
-            message['creation_time'] = get_timestamp()
+            message['creation_time'] = get_monotonically_increasing_timestamp()
         if 'server_time' not in message:
             message['server_time'] = self.get_unique_timestamp()
 
@@ -497,8 +538,16 @@ class ServerPoolManager:
         file_name = str(timestamp)
         self.file_manager.fast_write(f"{self.id}/{file_name}", json.dumps(message).encode('utf-8'))
 
-    def log_message(self, message):
-        
+    def encode_message(self, message):
+        """
+        JSON of a received message for log_message, taken before the datastore changes the message
+        """
+        return json.dumps(message).encode('utf-8')
+
+    def log_message(self, message, payload=None):
+        """
+        payload: encode_message of message as received, encoded here if not given
+        """
         server_id = str(message['server_id'])
         server_time = int(message['server_time'])
 
@@ -510,6 +559,6 @@ class ServerPoolManager:
         if server_id != str(self.id):
             q = self.delete_timestamp_queues.get(server_id)
             if q:
-                self.file_manager.fast_write(f"{server_id}/{server_time}", json.dumps(message).encode('utf-8'))
+                self.file_manager.fast_write(f"{server_id}/{server_time}", payload if payload is not None else self.encode_message(message))
                 q.put(server_time)
 
@@ -0,0 +1,72 @@
+"""
+Snowflake message ids
+
+an id is one 63-bit integer, milliseconds since C.SNOWFLAKE_EPOCH_MS in the
+high bits, then the server id, then a per-millisecond sequence. Ids of one
+server increase with creation time and ids of different servers never
+collide. Messages carry the fixed width hex string of the id, so ids still
+fit the string message_id of the protos and of older data (uuid4 strings),
+and comparing two id strings gives the same order as comparing the integers
+"""
+import threading
+
+import server.constants as C
+from server.storage.utils import get_timestamp
+
+SERVER_SHIFT = C.SNOWFLAKE_SEQUENCE_BITS
+TIME_SHIFT = C.SNOWFLAKE_SEQUENCE_BITS + C.SNOWFLAKE_SERVER_BITS
+MAX_SEQUENCE = (1 << C.SNOWFLAKE_SEQUENCE_BITS) - 1
+ID_WIDTH = 16
+
+
+def to_string(message_id):
+    return format(message_id, f'0{ID_WIDTH}x')
+
+
+def from_string(message_id):
+    """
+    integer of an id string, None for ids that are not snowflake ids
+    """
+    if len(message_id) != ID_WIDTH:
+        return None
+    try:
+        return int(message_id, 16)
+    except ValueError:
+        return None
+
+
+def split(message_id):
+    """
+    returns (unix milliseconds, server id, sequence)
+    """
+    return ((message_id >> TIME_SHIFT) + C.SNOWFLAKE_EPOCH_MS,
+            (message_id >> SERVER_SHIFT) & ((1 << C.SNOWFLAKE_SERVER_BITS) - 1),
+            message_id & MAX_SEQUENCE)
+
+
+class SnowflakeIdGenerator:
+    def __init__(self, server_id) -> None:
+        server_id = int(server_id)
+        if not 0 <= server_id < 1 << C.SNOWFLAKE_SERVER_BITS:
+            raise Exception(f"Server id {server_id} does not fit in {C.SNOWFLAKE_SERVER_BITS} bits")
+        self.server_id = server_id
+        self._lock = threading.Lock()
+        self.last_time = 0
+        self.sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            # the wall clock may step back, keep counting in the last millisecond then,
+            # a full millisecond borrows the next one so ids never repeat
+            now = max(get_timestamp() // 1000 - C.SNOWFLAKE_EPOCH_MS, self.last_time)
+            if now == self.last_time:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    now += 1
+            else:
+                self.sequence = 0
+            self.last_time = now
+            return (now << TIME_SHIFT) | (self.server_id << SERVER_SHIFT) | self.sequence
+
+    def next_string_id(self):
+        return to_string(self.next_id())
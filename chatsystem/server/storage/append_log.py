@@ -0,0 +1,207 @@
+import os
+import threading
+from collections import OrderedDict
+
+import server.constants as C
+
+
+def segment_path(path, segment):
+    """
+    segment 0 keeps the original file name, rolled segments get a numeric suffix
+    """
+    if segment == 0:
+        return path
+    return f'{path}.{segment:06d}'
+
+
+def parse_segment_name(file):
+    """
+    returns (base file name, segment number) for a file name on disk
+    """
+    base, _, suffix = file.rpartition('.')
+    if base and len(suffix) == 6 and suffix.isdigit():
+        return base, int(suffix)
+    return file, 0
+
+
+class SegmentedAppendLog:
+    """
+    Append only writer that keeps file handles open between appends.
+
+    Every logical file is stored as one or more segments, a new segment is
+    started once the active one grows past segment_size. At most
+    max_open_files handles are kept open, the least recently used one is
+    closed when the limit is reached.
+    """
+    def __init__(self, root, max_open_files=C.APPEND_LOG_MAX_OPEN_FILES, segment_size=C.APPEND_LOG_SEGMENT_SIZE) -> None:
+        self.root = root
+        self.max_open_files = max_open_files
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()
+        self._sizes = {}
+        # file suffix -> header written at the start of every new segment
+        self.headers = {}
+        # rolled segment numbers of every logical file, segment 0 is not tracked here
+        self._segments = {}
+        for file in os.listdir(root):
+            base, segment = parse_segment_name(file)
+            if segment:
+                self._segments.setdefault(base, []).append(segment)
+        for segments in self._segments.values():
+            segments.sort()
+
+    def segments(self, file):
+        """
+        returns paths of all segments of file, oldest first
+        """
+        path = os.path.join(self.root, file)
+        with self._lock:
+            rolled = list(self._segments.get(file, []))
+        paths = [path] if os.path.exists(path) else []
+        return paths + [segment_path(path, segment) for segment in rolled]
+
+    def _active_segment(self, file):
+        rolled = self._segments.get(file)
+        return rolled[-1] if rolled else 0
+
+    def _open(self, file):
+        handle = self._handles.get(file)
+        if handle is not None:
+            self._handles.move_to_end(file)
+            return handle
+        if len(self._handles) >= self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        path = segment_path(os.path.join(self.root, file), self._active_segment(file))
+        handle = open(path, 'ab')
+        self._handles[file] = handle
+        self._sizes[file] = handle.tell()
+        return handle
+
+    def _roll(self, file):
+        handle = self._handles.pop(file, None)
+        if handle is not None:
+            handle.close()
+        self._segments.setdefault(file, []).append(self._active_segment(file) + 1)
+        self._sizes[file] = 0
+
+    def roll(self, file):
+        """
+        seals the active segment of file and starts a new one
+        returns False when the active segment is still empty
+        """
+        with self._lock:
+            size = self._sizes.get(file)
+            if size is None:
+                path = segment_path(os.path.join(self.root, file), self._active_segment(file))
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+            if not size:
+                return False
+            self._roll(file)
+            handle = self._open(file)
+            header = self._header(file)
+            handle.write(header)
+            handle.flush()
+            self._sizes[file] += len(header)
+            return True
+
+    def sealed_segments(self, file):
+        """
+        returns paths of the segments of file that are no longer appended to, oldest first
+        """
+        return self.segments(file)[:-1]
+
+    def remove_segments(self, file, paths):
+        """
+        deletes sealed segments of file, the active segment is never removed
+        """
+        base = os.path.join(self.root, file)
+        with self._lock:
+            active = segment_path(base, self._active_segment(file))
+            rolled = self._segments.get(file, [])
+            for path in paths:
+                if path == active:
+                    continue
+                _, segment = parse_segment_name(os.path.basename(path))
+                if segment in rolled:
+                    rolled.remove(segment)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _header(self, file):
+        for suffix, header in self.headers.items():
+            if file.endswith(suffix):
+                return header
+        return b''
+
+    def append(self, file, data: bytes, flush=True):
+        with self._lock:
+            handle = self._open(file)
+            if self._sizes[file] and self._sizes[file] + len(data) > self.segment_size:
+                self._roll(file)
+                handle = self._open(file)
+            if not self._sizes[file]:
+                header = self._header(file)
+                handle.write(header)
+                self._sizes[file] += len(header)
+            handle.write(data)
+            if flush:
+                handle.flush()
+            self._sizes[file] += len(data)
+
+    def flush(self, file=None):
+        with self._lock:
+            if file is None:
+                for handle in self._handles.values():
+                    handle.flush()
+            elif file in self._handles:
+                self._handles[file].flush()
+
+    def sync(self, file):
+        """
+        flushes file and forces its active segment to disk
+        """
+        with self._lock:
+            handle = self._handles.get(file)
+            if handle is not None:
+                handle.flush()
+                os.fsync(handle.fileno())
+                return
+            path = segment_path(os.path.join(self.root, file), self._active_segment(file))
+        if os.path.exists(path):
+            file_desc = os.open(path, os.O_RDONLY)
+            os.fsync(file_desc)
+            os.close(file_desc)
+
+    def close(self, file=None, sync=False):
+        with self._lock:
+            if file is None:
+                for handle in self._handles.values():
+                    if sync:
+                        handle.flush()
+                        os.fsync(handle.fileno())
+                    handle.close()
+                self._handles.clear()
+                self._sizes.clear()
+            else:
+                handle = self._handles.pop(file, None)
+                self._sizes.pop(file, None)
+                if handle is not None:
+                    handle.close()
+
+    def delete(self, file):
+        paths = self.segments(file)
+        with self._lock:
+            handle = self._handles.pop(file, None)
+            if handle is not None:
+                handle.close()
+            self._sizes.pop(file, None)
+            self._segments.pop(file, None)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,141 @@
+import server.constants as C
+
+
+class BlockList:
+    """
+    Sequence with O(log n) positional insert and index lookup.
+
+    Items are kept in blocks of at most block_size items, a block is split
+    in half when it overflows. A Fenwick tree over the block lengths maps an
+    index to its block, so an insert only shifts the items of one block
+    instead of the whole sequence.
+    """
+    def __init__(self, iterable=(), block_size=C.BLOCK_LIST_BLOCK_SIZE) -> None:
+        self.block_size = block_size
+        items = list(iterable)
+        half = max(1, block_size // 2)
+        self._blocks = [items[i:i + half] for i in range(0, len(items), half)]
+        self._len = len(items)
+        self._build_tree()
+
+    def _build_tree(self):
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._top = 1 << (len(self._blocks).bit_length() - 1) if self._blocks else 0
+
+    def _add(self, block, delta):
+        i = block + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index):
+        """
+        returns (block, offset in block) of 0 <= index < len
+        """
+        position = 0
+        step = self._top
+        while step:
+            next_position = position + step
+            if next_position < len(self._tree) and self._tree[next_position] <= index:
+                position = next_position
+                index -= self._tree[next_position]
+            step >>= 1
+        return position, index
+
+    def _prefix(self, block):
+        """
+        number of items before block
+        """
+        total = 0
+        while block > 0:
+            total += self._tree[block]
+            block -= block & -block
+        return total
+
+    def bisect(self, goes_before):
+        """
+        returns the index of the first item for which goes_before(item) is
+        true, the sequence has to be partitioned by goes_before
+        needs O(log n) calls of goes_before and no index lookups
+        """
+        left, right = 0, len(self._blocks)
+        while left < right:
+            mid = (left + right) // 2
+            if goes_before(self._blocks[mid][-1]):
+                right = mid
+            else:
+                left = mid + 1
+        if left == len(self._blocks):
+            return self._len
+        items = self._blocks[left]
+        low, high = 0, len(items) - 1
+        while low < high:
+            mid = (low + high) // 2
+            if goes_before(items[mid]):
+                high = mid
+            else:
+                low = mid + 1
+        return self._prefix(left) + low
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    def __repr__(self) -> str:
+        return f'BlockList({list(self)})'
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            items = []
+            if start >= stop:
+                return items
+            block, offset = self._locate(start)
+            while len(items) < stop - start:
+                items.extend(self._blocks[block][offset:offset + stop - start - len(items)])
+                block += 1
+                offset = 0
+            return items
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('BlockList index out of range')
+        block, offset = self._locate(index)
+        return self._blocks[block][offset]
+
+    def append(self, value):
+        if not self._blocks or len(self._blocks[-1]) >= self.block_size:
+            self._blocks.append([value])
+            self._len += 1
+            self._build_tree()
+            return
+        self._blocks[-1].append(value)
+        self._len += 1
+        self._add(len(self._blocks) - 1, 1)
+
+    def insert(self, index, value):
+        if index < 0:
+            index = max(0, index + self._len)
+        if index >= self._len:
+            self.append(value)
+            return
+        block, offset = self._locate(index)
+        items = self._blocks[block]
+        items.insert(offset, value)
+        self._len += 1
+        if len(items) > self.block_size:
+            half = len(items) // 2
+            self._blocks[block:block + 1] = [items[:half], items[half:]]
+            self._build_tree()
+        else:
+            self._add(block, 1)
@@ -0,0 +1,150 @@
+import threading
+from collections import deque
+from itertools import islice
+
+import server.constants as C
+
+
+def superseded(changes, folded=None):
+    """
+    indexes of the UPDATE changes followed by a later UPDATE of the same message
+    or following the APPEND or INSERT of the message, which then stands for the
+    message as it is now, a reader skipping them ends up with the same messages
+    folded: set that gets the indexes of the APPEND and INSERT changes updates were folded into
+    USERS_UPDATE changes are participant deltas and are never skipped
+    """
+    latest_updates = {}
+    indexes = set()
+    for index in range(len(changes) - 1, -1, -1):
+        change = changes[index]
+        message_id = change.get('message_id')
+        if change['type'] == C.CHANGE_LOG_UPDATE:
+            if message_id in latest_updates:
+                indexes.add(index)
+            else:
+                latest_updates[message_id] = index
+        elif change['type'] in (C.CHANGE_LOG_APPEND, C.CHANGE_LOG_INSERT) and message_id in latest_updates:
+            indexes.add(latest_updates[message_id])
+            if folded is not None:
+                folded.add(index)
+    return indexes
+
+
+class ChangeLog:
+    """
+    Bounded in-memory change log of one group.
+
+    Positions are absolute, len() is the position the next change gets.
+    Subscribers report the position they have read up to, entries every
+    subscriber has read are dropped and at most capacity entries are kept.
+    A subscriber whose position was dropped has to resync from a snapshot.
+    The serialized form of an entry is built for the first reader and kept
+    next to the entry for all others.
+    """
+    def __init__(self, capacity=C.CHANGE_LOG_CAPACITY) -> None:
+        self.capacity = capacity
+        self.entries = deque()
+        self.encoded = deque()
+        self.start = 0
+        self.cursors = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.start + len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def append(self, change):
+        with self._lock:
+            self.entries.append(change)
+            self.encoded.append(None)
+            self._trim()
+
+    def extend(self, changes):
+        with self._lock:
+            changes = list(changes)
+            self.entries.extend(changes)
+            self.encoded.extend([None] * len(changes))
+            self._trim()
+
+    def _offsets(self, position, limit, coalesce, folded=None):
+        first = position - self.start
+        last = len(self.entries) if limit is None else min(len(self.entries), first + limit)
+        offsets = range(first, last)
+        if coalesce:
+            window_folded = set()
+            skip = superseded(list(islice(self.entries, first, last)), window_folded)
+            offsets = [offset for offset in offsets if offset - first not in skip]
+            if folded is not None:
+                folded.update(first + index for index in window_folded)
+        return offsets
+
+    def since(self, position, limit=None, coalesce=False):
+        """
+        changes from position on, None if they were already dropped
+        limit: at most this many changes
+        coalesce: leave out superseded changes
+        """
+        with self._lock:
+            if position < self.start:
+                return None
+            if limit is None and not coalesce:
+                return list(islice(self.entries, position - self.start, None))
+            return [self.entries[offset] for offset in self._offsets(position, limit, coalesce)]
+
+    def since_encoded(self, position, encode, limit=None, coalesce=False):
+        """
+        like since, every change serialized with encode(change) once for all readers
+        APPEND and INSERT changes later updates were folded into are serialized again,
+        the shared payload can be older than those updates
+        """
+        with self._lock:
+            if position < self.start:
+                return None
+            payloads = []
+            folded = set()
+            for offset in self._offsets(position, limit, coalesce, folded):
+                payload = self.encoded[offset]
+                if offset in folded:
+                    payload = encode(self.entries[offset])
+                elif payload is None:
+                    payload = self.encoded[offset] = encode(self.entries[offset])
+                payloads.append(payload)
+            return payloads
+
+    def advance(self, subscriber, position):
+        """
+        subscriber has read every change before position
+        """
+        with self._lock:
+            self.cursors[subscriber] = position
+            self._trim()
+
+    def release(self, subscriber):
+        with self._lock:
+            self.cursors.pop(subscriber, None)
+            self._trim()
+
+    def low_water_mark(self):
+        """
+        first position some subscriber has not read yet
+        """
+        end = self.start + len(self.entries)
+        return min(self.cursors.values(), default=end)
+
+    def _trim(self):
+        drop = min(max(self.low_water_mark() - self.start, len(self.entries) - self.capacity, 0), len(self.entries))
+        for _ in range(drop):
+            self.entries.popleft()
+            self.encoded.popleft()
+        self.start += drop
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'start': self.start,
+                'end': self.start + len(self.entries),
+                'subscribers': len(self.cursors),
+            }
@@ -0,0 +1,102 @@
+import logging
+import threading
+from collections import deque
+
+import server.constants as C
+from server.storage.append_log import SegmentedAppendLog
+
+
+class CommitWriter:
+    """
+    Background writer that applies queued file operations in batches.
+
+    Appends from all groups are written in one pass and made durable
+    according to the durability mode:
+        none               leave data in the process buffers
+        flush              flush touched files to the OS after every batch
+        fsync-per-batch    flush and fsync touched files after every batch
+        fsync-per-message  flush and fsync after every single append
+    Other operations (overwrites, deletes) are applied in submission order.
+    """
+    def __init__(self, append_log: SegmentedAppendLog, durability=C.DURABILITY_MODE, max_batch_size=C.COMMIT_WRITER_MAX_BATCH_SIZE) -> None:
+        if durability not in C.DURABILITY_MODES:
+            raise Exception(f"Unknown durability mode {durability}")
+        self.append_log = append_log
+        self.durability = durability
+        self.max_batch_size = max_batch_size
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _submit(self, item):
+        with self._condition:
+            self._pending.append(item)
+            self._submitted += 1
+            self._condition.notify_all()
+
+    def append(self, file, data: bytes):
+        self._submit((file, data))
+
+    def submit(self, func, *args):
+        self._submit((None, (func, args)))
+
+    def drain(self):
+        """
+        blocks until everything submitted so far has been written
+        """
+        with self._condition:
+            target = self._submitted
+            self._condition.wait_for(lambda: self._committed >= target or not self._thread.is_alive())
+
+    def close(self):
+        self.drain()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or not self._running)
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                batch.append(self._pending.popleft())
+            return batch
+
+    def _write_batch(self, batch):
+        touched = set()
+        for file, data in batch:
+            try:
+                if file is None:
+                    func, args = data
+                    func(*args)
+                    continue
+                self.append_log.append(file, data, flush=False)
+                if self.durability == C.DURABILITY_FSYNC_PER_MESSAGE:
+                    self.append_log.sync(file)
+                else:
+                    touched.add(file)
+            except Exception as e:
+                logging.error(f'Error in commit writer: {e}')
+        for file in touched:
+            try:
+                if self.durability == C.DURABILITY_FLUSH:
+                    self.append_log.flush(file)
+                elif self.durability == C.DURABILITY_FSYNC_PER_BATCH:
+                    self.append_log.sync(file)
+            except Exception as e:
+                logging.error(f'Error in commit writer: {e}')
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._write_batch(batch)
+            with self._condition:
+                self._committed += len(batch)
+                self._condition.notify_all()
@@ -0,0 +1,166 @@
+"""
+Background compaction of group message files
+
+every like / unlike appends a full new version of the message, the
+compactor rewrites the sealed segments of a group's message file keeping
+only the latest version of every message
+
+the active segment is sealed first so writers keep appending to a fresh
+segment while the old ones are rewritten. The result replaces the newest
+sealed segment atomically and the older sealed segments are deleted after
+that, a crash in between leaves duplicates that recovery already resolves
+by keeping the last version
+
+with mmap message storage the store's own segments are compacted in the
+same pass, see MappedMessageStore.compact
+"""
+import os
+import json
+import logging
+import threading
+
+import server.constants as C
+from server.storage import record_format as RF
+from server.storage.file_manager import FileManager
+
+
+def latest_versions(paths, record_format):
+    """
+    returns the latest stored version of every message in paths as
+    message_id -> serialized version, in the format of the file
+    """
+    versions = {}
+    if record_format == C.RECORD_FORMAT_BINARY:
+        for payload in RF.read_records(paths, RF.RECORD_KIND_MESSAGE):
+            message_id = RF.record_to_message(payload)['message_id']
+            versions.pop(message_id, None)
+            versions[message_id] = RF.encode_record(payload)
+        return versions
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    message_id = json.loads(line)['message_id']
+                except (json.decoder.JSONDecodeError, KeyError):
+                    continue
+                versions.pop(message_id, None)
+                versions[message_id] = line if line.endswith('\n') else f'{line}\n'
+    return versions
+
+
+def rewrite_segments(paths, record_format):
+    """
+    writes the latest versions of the messages in paths over the last of
+    them, the other paths are left for the caller to delete
+    returns (bytes before, bytes after)
+    """
+    bytes_before = sum(os.path.getsize(path) for path in paths)
+    versions = latest_versions(paths, record_format)
+    target = paths[-1]
+    mode = 'wb' if record_format == C.RECORD_FORMAT_BINARY else 'w'
+    with open(f'{target}.tmp', mode) as f:
+        if record_format == C.RECORD_FORMAT_BINARY:
+            f.write(RF.file_header(RF.RECORD_KIND_MESSAGE))
+        for version in versions.values():
+            f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{target}.tmp', target)
+    return bytes_before, os.path.getsize(target)
+
+
+class MessageCompactor:
+    """
+    Periodically compacts the message files of groups with enough
+    superseded message versions and the segments of the message store
+    """
+    def __init__(self, file_manager: FileManager, get_group_lock, record_format=C.RECORD_FORMAT, interval=C.COMPACTION_INTERVAL, min_superseded=C.COMPACTION_MIN_SUPERSEDED_VERSIONS, message_store=None) -> None:
+        self.file_manager = file_manager
+        self.message_store = message_store
+        self.get_group_lock = get_group_lock
+        self.record_format = record_format
+        self.interval = interval
+        self.min_superseded = min_superseded
+        self._lock = threading.Lock()
+        # group_id -> message versions written that replaced an earlier version
+        self.superseded = {}
+        self.compactions = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.message_store_bytes_reclaimed = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def add_superseded(self, group_id, count=1):
+        with self._lock:
+            self.superseded[group_id] = self.superseded.get(group_id, 0) + count
+
+    def messages_file(self, group_id):
+        if self.record_format == C.RECORD_FORMAT_BINARY:
+            return f'{group_id}{C.MESSAGES_FILE_SUFFIX}'
+        return f'{group_id}{C.TEXT_MESSAGES_FILE_SUFFIX}'
+
+    def compact_group(self, group_id):
+        """
+        compacts the group's message file, returns the number of bytes reclaimed
+        """
+        file = self.messages_file(group_id)
+        with self.get_group_lock(group_id):
+            with self._lock:
+                self.superseded.pop(group_id, None)
+            self.file_manager.roll(file)
+            paths = self.file_manager.sealed_segment_paths(file)
+        if not paths:
+            return 0
+        bytes_before, bytes_after = rewrite_segments(paths, self.record_format)
+        # lazy group loads read the segment list under the group lock
+        with self.get_group_lock(group_id):
+            self.file_manager.remove_segments(file, paths[:-1])
+        with self._lock:
+            self.compactions += 1
+            self.bytes_before += bytes_before
+            self.bytes_after += bytes_after
+        logging.info(f'Compacted {file}: {bytes_before} -> {bytes_after} bytes')
+        return bytes_before - bytes_after
+
+    def compact(self):
+        with self._lock:
+            group_ids = [group_id for group_id, count in self.superseded.items() if count >= self.min_superseded]
+        for group_id in group_ids:
+            try:
+                self.compact_group(group_id)
+            except Exception as e:
+                logging.error(f'Error compacting group {group_id}: {e}')
+        if self.message_store is not None:
+            try:
+                reclaimed = self.message_store.compact()
+            except Exception as e:
+                logging.error(f'Error compacting the message store: {e}')
+                return
+            with self._lock:
+                self.message_store_bytes_reclaimed += reclaimed
+            if reclaimed:
+                logging.info(f'Compacted the message store: {reclaimed} bytes reclaimed')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'compactions': self.compactions,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'bytes_reclaimed': self.bytes_before - self.bytes_after,
+                'message_store_bytes_reclaimed': self.message_store_bytes_reclaimed
+            }
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.compact()
@@ -1,15 +1,24 @@
 
 import threading
 import os
+from time import sleep
 import json
 import logging
 import copy
 from collections import Counter
-from functools import lru_cache
+from functools import cmp_to_key
 import server.constants as C
 from server.storage.data_manager import DataManager
 from server.storage.file_manager import FileManager
-from server.storage.utils import is_valid_message, get_timestamp, get_unique_id, clean_message
+from server.storage import record_format as RF
+from server.storage import recovery
+from server.storage.compactor import MessageCompactor
+from server.storage.block_list import BlockList
+from server.storage.change_log import ChangeLog
+from server.storage.membership import Membership, list_delta
+from server.storage.message_store import MappedMessageStore
+from server.storage.utils import is_valid_message, get_timestamp, get_unique_id, clean_message, get_monotonically_increasing_timestamp, message_view, encode_history_cursor, decode_history_cursor
+from server.vector_clock import VectorClock
 
 class ServerCollection():
     def __init__(self, initial={}):
@@ -48,22 +57,73 @@ class ServerCollection():
 
 class Datastore(DataManager):
 
-    def __init__(self, file_manager: FileManager, server_id=None, messages={}, sessions={}, groups={}) -> None:
+    def __init__(self, file_manager: FileManager, server_id=None, messages={}, sessions={}, groups={}, record_format=C.RECORD_FORMAT, lazy_recovery=C.LAZY_GROUP_RECOVERY, recovery_workers=C.RECOVERY_WORKERS, message_storage=C.MESSAGE_STORAGE, compaction=C.MESSAGE_COMPACTION, ordering=C.ORDERING_MODE) -> None:
         # messages = {message_object, }
         super().__init__()
         self.server_id = server_id
         self._lock = threading.Lock()
         self.locks = ServerCollection()
-        self.messages = ServerCollection(messages)
+        if message_storage == C.MESSAGE_STORAGE_MMAP:
+            self.messages = MappedMessageStore(os.path.join(file_manager.root, C.MESSAGE_STORE_DIR))
+            threading.Thread(target=self.log_message_cache_stats, daemon=True).start()
+        elif message_storage == C.MESSAGE_STORAGE_MEMORY:
+            self.messages = ServerCollection(messages)
+        else:
+            raise Exception(f"Unknown message storage {message_storage}")
         self.sessions = ServerCollection(sessions)
         self.groups = ServerCollection(groups)
         self.call_backs = {}
         self.loaded_data = False
         self.file_manager = file_manager
-        self.recover_data_from_disk()
+        # number of change log entries on disk and the offset of the latest checkpoint per group
+        self.change_log_lengths = {}
+        self.checkpoint_offsets = {}
+        # groups whose messages and ordering are still only on disk
+        self.lazy_recovery = lazy_recovery
+        self.unloaded_groups = set()
+        self.recovery_workers = recovery_workers
+        if record_format not in (C.RECORD_FORMAT_TEXT, C.RECORD_FORMAT_BINARY):
+            raise Exception(f"Unknown record format {record_format}")
+        self.record_format = record_format
+        if ordering not in C.ORDERING_MODES:
+            raise Exception(f"Unknown ordering mode {ordering}")
+        self.ordering = ordering
+        self.file_manager.register_header(C.MESSAGES_FILE_SUFFIX, RF.file_header(RF.RECORD_KIND_MESSAGE))
+        self.file_manager.register_header(C.CHANGE_LOG_FILE_SUFFIX, RF.file_header(RF.RECORD_KIND_CHANGE_LOG))
+        self.compactor = MessageCompactor(file_manager, self.get_group_lock, record_format=record_format, message_store=self.messages if isinstance(self.messages, MappedMessageStore) else None)
+        self.open_storage(compaction)
 
         # self.reorder_messages()
+
+    def open_storage(self, compaction):
+        """
+        recovers the groups and messages from the flat files and starts the compactor,
+        backends keeping them elsewhere replace this step
+        """
+        self.recover_data_from_disk()
+        if compaction:
+            self.compactor.start()
     
+    def close(self):
+        self.compactor.close()
+        if isinstance(self.messages, MappedMessageStore):
+            self.messages.close()
+
+    def get_message_cache_stats(self):
+        """
+        hit / miss / eviction counters of the message cache, None when all messages are in memory
+        """
+        if isinstance(self.messages, MappedMessageStore):
+            return self.messages.cache_stats()
+
+    def log_message_cache_stats(self):
+        while True:
+            sleep(C.MESSAGE_CACHE_STATS_INTERVAL)
+            logging.info(f'Message cache: {self.get_message_cache_stats()}')
+
+    def get_compaction_stats(self):
+        return self.compactor.stats()
+
     def register_callback(self, call_back_key, call_back_func):
         self.call_backs[call_back_key] = call_back_func
     
@@ -97,13 +157,13 @@ class Datastore(DataManager):
                 group = self.groups.get(group_id)
                 if not group.get('users'):
                     continue
+                removed = group['users'].get(server_id, [])
                 group['users'][server_id] = []
                 group['updated_time'] = get_timestamp()
-                group['change_log'].append({
-                    "type": C.CHANGE_LOG_USERS_UPDATE,
-                    "creation_time": get_timestamp()
-                })
-                event_group_ids.append(group_id)
+                change = self.membership_change(group, removed=removed)
+                if change is not None:
+                    group['change_log'].append(change)
+                    event_group_ids.append(group_id)
                 logging.debug('group unlocked')
         return event_group_ids
 
@@ -118,36 +178,86 @@ class Datastore(DataManager):
             existing_list = self.groups[group_id]['users'].get(incoming_server_id, [])
             if not len(existing_list + user_list) or Counter(existing_list) == Counter(user_list):
                 return False
+            added, removed = list_delta(existing_list, user_list)
             self.groups[group_id]['users'][incoming_server_id] = user_list
             self.groups[group_id]['updated_time'] = get_timestamp()
             logging.info(f"Group {group_id} updated")
-            self.groups[group_id]['change_log'].append({
-                "type": C.CHANGE_LOG_USERS_UPDATE,
-                "creation_time": get_timestamp()
-            })
+            change = self.membership_change(self.groups[group_id], added, removed)
+            if change is not None:
+                self.groups[group_id]['change_log'].append(change)
             logging.debug('group unlocked')
-            return True
+            return change is not None
+
+    def membership_change(self, group, added=(), removed=()):
+        """
+        applies users added to and removed from the group's users to its
+        membership, returns the change log entry with the users that joined
+        and left the participant set, None if the set did not change
+        """
+        joined, left = group['membership'].apply(added, removed)
+        if not joined and not left:
+            return None
+        return {
+            "type": C.CHANGE_LOG_USERS_UPDATE,
+            "joined": joined,
+            "left": left,
+            "version": group['membership'].version,
+            "creation_time": get_monotonically_increasing_timestamp()
+        }
+
+    def get_participants(self, group_id):
+        """
+        returns (participant list, membership version) of the group
+        """
+        membership = self.get_group(group_id)['membership']
+        return membership.users(), membership.version
+
+    def participant_list(self, group):
+        """
+        the full participant list as delivered to clients
+        """
+        return {
+            'users': group['membership'].users(),
+            'membership_version': group['membership'].version,
+            'message_type': C.PARTICIPANT_LIST,
+            'creation_time': get_timestamp()
+        }
+
+    def resync_marker(self):
+        """
+        precedes a snapshot sent to a reader that missed changes
+        """
+        return {
+            'message_type': C.RESYNC,
+            'creation_time': get_timestamp()
+        }
+
+    def participant_delta(self, change):
+        """
+        a USERS_UPDATE change as delivered to clients, only the users that joined and left
+        """
+        return {
+            'users_joined': change.get('joined', []),
+            'users_left': change.get('left', []),
+            'membership_version': change.get('version'),
+            'message_type': C.PARTICIPANT_DELTA,
+            'creation_time': change.get('creation_time')
+        }
 
 
     def compare_vector_timestamps(self, timestamp1, timestamp2):
-        # if timestamp1 is None or timestamp2 is None:
-        #     return 0
-        comparison_dict = {"less":0, "greater":0, "equal":0}
-        for key in timestamp1:
-            if timestamp1[key] < timestamp2[key]:
-                comparison_dict["less"] += 1
-            elif timestamp1[key] > timestamp2[key]:
-                comparison_dict["greater"] += 1
-            else:
-                comparison_dict["equal"] += 1
-        if comparison_dict["less"] > 0 and comparison_dict["greater"] == 0:
-            return 0 # return (message1, message2) # message1 is older than message2
-        if comparison_dict["less"] == 0 and comparison_dict["greater"] > 0:
-            return 1 # return (message2, message1) # message2 is older than message1
+        """
+        0 if timestamp1 is older than timestamp2, 1 if it is newer, None if equal or concurrent
+        """
+        return VectorClock.of(timestamp1).compare(VectorClock.of(timestamp2))
 
     def determine_message_order(self, message1, message2, vector_timestamp_key='vector_timestamp'):
         server1 = message1.get('server_id')
         server2 = message2.get('server_id')
+        if self.ordering == C.ORDERING_HLC:
+            if (message1.get('hlc', 0), server1) < (message2.get('hlc', 0), server2):
+                return 0
+            return 1
         timestamp1 = message1.get(vector_timestamp_key)
         timestamp2 = message2.get(vector_timestamp_key)
         timestamp_order = self.compare_vector_timestamps(timestamp1, timestamp2)
@@ -167,45 +277,49 @@ class Datastore(DataManager):
         # else:
         #     return -1
 
-    def binary_search(self, message_id_list, new_message):
-        left = 0
-        right = len(message_id_list)
-        if right == 0:
-            return left
-        while left < right:
-            mid = (left + right)//2
-            greater = self.determine_message_order(new_message, self.messages[message_id_list[mid]])
-            if greater == 0:
-                right = mid
-            elif greater == 1:
-                left = mid + 1
-        return left
+    def message_follows(self, last_message, message):
+        """
+        True if message certainly comes after last_message and can be appended
+        """
+        if self.ordering == C.ORDERING_HLC:
+            return self.determine_message_order(last_message, message) == 0
+        return self.compare_vector_timestamps(last_message.get('vector_timestamp'), message.get('vector_timestamp')) == 0
+
+    def binary_search(self, message_id_list: BlockList, new_message):
+        return message_id_list.bisect(lambda message_id: self.determine_message_order(new_message, self.messages[message_id]) == 0)
         
     def insert_new_message(self, group_id, message_id, message):
         with self.get_group_lock(group_id):
             logging.debug('group locked')
+            # a concurrent retry of the same message got here first
+            if message_id in self.messages:
+                return
             self.messages[message_id] = message
             message_ids = self.groups[group_id]["message_ids"]
             ## If new message timestamp is after the last message add it to the end
-            if len(message_ids) == 0 or self.compare_vector_timestamps(self.messages[message_ids[-1]].get('vector_timestamp'), message.get('vector_timestamp')) == 0:
+            if len(message_ids) == 0 or self.message_follows(self.messages[message_ids[-1]], message):
                 self.groups[group_id]["message_ids"].append(message_id)
-                self.groups[group_id]['change_log'].append({
+                change = {
                     "message_id": message_id,
                     "type": C.CHANGE_LOG_APPEND
-                })
-                self.file_manager.append(f'{group_id}_change_log.log', f'{C.CHANGE_LOG_APPEND}:{message_id}')
+                }
+                self.groups[group_id]['change_log'].append(change)
+                self.append_change_to_disk(group_id, change)
+                self.record_change_on_disk(group_id)
 
             else: ## Else binary search the array to get proper insert index
                 insert_index = self.binary_search(message_ids, message)
                 self.groups[group_id]["message_ids"].insert(insert_index, message_id)
                 previous_message_id = self.groups[group_id]["message_ids"][insert_index-1] if insert_index > 0 else C.NEGATIVE_MESSAGE_INDEX
-                self.groups[group_id]['change_log'].append({
+                change = {
                     "message_id": message_id,
                     "type": C.CHANGE_LOG_INSERT,
                     "previous_message_id": previous_message_id
-                })
-                self.file_manager.append(f'{group_id}_change_log.log', f"{C.CHANGE_LOG_INSERT}:{message_id}:{previous_message_id}")
-            self.file_manager.append(f'{group_id}_messages.txt', message)
+                }
+                self.groups[group_id]['change_log'].append(change)
+                self.append_change_to_disk(group_id, change)
+                self.record_change_on_disk(group_id)
+            self.append_message_to_disk(group_id, message)
             logging.debug('group unlocked')
             
     def save_message(self, message):
@@ -247,18 +361,110 @@ class Datastore(DataManager):
                     return
 
                 original_message['message_type'] = message_type
-                
-                self.groups[group_id]['change_log'].append({
-                    "message_id": message_id,
-                    "type": C.CHANGE_LOG_UPDATE,
-                })
-                self.file_manager.append(f'{group_id}_messages.txt', original_message)
+                self.update_message(group_id, message_id, original_message)
                 logging.debug('group unlocked')
                 return original_message
 
         return message
     
+    def update_message(self, group_id, message_id, message):
+        """
+        stores a new version of an existing message, has to be called with the group lock held
+        """
+        self.messages[message_id] = message
+        self.groups[group_id]['change_log'].append({
+            "message_id": message_id,
+            "type": C.CHANGE_LOG_UPDATE,
+        })
+        self.append_message_to_disk(group_id, message)
+        self.compactor.add_superseded(group_id)
+
+    def save_messages_bulk(self, group_id, messages):
+        """
+        saves a batch of messages of one group, e.g. replayed after an outage
+        new messages are sorted once and merged into the group's ordering in a
+        single pass with one change log write, updates are applied afterwards
+        """
+        if not self.get_group(group_id):
+            self.create_group(group_id)
+        new_messages = {}
+        updates = []
+        for message in messages:
+            if not is_valid_message(message):
+                raise Exception("Invalid Message")
+            clean_message(message)
+            if message["message_type"] in (C.NEW, C.USER_JOIN, C.USER_LEFT):
+                new_messages.setdefault(message['message_id'], message)
+            else:
+                updates.append(message)
+
+        with self.get_group_lock(group_id):
+            batch = [message for message_id, message in new_messages.items() if message_id not in self.messages]
+            if self.ordering == C.ORDERING_HLC:
+                batch.sort(key=lambda message: (message.get('hlc', 0), message.get('server_id')))
+            else:
+                batch.sort(key=cmp_to_key(lambda message1, message2: -1 if self.determine_message_order(message1, message2) == 0 else 1))
+            if batch:
+                self.merge_messages(group_id, batch)
+
+        for message in updates:
+            self.save_message(message)
+
+    def merge_messages(self, group_id, batch):
+        """
+        merges messages sorted by determine_message_order into the group's ordering
+        has to be called with the group lock held
+        """
+        for message in batch:
+            self.messages[message['message_id']] = message
+        message_ids = self.groups[group_id]['message_ids']
+        batch_ids = set(message['message_id'] for message in batch)
+        if len(message_ids) == 0 or self.message_follows(self.messages[message_ids[-1]], batch[0]):
+            start = len(message_ids)
+            merged = [message['message_id'] for message in batch]
+        else:
+            # only the part of the ordering after the oldest new message is merged
+            start = self.binary_search(message_ids, batch[0])
+            tail = message_ids[start:]
+            merged = []
+            i = j = 0
+            while i < len(tail) and j < len(batch):
+                if self.determine_message_order(batch[j], self.messages[tail[i]]) == 0:
+                    merged.append(batch[j]['message_id'])
+                    j += 1
+                else:
+                    merged.append(tail[i])
+                    i += 1
+            merged.extend(tail[i:])
+            merged.extend(message['message_id'] for message in batch[j:])
+
+        # entries are written in final order so replaying them rebuilds the same ordering
+        last_existing = max((index for index, message_id in enumerate(merged) if message_id not in batch_ids), default=-1)
+        changes = []
+        for index, message_id in enumerate(merged):
+            if message_id not in batch_ids:
+                continue
+            if index > last_existing:
+                change = {
+                    "message_id": message_id,
+                    "type": C.CHANGE_LOG_APPEND
+                }
+            else:
+                change = {
+                    "message_id": message_id,
+                    "type": C.CHANGE_LOG_INSERT,
+                    "previous_message_id": message_ids[start + index - 1] if start + index > 0 else C.NEGATIVE_MESSAGE_INDEX
+                }
+            message_ids.insert(start + index, message_id)
+            changes.append(change)
+        self.groups[group_id]['change_log'].extend(changes)
+        self.append_changes_to_disk(group_id, changes)
+        self.record_change_on_disk(group_id, len(changes))
+        self.append_messages_to_disk(group_id, batch)
+
     def resolve_message_update_causality(self, original_message, message):
+        if self.ordering == C.ORDERING_HLC:
+            return self.resolve_message_update_hlc(original_message, message)
 
         if 'vector_timestamp_2' not in message:
             message['vector_timestamp_2'] = message['vector_timestamp']
@@ -296,6 +502,23 @@ class Datastore(DataManager):
             original_message['vector_timestamp_2'] = self.call_backs[C.GET_VECTOR_TIMESTAMP]()
             return True
             
+    def resolve_message_update_hlc(self, original_message, message):
+        """
+        the update with the higher hlc wins, equal clocks from different servers merge their likes
+        """
+        original_hlc = original_message.get('hlc_2') or original_message.get('hlc', 0)
+        hlc = message.get('hlc_2') or message.get('hlc', 0)
+        if hlc < original_hlc or (hlc == original_hlc and original_message["likes"] == message["likes"]):
+            return False
+        if hlc > original_hlc:
+            original_message["likes"] = message["likes"]
+        else:
+            for key, val in message["likes"].items():
+                original_message["likes"][key] = max(original_message["likes"].get(key, 0), val)
+        original_message['updated_time'] = message.get('updated_time', message.get('creation_time'))
+        original_message['hlc_2'] = hlc
+        return True
+
     def save_session_info(self, session_id, user_id, group_id=None, is_active=True, context=None):
         session = {
             "session_id": session_id, 
@@ -321,20 +544,38 @@ class Datastore(DataManager):
                 message_list.append(message)
         return message_list
     
-    @lru_cache
-    def expand_user_list(self, group_id, _):
-        group = self.groups.get(group_id)
-        users = group.get('users')
-        users_list = []
-        if users:
-            for userl in users.values():
-                users_list.extend(userl)
-            users_list = list(users_list)
-        return users_list
+    def change_to_message(self, group_id, group, change):
+        if change['type'] in (C.CHANGE_LOG_APPEND, C.CHANGE_LOG_UPDATE):
+            return self.messages.get(change['message_id'])
+        if change['type'] == C.CHANGE_LOG_INSERT:
+            return message_view(self.messages.get(change['message_id']), previous_message_id=change['previous_message_id'])
+        if change['type'] == C.CHANGE_LOG_USERS_UPDATE:
+            return self.participant_delta(change)
+        raise Exception('Unknown change type')
+
+    def change_log_lag(self, group_id, change_log_index):
+        """
+        number of changes a reader at change_log_index has not read yet
+        """
+        group = self.get_group(group_id)
+        if group is None or change_log_index is None:
+            return 0
+        return len(group.get('change_log')) - change_log_index
 
-    def get_messages(self, group_id, start_index=-10, change_log_index=None):
+    def get_messages(self, group_id, start_index=-10, change_log_index=None, subscriber=None, encoded=False, limit=None, coalesce=False, resync=False, membership_version=None):
         """
         called when user wants to quits history or newly joins
+        subscriber: id of the reader, its position keeps unread change log entries
+        in memory, a reader whose entries were dropped gets a resync marker, then
+        a snapshot of the last C.CHANGE_LOG_RESYNC_MESSAGES messages and the
+        participant list again
+        encoded: return the messages as serialized Message protobufs, change log
+        entries are serialized once and shared by all subscribers
+        limit: read at most this many change log entries
+        coalesce: leave out change log entries superseded by later ones
+        resync: send the snapshot instead of the change log entries
+        membership_version: version of the participant list the reader has,
+        a first read adds the current list if it changed since
         """
         group = self.get_group(group_id)
         if group is None:
@@ -348,53 +589,126 @@ class Datastore(DataManager):
             #     updated_ids = group.get('updated_ids')[updated_idx:]
             #     message_ids.extend(updated_ids)
             # updated_idx = len(group.get('updated_ids'))
-            if start_index > 0:
-                messages_list = []
-                change_log = group.get('change_log')[change_log_index:]
-                for change in change_log:
-                    if change['type'] == C.CHANGE_LOG_APPEND:
-                        messages_list.append(self.messages.get(change['message_id']))
-                    elif change['type'] == C.CHANGE_LOG_UPDATE:
-                        messages_list.append(self.messages.get(change['message_id']))
-                    elif change['type'] == C.CHANGE_LOG_INSERT:
-                        message = copy.deepcopy(self.messages.get(change['message_id']))
-                        message['previous_message_id'] = change['previous_message_id']
-                        messages_list.append(message)
-                    elif change['type'] == C.CHANGE_LOG_USERS_UPDATE:
-                        message = {
-                            'users': self.expand_user_list(group_id, group.get('updated_time')),
-                            'message_type': C.PARTICIPANT_LIST,
-                            'creation_time': change.get('creation_time')
-                        }
-                        messages_list.append(message)
-                    else:
-                        raise Exception('Unknown change type')
+            change_log = None
+            end = len(group.get('change_log'))
+            if start_index > 0 and not resync:
+                if encoded:
+                    change_log = group.get('change_log').since_encoded(
+                        change_log_index, lambda change: RF.message_to_delivery(self.change_to_message(group_id, group, change), group_id),
+                        limit=limit, coalesce=coalesce)
+                else:
+                    change_log = group.get('change_log').since(change_log_index, limit=limit, coalesce=coalesce)
+                if change_log is None:
+                    logging.info(f"{subscriber} fell behind the change log of {group_id}, resyncing")
+            if change_log is not None:
+                messages_list = change_log if encoded else [self.change_to_message(group_id, group, change) for change in change_log]
+                if limit is not None:
+                    end = min(end, change_log_index + limit)
             else:
                 all_msg_ids = group.get('message_ids')
-                message_ids = all_msg_ids[start_index:]
+                message_ids = all_msg_ids[start_index if start_index <= 0 else -C.CHANGE_LOG_RESYNC_MESSAGES:]
                 messages_list = self.get_message_list(message_ids)
-            change_log_index = len(group.get('change_log'))
+                if start_index > 0 or (membership_version is not None and membership_version != group['membership'].version):
+                    messages_list.append(self.participant_list(group))
+                if start_index > 0:
+                    messages_list.insert(0, self.resync_marker())
+                if encoded:
+                    messages_list = [RF.message_to_delivery(message, group_id) for message in messages_list]
+            change_log_index = end
+            if subscriber is not None:
+                group.get('change_log').advance(subscriber, change_log_index)
             logging.debug('group unlocked')
 
         return change_log_index, messages_list
     
+    def release_change_log(self, group_id, subscriber):
+        """
+        subscriber stopped reading group_id, its unread change log entries can be dropped
+        """
+        group = self.groups.get(group_id)
+        if group is not None:
+            group.get('change_log').release(subscriber)
+
+    def find_message_index(self, message_ids, message_id, hint):
+        """
+        index of message_id in message_ids, None if it is not there
+        messages are only ever inserted so it is at hint or after it, ids
+        from hint on are searched in growing windows before the ones before hint
+        """
+        hint = min(max(hint, 0), len(message_ids))
+        start, window = hint, C.HISTORY_CURSOR_WINDOW
+        while start < len(message_ids):
+            ids = message_ids[start:start + window]
+            if message_id in ids:
+                return start + ids.index(message_id)
+            start += window
+            window *= 2
+        ids = message_ids[:hint]
+        if message_id in ids:
+            return ids.index(message_id)
+        return None
+
+    def get_history(self, group_id, cursor=None, page_size=C.HISTORY_PAGE_SIZE, direction=C.HISTORY_OLDER):
+        """
+        one page of the group's messages next to cursor, only the page's slice of
+        message_ids is read
+        returns (messages, older_cursor, newer_cursor), older_cursor is empty
+        once the first message is reached, newer_cursor also continues after
+        the newest message so later messages can be asked for
+        without cursor the newest page (older) or the oldest page (newer) is returned
+        """
+        group = self.get_group(group_id)
+        if group is None:
+            raise Exception(f"Group {group_id} not found")
+
+        with self.get_group_lock(group_id):
+            message_ids = group.get('message_ids')
+            if cursor:
+                message_id, hint = decode_history_cursor(cursor)
+                index = self.find_message_index(message_ids, message_id, hint)
+                if index is None:
+                    raise Exception(f"Message {message_id} of the history cursor not found in group {group_id}")
+                if direction == C.HISTORY_OLDER:
+                    start, stop = max(0, index - page_size), index
+                else:
+                    start, stop = index + 1, min(len(message_ids), index + 1 + page_size)
+            elif direction == C.HISTORY_OLDER:
+                start, stop = max(0, len(message_ids) - page_size), len(message_ids)
+            else:
+                start, stop = 0, min(len(message_ids), page_size)
+            page_ids = message_ids[start:stop]
+
+        if not page_ids:
+            return [], '', cursor if direction == C.HISTORY_NEWER else ''
+        older_cursor = encode_history_cursor(page_ids[0], start) if start > 0 else ''
+        newer_cursor = encode_history_cursor(page_ids[-1], stop - 1)
+        return self.get_message_list(page_ids), older_cursor, newer_cursor
+
     def get_group(self, group_id):
-        return self.groups.get(group_id)
+        group = self.groups.get(group_id)
+        if group is not None and group_id in self.unloaded_groups:
+            self.load_group(group_id)
+        return group
     
-    def create_group(self, group_id, users={}, creation_time=get_timestamp()):
+    def create_group(self, group_id, users={}, creation_time=None):
+        if creation_time is None:
+            creation_time = get_monotonically_increasing_timestamp()
         with self.get_group_lock(group_id=group_id):
             logging.debug('group locked')
+            users = copy.deepcopy(users)
             group = {
                 'group_id': group_id,
                 'users': users,
-                'message_ids': [],
+                'message_ids': BlockList(),
                 'creation_time': creation_time,
-                'change_log': [],
+                'change_log': ChangeLog(),
+                'membership': Membership(users),
                 'updated_time': creation_time
             }
             self.groups[group_id] = group
             logging.debug(f"Group {group_id} created")
-            self.file_manager.write(f'{group_id}.json', group)
+            # ordering, change log and membership are rebuilt from their own files and the users
+            self.file_manager.write(f'{group_id}.json', {key: value for key, value in group.items() if key not in ('message_ids', 'change_log', 'membership')})
             logging.debug('group unlocked')
             return group
 
@@ -407,11 +721,14 @@ class Datastore(DataManager):
                 self.groups[group_id]['users'][server_id] = []
             self.groups[group_id]['users'][server_id].append(user_id)
             self.groups[group_id]['updated_time'] = get_timestamp()
+            change = self.membership_change(self.groups[group_id], added=[user_id])
+            if change is not None:
+                self.groups[group_id]['change_log'].append(change)
             logging.debug(f"{user_id} joined {group_id}")
             logging.debug('group unlocked')
         # self.save_message({"group_id": group_id, 
         # "user_id": user_id,
-        # "creation_time": get_timestamp(),
+        # "creation_time": get_monotonically_increasing_timestamp(),
         # "message_id": get_unique_id(),
         # "text":[],
         # "message_type": C.USER_JOIN})
@@ -424,65 +741,116 @@ class Datastore(DataManager):
             index = self.groups[group_id]['users'][server_id].index(user_id)
             del self.groups[group_id]['users'][server_id][index]
             self.groups[group_id]['updated_time'] = get_timestamp()
+            change = self.membership_change(self.groups[group_id], removed=[user_id])
+            if change is not None:
+                self.groups[group_id]['change_log'].append(change)
             logging.debug(f"{user_id} removed from {group_id}")
         
         logging.debug('group unlocked')
 
+    def append_message_to_disk(self, group_id, message):
+        if self.record_format == C.RECORD_FORMAT_BINARY:
+            self.file_manager.append_bytes(f'{group_id}{C.MESSAGES_FILE_SUFFIX}', RF.encode_record(RF.message_to_record(message)))
+        else:
+            self.file_manager.append(f'{group_id}{C.TEXT_MESSAGES_FILE_SUFFIX}', message)
+
+    def append_change_to_disk(self, group_id, change):
+        if self.record_format == C.RECORD_FORMAT_BINARY:
+            self.file_manager.append_bytes(f'{group_id}{C.CHANGE_LOG_FILE_SUFFIX}', RF.encode_record(RF.change_to_record(change)))
+        elif change['type'] == C.CHANGE_LOG_INSERT:
+            self.file_manager.append(f'{group_id}{C.TEXT_CHANGE_LOG_FILE_SUFFIX}', f"{change['type']}:{change['message_id']}:{change['previous_message_id']}")
+        else:
+            self.file_manager.append(f'{group_id}{C.TEXT_CHANGE_LOG_FILE_SUFFIX}', f"{change['type']}:{change['message_id']}")
+
+    def append_messages_to_disk(self, group_id, messages):
+        """
+        writes several messages with a single append
+        """
+        if self.record_format == C.RECORD_FORMAT_BINARY:
+            self.file_manager.append_bytes(f'{group_id}{C.MESSAGES_FILE_SUFFIX}', b''.join(RF.encode_record(RF.message_to_record(message)) for message in messages))
+        else:
+            self.file_manager.append_bytes(f'{group_id}{C.TEXT_MESSAGES_FILE_SUFFIX}', ''.join(f'{json.dumps(message)}\n' for message in messages).encode('utf-8'))
+
+    def append_changes_to_disk(self, group_id, changes):
+        """
+        writes several change log entries with a single append
+        """
+        if self.record_format == C.RECORD_FORMAT_BINARY:
+            self.file_manager.append_bytes(f'{group_id}{C.CHANGE_LOG_FILE_SUFFIX}', b''.join(RF.encode_record(RF.change_to_record(change)) for change in changes))
+            return
+        lines = []
+        for change in changes:
+            if change['type'] == C.CHANGE_LOG_INSERT:
+                lines.append(f"{change['type']}:{change['message_id']}:{change['previous_message_id']}\n")
+            else:
+                lines.append(f"{change['type']}:{change['message_id']}\n")
+        self.file_manager.append_bytes(f'{group_id}{C.TEXT_CHANGE_LOG_FILE_SUFFIX}', ''.join(lines).encode('utf-8'))
+
+    def record_change_on_disk(self, group_id, count=1):
+        """
+        counts change log entries written for the group and writes an ordering
+        checkpoint once enough entries were written since the last one
+        has to be called with the group lock held
+        """
+        self.change_log_lengths[group_id] = self.change_log_lengths.get(group_id, 0) + count
+        length = self.change_log_lengths[group_id]
+        message_ids = self.groups[group_id]['message_ids']
+        interval = max(C.CHANGE_LOG_CHECKPOINT_INTERVAL, len(message_ids) // C.CHANGE_LOG_CHECKPOINT_GROWTH_FACTOR)
+        if length - self.checkpoint_offsets.get(group_id, 0) >= interval:
+            self.file_manager.write(f'{group_id}{C.CHECKPOINT_FILE_SUFFIX}', {
+                'group_id': group_id,
+                'offset': length,
+                'message_ids': list(message_ids)
+            })
+            self.checkpoint_offsets[group_id] = length
+
+    def apply_recovered_group(self, group_id, data):
+        persistent = isinstance(self.messages, MappedMessageStore)
+        for message_id, message in data['messages'].items():
+            # the mapped store already holds the latest version of messages it has seen
+            if persistent and message_id in self.messages:
+                continue
+            self.messages[message_id] = message
+        self.groups[group_id]['message_ids'] = BlockList(data['message_ids'])
+        self.change_log_lengths[group_id] = data['change_log_length']
+        self.checkpoint_offsets[group_id] = data['checkpoint_offset']
+        self.compactor.add_superseded(group_id, data['superseded_versions'])
+
+    def recover_group_from_disk(self, group_id):
+        """
+        loads the group's messages and rebuilds its message ordering
+        """
+        data = recovery.load_group(recovery.group_file_paths(self.file_manager, group_id))
+        self.apply_recovered_group(group_id, data)
+
+    def load_group(self, group_id):
+        """
+        materializes a group left on disk by lazy recovery
+        """
+        with self.get_group_lock(group_id):
+            if group_id in self.unloaded_groups:
+                self.recover_group_from_disk(group_id)
+                self.unloaded_groups.discard(group_id)
+                logging.debug(f"Group {group_id} loaded from disk")
+
     def recover_data_from_disk(self):
         all_files = self.file_manager.list_files()
         json_files = [f for f in all_files if f.endswith('.json')]
         for file in json_files:
             group_data = json.loads(self.file_manager.read(file))
+            group_data['message_ids'] = BlockList()
+            group_data['change_log'] = ChangeLog()
+            group_data['membership'] = Membership(group_data.get('users', {}))
             self.groups[group_data['group_id']] = group_data
             # print('recover data:', group_data)
 
-        txt_files = [f for f in all_files if f.endswith('.txt')]
-        for file in txt_files:
-            messages = self.file_manager.read(file).split('\n')
-            # message_ids = {}
-            for message in messages:
-                try:
-                    message_data = json.loads(message)
-                    message_id = message_data['message_id']
-                    # group_id = message_data['group_id']
-                    # if message_id not in message_ids:
-                        # message_ids[message_id] = 1
-                        # self.groups[group_id]['message_ids'].append(message_id)
-                    self.messages[message_id] = message_data
-                except json.decoder.JSONDecodeError:
-                    pass
-        log_files = [f for f in all_files if f.endswith('.log')]
-        for file in log_files:
-            change_logs = self.file_manager.read(file).split('\n')
-            # print('change_logs', change_logs)
-            first_message_id = change_logs[0].split(':')[1]
-            last_message_id = first_message_id
-            message_tree = {last_message_id: None}
-            for log in change_logs[1:]:
-                if not log:
-                    continue
-                if log.startswith(C.CHANGE_LOG_INSERT):
-                    _, message_id, previous_message_id = log.split(':')
-                    if previous_message_id == C.NEGATIVE_MESSAGE_INDEX:
-                        message_tree[message_id] = first_message_id
-                        first_message_id = message_id
-                    else:
-                        message_tree[message_id] = message_tree[previous_message_id]
-                        message_tree[previous_message_id] = message_id
-                elif log.startswith(C.CHANGE_LOG_APPEND):
-                    _, message_id = log.split(':')
-                    message_tree[last_message_id] = message_id
-                    message_tree[message_id] = None
-                    last_message_id = message_id
-                else:
-                    raise Exception("Unknown Log")
-            current_link  = first_message_id
-            group_id = file[:file.index('_change_log.log')]
-            self.groups[group_id]['message_ids'] = []
-            message_ids = self.groups[group_id]['message_ids']
-            
-            while current_link:
-                message_ids.append(current_link)
-                current_link = message_tree.get(current_link)
-            # print('message_ids', message_ids)
-
+        if self.lazy_recovery:
+            self.unloaded_groups.update(self.groups.keys())
+            return
+        if self.recovery_workers > 1 and len(self.groups.keys()) > 1:
+            paths_by_group = {group_id: recovery.group_file_paths(self.file_manager, group_id) for group_id in self.groups.keys()}
+            for group_id, data in recovery.load_groups_parallel(paths_by_group, self.recovery_workers):
+                self.apply_recovered_group(group_id, data)
+            return
+        for group_id in self.groups.keys():
+            self.recover_group_from_disk(group_id)
@@ -1,42 +1,81 @@
 import os
 import json
-from glob import glob
 
 import server.constants as C
+from server.storage.append_log import SegmentedAppendLog
+from server.storage.commit_writer import CommitWriter
 
 class FileManager:
-    def __init__(self, root) -> None:
+    def __init__(self, root, durability=C.DURABILITY_MODE, group_commit=C.GROUP_COMMIT_WRITES) -> None:
         self.root = root
         self.fast_root = os.path.join(root, "cache")
         os.makedirs(self.fast_root, exist_ok=True)
         for i in C.SERVER_IDS:
             os.makedirs(os.path.join(self.fast_root, str(i)), exist_ok=True)
+        if durability not in C.DURABILITY_MODES:
+            raise Exception(f"Unknown durability mode {durability}")
+        self.durability = durability
+        self.append_log = SegmentedAppendLog(root)
+        self.commit_writer = None
+        if group_commit:
+            self.commit_writer = CommitWriter(self.append_log, durability=durability)
 
+    def submit(self, func, *args):
+        """
+        runs a write operation on the commit writer if enabled, in order with the appends
+        """
+        if self.commit_writer is not None:
+            self.commit_writer.submit(func, *args)
+        else:
+            func(*args)
+
+    def drain(self):
+        if self.commit_writer is not None:
+            self.commit_writer.drain()
+
+    def _sync_fd(self, file_desc):
+        if self.durability in (C.DURABILITY_FSYNC_PER_BATCH, C.DURABILITY_FSYNC_PER_MESSAGE):
+            os.fsync(file_desc)
     
     def write(self, file, message):
         if isinstance(message, dict):
             message = json.dumps(message)
+        self.submit(self._write, file, message)
+
+    def _write(self, file, message):
         path = os.path.join(self.root, file)
-        with open(path, 'w') as f:
+        with open(f'{path}.tmp', 'w') as f:
             f.write(message)
+            f.flush()
+            self._sync_fd(f.fileno())
+        os.replace(f'{path}.tmp', path)
     
     def fast_write(self, file, message: bytes):
+        self.submit(self._fast_write, file, message)
+
+    def _fast_write(self, file, message: bytes):
         try:
             path = os.path.join(self.fast_root, file)
-            file_desc = os.open(path, os.O_RDWR | os.O_CREAT)
+            file_desc = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
             os.write(file_desc, message)     
+            self._sync_fd(file_desc)
             os.close(file_desc)
         except Exception as e:
             print(f'Error in fast_write: {e}')
 
     def read(self, file):
-        path = os.path.join(self.root, file)
-        if glob(path):
-            with open(path, 'r') as f:
-                lines = f.read()
+        self.drain()
+        self.append_log.flush(file)
+        segments = self.append_log.segments(file)
+        if segments:
+            lines = ''
+            for path in segments:
+                with open(path, 'r') as f:
+                    lines += f.read()
             return lines
     
     def fast_read(self, file) -> bytes:
+        self.drain()
         try:
             path = os.path.join(self.fast_root, file)
             file_size = os.path.getsize(path)
@@ -47,31 +86,71 @@ class FileManager:
         except Exception as e:
             print(f'Error in fast_read: {e}')
 
+    def segment_paths(self, file):
+        """
+        returns paths of all segments of an appended file with every pending write applied
+        """
+        self.drain()
+        self.append_log.flush(file)
+        return self.append_log.segments(file)
+
+    def roll(self, file):
+        """
+        seals the active segment of an appended file once every pending append is written
+        """
+        self.submit(self.append_log.roll, file)
+        self.drain()
+
+    def sealed_segment_paths(self, file):
+        self.drain()
+        return self.append_log.sealed_segments(file)
+
+    def remove_segments(self, file, paths):
+        self.append_log.remove_segments(file, paths)
+
+    def register_header(self, suffix, header: bytes):
+        """
+        header is written at the start of every segment of files ending with suffix
+        """
+        self.append_log.headers[suffix] = header
+
     def readlines(self, file):
-        path = os.path.join(self.root, file)
-        if glob(path):
-            with open(path, 'r') as f:
-                lines = f.readlines()
-            return lines
+        lines = self.read(file)
+        if lines is not None:
+            return lines.splitlines(keepends=True)
     
     def append(self, file, message):
         if isinstance(message, dict):
             message = json.dumps(message)
-        path = os.path.join(self.root, file)
-        with open(path, 'a') as f:
-            f.write(message)
-            f.write('\n')
+        self.append_bytes(file, f'{message}\n'.encode('utf-8'))
+
+    def append_bytes(self, file, data: bytes):
+        if self.commit_writer is not None:
+            self.commit_writer.append(file, data)
+            return
+        self.append_log.append(file, data, flush=self.durability != C.DURABILITY_NONE)
+        if self.durability in (C.DURABILITY_FSYNC_PER_BATCH, C.DURABILITY_FSYNC_PER_MESSAGE):
+            self.append_log.sync(file)
     
     def delete_file(self, file, fast=False):
+        self.submit(self._delete_file, file, fast)
+
+    def _delete_file(self, file, fast=False):
         try:
             if fast:
                 os.remove(os.path.join(self.fast_root, file))
             else:
-                os.remove(os.path.join(self.root, file))
+                self.append_log.delete(file)
         except OSError:
             pass
+
+    def close(self):
+        if self.commit_writer is not None:
+            self.commit_writer.close()
+        self.append_log.close(sync=self.durability in (C.DURABILITY_FSYNC_PER_BATCH, C.DURABILITY_FSYNC_PER_MESSAGE))
     
     def list_files(self, path=None, fast=False):
+        self.drain()
         if fast:
             if path:
                 return os.listdir(os.path.join(self.fast_root, path))
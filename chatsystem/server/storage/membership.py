@@ -0,0 +1,61 @@
+from collections import Counter
+
+
+def list_delta(old_list, new_list):
+    """
+    returns (added, removed), the user ids turning old_list into new_list
+    """
+    old_counts, new_counts = Counter(old_list), Counter(new_list)
+    return list((new_counts - old_counts).elements()), list((old_counts - new_counts).elements())
+
+
+class Membership:
+    """
+    Versioned participant set of one group.
+
+    The group's users keep the user ids per server and a user can be there
+    more than once, with several sessions or on several servers. Membership
+    counts the occurrences so a join or leave only touches one counter and
+    tells whether the user entered or left the set. Every change of the set
+    increments the version.
+    """
+    def __init__(self, users={}) -> None:
+        self.counts = Counter()
+        for user_list in users.values():
+            self.counts.update(user_list)
+        self.version = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, user_id):
+        return user_id in self.counts
+
+    def users(self):
+        return list(self.counts)
+
+    def apply(self, added=(), removed=()):
+        """
+        adds and removes one occurrence of every user id
+        returns (joined, left), the users that entered and left the set
+        """
+        joined, left = [], []
+        for user_id in added:
+            self.counts[user_id] += 1
+            if self.counts[user_id] == 1:
+                joined.append(user_id)
+        for user_id in removed:
+            if user_id not in self.counts:
+                continue
+            self.counts[user_id] -= 1
+            if self.counts[user_id] == 0:
+                del self.counts[user_id]
+                left.append(user_id)
+        # a user that left and came back in the same change stays in the set
+        rejoined = set(joined) & set(left)
+        if rejoined:
+            joined = [user_id for user_id in joined if user_id not in rejoined]
+            left = [user_id for user_id in left if user_id not in rejoined]
+        if joined or left:
+            self.version += 1
+        return joined, left
@@ -0,0 +1,78 @@
+import heapq
+from collections import OrderedDict
+
+import server.constants as C
+
+
+class MessageCache:
+    """
+    Decoded messages kept in memory within a byte budget.
+
+    Message sizes are counted as their serialized size. Once the budget is
+    exceeded messages are evicted either least recently used first (lru)
+    or oldest creation_time first (age). Not thread safe, the owner has to
+    hold its own lock.
+    """
+    def __init__(self, max_bytes=C.MESSAGE_CACHE_MAX_BYTES, policy=C.MESSAGE_CACHE_POLICY) -> None:
+        if policy not in C.MESSAGE_CACHE_POLICIES:
+            raise Exception(f"Unknown message cache policy {policy}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._entries = OrderedDict()
+        # (creation_time, sequence, message_id), entries replaced later are skipped on eviction
+        self._ages = []
+        self._sequence = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == C.MESSAGE_CACHE_POLICY_LRU:
+            self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, message, size):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._sequence += 1
+        self._entries[key] = (message, size, self._sequence)
+        self.bytes += size
+        if self.policy == C.MESSAGE_CACHE_POLICY_AGE:
+            heapq.heappush(self._ages, (message.get('creation_time') or 0, self._sequence, key))
+        self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            if self.policy == C.MESSAGE_CACHE_POLICY_AGE:
+                _, sequence, key = heapq.heappop(self._ages)
+                entry = self._entries.get(key)
+                if entry is None or entry[2] != sequence:
+                    continue
+                del self._entries[key]
+            else:
+                _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry[1]
+            self.evictions += 1
+        if len(self._ages) > 2 * len(self._entries) + 1024:
+            self._ages = [age for age in self._ages if self._entries.get(age[2], (None, None, None))[2] == age[1]]
+            heapq.heapify(self._ages)
+
+    def stats(self):
+        return {
+            'messages': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
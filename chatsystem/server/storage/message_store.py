@@ -0,0 +1,217 @@
+import os
+import mmap
+import zlib
+import struct
+import logging
+import threading
+
+import server.constants as C
+from server.storage import record_format as RF
+from server.storage.message_cache import MessageCache
+
+_key_header = struct.Struct('<H')
+
+
+class MappedMessageStore():
+    """
+    Message collection backed by memory mapped segment files.
+
+    Every stored version of a message is appended to the active segment as
+    a record whose payload is the message id followed by the serialized
+    message. Only the index message_id -> (segment, offset, length) of the
+    latest version and a bounded cache of decoded messages stay in memory,
+    evicted messages are read back from the segments on access.
+
+    Superseded versions are counted per segment, compact() moves the live
+    records of mostly superseded sealed segments to the active segment and
+    deletes them.
+    """
+    def __init__(self, root, segment_size=C.MESSAGE_STORE_SEGMENT_SIZE, cache=None) -> None:
+        self.root = root
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._index = {}
+        # segment -> bytes of records superseded by a later version
+        self._garbage = {}
+        self._cache = cache if cache is not None else MessageCache()
+        self._maps = {}
+        os.makedirs(root, exist_ok=True)
+        segments = sorted(int(f[len('segment_'):]) for f in os.listdir(root) if f.startswith('segment_') and f[len('segment_'):].isdigit())
+        end = 0
+        for segment in segments:
+            end = self._index_segment(segment)
+        self._segment = segments[-1] if segments else 0
+        if segments and end < os.path.getsize(self._segment_path(self._segment)):
+            # appends must continue right after the last intact record
+            logging.warning(f'Truncating torn tail of {self._segment_path(self._segment)} at {end}')
+            with open(self._segment_path(self._segment), 'r+b') as f:
+                f.truncate(end)
+        self._file = open(self._segment_path(self._segment), 'ab')
+        if self._file.tell() == 0:
+            self._file.write(RF.file_header(RF.RECORD_KIND_MESSAGE_STORE))
+            self._file.flush()
+        self._size = self._file.tell()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.root, f'segment_{segment:06d}')
+
+    def _index_segment(self, segment):
+        """
+        rebuilds the index from a segment, stops at the first torn or corrupted record
+        returns the end offset of the last intact record
+        """
+        path = self._segment_path(segment)
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(RF.FILE_HEADER_SIZE)
+            if len(header) < RF.FILE_HEADER_SIZE:
+                return 0
+            offset = RF.FILE_HEADER_SIZE
+            while offset + RF.RECORD_HEADER_SIZE + _key_header.size <= file_size:
+                length, crc = RF.unpack_record_header(f.read(RF.RECORD_HEADER_SIZE))
+                payload_offset = offset + RF.RECORD_HEADER_SIZE
+                if payload_offset + length > file_size or length < _key_header.size:
+                    break
+                payload = f.read(length)
+                if zlib.crc32(payload) != crc:
+                    logging.warning(f'Corrupted record in {path} at {offset}')
+                    break
+                key_length, = _key_header.unpack_from(payload)
+                message_id = payload[_key_header.size:_key_header.size + key_length].decode('utf-8')
+                self._set_location(message_id, (segment, payload_offset + _key_header.size + key_length, length - _key_header.size - key_length), key_length)
+                offset = payload_offset + length
+        return offset
+
+    def _map(self, segment, end):
+        """
+        returns a memory map of the segment covering at least end bytes
+        """
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def _read(self, message_id):
+        location = self._index.get(message_id)
+        if location is None:
+            return None
+        segment, offset, length = location
+        mapped = self._map(segment, offset + length)
+        return RF.record_to_message(mapped[offset:offset + length])
+
+    def _set_location(self, key, location, key_length):
+        previous = self._index.get(key)
+        if previous is not None:
+            segment, _, length = previous
+            self._garbage[segment] = self._garbage.get(segment, 0) + RF.RECORD_HEADER_SIZE + _key_header.size + key_length + length
+        self._index[key] = location
+
+    def _append(self, key, key_bytes, record):
+        """
+        appends a version of key to the active segment, has to be called with the lock held
+        returns the length of the stored message
+        """
+        payload = _key_header.pack(len(key_bytes)) + key_bytes + record
+        if self._size + len(payload) > self.segment_size:
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._segment_path(self._segment), 'ab')
+            self._file.write(RF.file_header(RF.RECORD_KIND_MESSAGE_STORE))
+            self._size = self._file.tell()
+        self._file.write(RF.encode_record(payload))
+        self._file.flush()
+        offset = self._size + RF.RECORD_HEADER_SIZE + _key_header.size + len(key_bytes)
+        self._size += RF.RECORD_HEADER_SIZE + len(payload)
+        self._set_location(key, (self._segment, offset, len(record)), len(key_bytes))
+        return len(record)
+
+    def __setitem__(self, key, value):
+        record = RF.message_to_record(value)
+        with self._lock:
+            length = self._append(key, key.encode('utf-8'), record)
+            self._cache.put(key, value, length)
+
+    def compact(self, min_garbage_ratio=C.MESSAGE_STORE_MIN_GARBAGE_RATIO):
+        """
+        moves the latest versions kept in sealed segments that are at least
+        min_garbage_ratio superseded versions to the active segment and deletes
+        those segments, readers and writers only wait for one record at a time
+        returns the number of bytes reclaimed
+        """
+        with self._lock:
+            segments = [segment for segment, garbage in self._garbage.items()
+                        if segment != self._segment and garbage >= min_garbage_ratio * os.path.getsize(self._segment_path(segment))]
+        reclaimed = 0
+        for segment in sorted(segments):
+            reclaimed += self._compact_segment(segment)
+        return reclaimed
+
+    def _compact_segment(self, segment):
+        path = self._segment_path(segment)
+        with self._lock:
+            live = [(key, location) for key, location in self._index.items() if location[0] == segment]
+        moved = 0
+        for key, location in live:
+            with self._lock:
+                # a newer version written meanwhile already replaced this one
+                if self._index.get(key) != location:
+                    continue
+                _, offset, length = location
+                record = self._map(segment, offset + length)[offset:offset + length]
+                key_bytes = key.encode('utf-8')
+                self._append(key, key_bytes, record)
+                moved += RF.RECORD_HEADER_SIZE + _key_header.size + len(key_bytes) + length
+        with self._lock:
+            # the moved records have to be durable before their old copies go
+            os.fsync(self._file.fileno())
+            mapped = self._maps.pop(segment, None)
+            if mapped is not None:
+                mapped.close()
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._garbage.pop(segment, None)
+        return size - moved
+
+    def __getitem__(self, key):
+        message = self.get(key)
+        if message is None:
+            raise KeyError(key)
+        return message
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __str__(self) -> str:
+        return f'MappedMessageStore({len(self._index)} messages)'
+
+    def get(self, key):
+        with self._lock:
+            message = self._cache.get(key)
+            if message is not None:
+                return message
+            message = self._read(key)
+            if message is not None:
+                self._cache.put(key, message, self._index[key][2])
+            return message
+
+    def keys(self):
+        return self._index.keys()
+
+    def cache_stats(self):
+        with self._lock:
+            return self._cache.stats()
+
+    def items(self):
+        for key in list(self._index):
+            yield key, self.get(key)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
@@ -0,0 +1,259 @@
+"""
+Binary layout of message and change log files
+
+every segment starts with a file header
+    magic (4 bytes) | version (1 byte) | record kind (1 byte) | reserved (2 bytes)
+followed by records
+    payload length (uint32) | crc32 of payload (uint32) | payload
+
+message payloads are serialized ServerMessage protobufs, change log
+payloads are serialized Message protobufs carrying the change type in
+message_type
+"""
+import os
+import json
+import struct
+import zlib
+import logging
+
+import chat_system_pb2
+import server.constants as C
+from server.storage.append_log import parse_segment_name, segment_path
+from server.vector_clock import VectorClock, to_map
+
+FILE_MAGIC = b'CSRF'
+FORMAT_VERSION = 1
+RECORD_KIND_MESSAGE = 1
+RECORD_KIND_CHANGE_LOG = 2
+RECORD_KIND_MESSAGE_STORE = 3
+
+_file_header = struct.Struct('<4sBBH')
+_record_header = struct.Struct('<II')
+
+FILE_HEADER_SIZE = _file_header.size
+RECORD_HEADER_SIZE = _record_header.size
+
+
+def file_header(kind):
+    return _file_header.pack(FILE_MAGIC, FORMAT_VERSION, kind, 0)
+
+
+def encode_record(payload: bytes) -> bytes:
+    return _record_header.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def unpack_record_header(header: bytes):
+    """
+    returns (payload length, crc32)
+    """
+    return _record_header.unpack(header)
+
+
+def read_records(paths, kind, skip=0):
+    """
+    streams record payloads from the segment files in paths
+    the first skip records are stepped over without being read
+    stops at the first torn or corrupted record
+    """
+    for path in paths:
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER_SIZE)
+            if not header:
+                continue
+            if len(header) < FILE_HEADER_SIZE:
+                logging.warning(f'Truncated header in {path}')
+                return
+            magic, version, file_kind, _ = _file_header.unpack(header)
+            if magic != FILE_MAGIC or file_kind != kind:
+                raise Exception(f"Not a record file: {path}")
+            if version > FORMAT_VERSION:
+                raise Exception(f"Unsupported record format version {version} in {path}")
+            while True:
+                record_header = f.read(RECORD_HEADER_SIZE)
+                if not record_header:
+                    break
+                if len(record_header) < RECORD_HEADER_SIZE:
+                    logging.warning(f'Truncated record in {path}')
+                    return
+                length, crc = _record_header.unpack(record_header)
+                if skip:
+                    f.seek(length, os.SEEK_CUR)
+                    skip -= 1
+                    continue
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logging.warning(f'Corrupted record in {path}')
+                    return
+                yield payload
+
+
+def message_to_record(message: dict) -> bytes:
+    return chat_system_pb2.ServerMessage(
+        group_id=message.get('group_id'),
+        user_id=message.get('user_id'),
+        creation_time=message.get('creation_time'),
+        text=message.get('text'),
+        message_id=message.get('message_id'),
+        likes=message.get('likes'),
+        message_type=message.get('message_type'),
+        vector_timestamp=to_map(message.get('vector_timestamp')),
+        event_type=message.get('event_type'),
+        server_id=message.get('server_id'),
+        vector_timestamp_2=to_map(message.get('vector_timestamp_2')),
+        updated_time=message.get('updated_time'),
+        server_time=message.get('server_time'),
+        hlc=message.get('hlc'),
+        hlc_2=message.get('hlc_2')
+    ).SerializeToString()
+
+
+def record_to_message(payload: bytes) -> dict:
+    record = chat_system_pb2.ServerMessage.FromString(payload)
+    message = {
+        'group_id': record.group_id,
+        'user_id': record.user_id,
+        'creation_time': record.creation_time,
+        'text': list(record.text),
+        'message_id': record.message_id,
+        'likes': dict(record.likes),
+        'message_type': record.message_type,
+        'vector_timestamp': VectorClock.of(dict(record.vector_timestamp)),
+        'server_id': record.server_id,
+    }
+    if record.event_type:
+        message['event_type'] = record.event_type
+    if record.vector_timestamp_2:
+        message['vector_timestamp_2'] = VectorClock.of(dict(record.vector_timestamp_2))
+    if record.updated_time:
+        message['updated_time'] = record.updated_time
+    if record.server_time:
+        message['server_time'] = record.server_time
+    if record.hlc:
+        message['hlc'] = record.hlc
+    if record.hlc_2:
+        message['hlc_2'] = record.hlc_2
+    return message
+
+
+def message_to_client(message, group_id):
+    """
+    Message protobuf of message as clients receive it
+    """
+    return chat_system_pb2.Message(
+        group_id=message.get('group_id', group_id),
+        user_id=message.get('user_id'),
+        users=message.get('users'),
+        users_joined=message.get('users_joined'),
+        users_left=message.get('users_left'),
+        membership_version=message.get('membership_version'),
+        creation_time=message.get('creation_time'),
+        text=message.get('text', []),
+        message_id=message.get('message_id'),
+        likes=message.get('likes'),
+        message_type=message['message_type'],
+        previous_message_id=message.get('previous_message_id')
+    )
+
+
+def message_to_delivery(message, group_id) -> bytes:
+    """
+    serialized Message protobuf of message as GetMessages streams it to clients
+    """
+    return message_to_client(message, group_id).SerializeToString()
+
+
+def change_to_record(change: dict) -> bytes:
+    return chat_system_pb2.Message(
+        message_type=change['type'],
+        message_id=change.get('message_id'),
+        previous_message_id=change.get('previous_message_id')
+    ).SerializeToString()
+
+
+def record_to_change(payload: bytes) -> dict:
+    record = chat_system_pb2.Message.FromString(payload)
+    change = {
+        'type': record.message_type,
+        'message_id': record.message_id
+    }
+    if record.previous_message_id:
+        change['previous_message_id'] = record.previous_message_id
+    return change
+
+
+def text_to_change(line: str) -> dict:
+    """
+    parses a line of the text change log, TYPE:message_id[:previous_message_id]
+    """
+    parts = line.split(':')
+    change = {'type': parts[0], 'message_id': parts[1]}
+    if len(parts) > 2:
+        change['previous_message_id'] = parts[2]
+    return change
+
+
+def _segment_files(root, file, rolled):
+    path = os.path.join(root, file)
+    paths = [path] if os.path.exists(path) else []
+    return paths + [segment_path(path, segment) for segment in sorted(rolled.get(file, []))]
+
+
+def _read_text_file(paths):
+    lines = []
+    for path in paths:
+        with open(path, 'r') as f:
+            lines.extend(f.read().split('\n'))
+    return [line for line in lines if line]
+
+
+def convert_text_files(root):
+    """
+    one-shot conversion of a server data directory from the text format to
+    the binary record format, must not run while the server is running
+    returns (bytes before, bytes after)
+    """
+    conversions = [
+        (C.TEXT_MESSAGES_FILE_SUFFIX, C.MESSAGES_FILE_SUFFIX, RECORD_KIND_MESSAGE,
+            lambda line: message_to_record(json.loads(line))),
+        (C.TEXT_CHANGE_LOG_FILE_SUFFIX, C.CHANGE_LOG_FILE_SUFFIX, RECORD_KIND_CHANGE_LOG,
+            lambda line: change_to_record(text_to_change(line))),
+    ]
+    all_files = os.listdir(root)
+    rolled = {}
+    for file in all_files:
+        base, segment = parse_segment_name(file)
+        if segment:
+            rolled.setdefault(base, []).append(segment)
+    bytes_before = bytes_after = 0
+    for text_suffix, binary_suffix, kind, convert in conversions:
+        for file in all_files:
+            if not file.endswith(text_suffix):
+                continue
+            group_id = file[:-len(text_suffix)]
+            text_paths = _segment_files(root, file, rolled)
+            binary_file = f'{group_id}{binary_suffix}'
+            binary_paths = _segment_files(root, binary_file, rolled)
+            bytes_before += sum(os.path.getsize(path) for path in text_paths + binary_paths)
+
+            payloads = []
+            for line in _read_text_file(text_paths):
+                try:
+                    payloads.append(convert(line))
+                except (json.decoder.JSONDecodeError, IndexError):
+                    logging.warning(f'Skipping unreadable line in {file}')
+            # records already written in the binary format are newer than the text ones
+            payloads.extend(read_records(binary_paths, kind))
+
+            binary_path = os.path.join(root, binary_file)
+            with open(f'{binary_path}.tmp', 'wb') as f:
+                f.write(file_header(kind))
+                for payload in payloads:
+                    f.write(encode_record(payload))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f'{binary_path}.tmp', binary_path)
+            for path in text_paths + binary_paths:
+                if path != binary_path:
+                    os.remove(path)
+            bytes_after += os.path.getsize(binary_path)
+    return bytes_before, bytes_after
@@ -0,0 +1,155 @@
+"""
+Reading a group's files back into memory
+
+the functions below only take file paths so they can run in worker
+processes of the parallel recovery
+"""
+import os
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import server.constants as C
+from server.storage import record_format as RF
+from server.storage.file_manager import FileManager
+from server.storage.utils import clean_message
+
+
+def group_file_paths(file_manager: FileManager, group_id):
+    return {
+        'text_messages': file_manager.segment_paths(f'{group_id}{C.TEXT_MESSAGES_FILE_SUFFIX}'),
+        'messages': file_manager.segment_paths(f'{group_id}{C.MESSAGES_FILE_SUFFIX}'),
+        'text_change_log': file_manager.segment_paths(f'{group_id}{C.TEXT_CHANGE_LOG_FILE_SUFFIX}'),
+        'change_log': file_manager.segment_paths(f'{group_id}{C.CHANGE_LOG_FILE_SUFFIX}'),
+        'checkpoint': os.path.join(file_manager.root, f'{group_id}{C.CHECKPOINT_FILE_SUFFIX}'),
+    }
+
+
+def read_text_lines(paths):
+    lines = []
+    for path in paths:
+        with open(path, 'r') as f:
+            lines.extend(line for line in f.read().split('\n') if line)
+    return lines
+
+
+def read_messages(paths):
+    """
+    yields every stored version of the group's messages, oldest first
+    """
+    for line in read_text_lines(paths['text_messages']):
+        try:
+            message = json.loads(line)
+        except json.decoder.JSONDecodeError:
+            continue
+        clean_message(message)
+        yield message
+    for payload in RF.read_records(paths['messages'], RF.RECORD_KIND_MESSAGE):
+        yield RF.record_to_message(payload)
+
+
+def read_change_log(paths, skip=0):
+    """
+    returns the group's change log entries after the first skip entries
+    """
+    lines = read_text_lines(paths['text_change_log'])
+    changes = [RF.text_to_change(line) for line in lines[skip:]]
+    skip = max(0, skip - len(lines))
+    changes.extend(RF.record_to_change(payload) for payload in RF.read_records(paths['change_log'], RF.RECORD_KIND_CHANGE_LOG, skip=skip))
+    return changes
+
+
+def load_checkpoint(path):
+    """
+    returns (change log offset, message ids) of the group's latest checkpoint
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                checkpoint = json.load(f)
+            return checkpoint['offset'], checkpoint['message_ids']
+        except (json.decoder.JSONDecodeError, KeyError):
+            logging.warning(f'Ignoring unreadable checkpoint {path}')
+    return 0, []
+
+
+def replay_change_log(changes, message_ids=()):
+    """
+    rebuilds the ordered message id list from the change log linked list edits
+    applied on top of message_ids
+    """
+    first_message_id = last_message_id = None
+    message_tree = {}
+    for message_id in message_ids:
+        if last_message_id is None:
+            first_message_id = message_id
+        else:
+            message_tree[last_message_id] = message_id
+        message_tree[message_id] = None
+        last_message_id = message_id
+    for change in changes:
+        message_id = change['message_id']
+        if first_message_id is None:
+            first_message_id = last_message_id = message_id
+            message_tree[message_id] = None
+        elif change['type'] == C.CHANGE_LOG_INSERT:
+            previous_message_id = change['previous_message_id']
+            if previous_message_id == C.NEGATIVE_MESSAGE_INDEX:
+                message_tree[message_id] = first_message_id
+                first_message_id = message_id
+            else:
+                message_tree[message_id] = message_tree[previous_message_id]
+                message_tree[previous_message_id] = message_id
+                if previous_message_id == last_message_id:
+                    last_message_id = message_id
+        elif change['type'] == C.CHANGE_LOG_APPEND:
+            message_tree[last_message_id] = message_id
+            message_tree[message_id] = None
+            last_message_id = message_id
+        else:
+            raise Exception("Unknown Log")
+    message_ids = []
+    current_link = first_message_id
+    while current_link:
+        message_ids.append(current_link)
+        current_link = message_tree.get(current_link)
+    return message_ids
+
+
+def load_group(paths):
+    """
+    parses one group's files
+    returns latest version of every message, ordered message ids,
+    number of change log entries, offset of the checkpoint used and
+    number of superseded message versions on disk
+    """
+    messages = {}
+    versions = 0
+    for message in read_messages(paths):
+        messages[message['message_id']] = message
+        versions += 1
+    offset, message_ids = load_checkpoint(paths['checkpoint'])
+    changes = read_change_log(paths, skip=offset)
+    return {
+        'messages': messages,
+        'message_ids': replay_change_log(changes, message_ids),
+        'change_log_length': offset + len(changes),
+        'checkpoint_offset': offset,
+        'superseded_versions': versions - len(messages)
+    }
+
+
+def load_groups_parallel(paths_by_group, workers):
+    """
+    parses the given groups in a pool of worker processes
+    yields (group_id, group data) as groups finish
+    """
+    group_ids = list(paths_by_group)
+    # spawn, the parent already runs writer threads that must not be forked
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        chunksize = max(1, len(group_ids) // (workers * 4))
+        results = executor.map(load_group, [paths_by_group[group_id] for group_id in group_ids], chunksize=chunksize)
+        for group_id, data in zip(group_ids, results):
+            yield group_id, data
@@ -0,0 +1,507 @@
+"""
+SQLite storage backend
+
+messages, the per-group ordering and the change logs live in one SQLite
+database in WAL mode, only group metadata and sessions are kept in memory.
+The ordering table keeps a gapped integer sort key per message so an out of
+order message is placed between its neighbours without touching other rows,
+the group's keys are renumbered only when a gap is used up.
+"""
+import os
+import copy
+import json
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import server.constants as C
+from server.storage import record_format as RF
+from server.storage.data_store import Datastore
+from server.storage.file_manager import FileManager
+from server.storage.membership import Membership, list_delta
+from server.storage.change_log import superseded
+from server.storage.utils import get_timestamp, get_monotonically_increasing_timestamp, encode_history_cursor, decode_history_cursor
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_id TEXT PRIMARY KEY,
+    creation_time INTEGER,
+    updated_time INTEGER,
+    users TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ordering (
+    group_id TEXT NOT NULL,
+    sort_key INTEGER NOT NULL,
+    message_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ordering_group_sort_key ON ordering (group_id, sort_key);
+CREATE INDEX IF NOT EXISTS ordering_message_id ON ordering (message_id);
+CREATE TABLE IF NOT EXISTS change_log (
+    group_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    message_id TEXT,
+    previous_message_id TEXT,
+    creation_time INTEGER,
+    users_delta TEXT,
+    PRIMARY KEY (group_id, position)
+);
+"""
+
+_SYNCHRONOUS = {
+    C.DURABILITY_NONE: 'OFF',
+    C.DURABILITY_FLUSH: 'NORMAL',
+    C.DURABILITY_FSYNC_PER_BATCH: 'FULL',
+    C.DURABILITY_FSYNC_PER_MESSAGE: 'FULL',
+}
+
+
+class SqliteMessages():
+    """
+    read only message_id -> message view of the messages table
+    """
+    def __init__(self, store) -> None:
+        self.store = store
+
+    def get(self, key):
+        row = self.store.reader().execute('SELECT body FROM messages WHERE message_id = ?', (key,)).fetchone()
+        if row is not None:
+            return RF.record_to_message(row[0])
+
+    def __getitem__(self, key):
+        message = self.get(key)
+        if message is None:
+            raise KeyError(key)
+        return message
+
+    def __contains__(self, key):
+        return self.store.reader().execute('SELECT 1 FROM messages WHERE message_id = ?', (key,)).fetchone() is not None
+
+
+class SqliteDatastore(Datastore):
+    """
+    Datastore keeping messages, ordering and change logs in SQLite.
+
+    Message ordering and update causality are the ones of Datastore, only
+    the storage methods are replaced. Every saved message is written in a
+    single transaction together with its ordering row and change log entry.
+    """
+    def __init__(self, file_manager: FileManager, server_id=None, sessions={}, path=None, ordering=C.ORDERING_MODE) -> None:
+        self.path = path or os.path.join(file_manager.root, C.SQLITE_DB_FILE)
+        super().__init__(file_manager, server_id=server_id, sessions=sessions, lazy_recovery=False, message_storage=C.MESSAGE_STORAGE_MEMORY, compaction=False, ordering=ordering)
+
+    def open_storage(self, compaction):
+        """
+        opens the database instead of recovering the flat files, there are no message files to compact
+        """
+        self.synchronous = _SYNCHRONOUS[self.file_manager.durability]
+        self._db_lock = threading.Lock()
+        self._db = self._connect()
+        self._db.executescript(_SCHEMA)
+        self.migrate_schema()
+        self._local = threading.local()
+        self._readers = []
+        self.messages = SqliteMessages(self)
+        # change log lengths of the open transaction
+        self._pending_lengths = {}
+        self.load_groups()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(f'PRAGMA synchronous={self.synchronous}')
+        return db
+
+    def reader(self):
+        """
+        returns the calling thread's read connection, WAL readers do not block the writer
+        """
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._connect()
+            self._local.db = db
+            with self._db_lock:
+                self._readers.append(db)
+        return db
+
+    @contextmanager
+    def transaction(self):
+        """
+        change log lengths counted by append_change are published once the transaction committed
+        """
+        with self._db_lock:
+            self._pending_lengths = {}
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            self.change_log_lengths.update(self._pending_lengths)
+
+    def close(self):
+        super().close()
+        with self._db_lock:
+            for db in self._readers:
+                db.close()
+            self._readers.clear()
+            self._db.close()
+
+    def migrate_schema(self):
+        """
+        adds the columns newer versions need to databases made by older ones
+        """
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(change_log)')]
+        if 'users_delta' not in columns:
+            self._db.execute('ALTER TABLE change_log ADD COLUMN users_delta TEXT')
+
+    def load_groups(self):
+        """
+        loads group metadata and change log lengths, messages stay in the database
+        """
+        for group_id, creation_time, updated_time, users in self._db.execute('SELECT group_id, creation_time, updated_time, users FROM groups'):
+            users = json.loads(users)
+            self.groups[group_id] = {
+                'group_id': group_id,
+                'users': users,
+                'membership': Membership(users),
+                'creation_time': creation_time,
+                'updated_time': updated_time
+            }
+        for group_id, length in self._db.execute('SELECT group_id, MAX(position) + 1 FROM change_log GROUP BY group_id'):
+            self.change_log_lengths[group_id] = length
+
+    def save_group(self, db, group):
+        db.execute(
+            'INSERT OR REPLACE INTO groups (group_id, creation_time, updated_time, users) VALUES (?, ?, ?, ?)',
+            (group['group_id'], group['creation_time'], group['updated_time'], json.dumps(group['users']))
+        )
+
+    def append_change(self, db, group_id, change):
+        position = self._pending_lengths.get(group_id, self.change_log_lengths.get(group_id, 0))
+        db.execute(
+            'INSERT INTO change_log (group_id, position, type, message_id, previous_message_id, creation_time, users_delta) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (group_id, position, change['type'], change.get('message_id'), change.get('previous_message_id'), change.get('creation_time'),
+             json.dumps({'joined': change['joined'], 'left': change['left'], 'version': change['version']}) if 'joined' in change else None)
+        )
+        self._pending_lengths[group_id] = position + 1
+
+    def get_group(self, group_id):
+        return self.groups.get(group_id)
+
+    def create_group(self, group_id, users={}, creation_time=None):
+        if creation_time is None:
+            creation_time = get_monotonically_increasing_timestamp()
+        with self.get_group_lock(group_id=group_id):
+            users = copy.deepcopy(users)
+            group = {
+                'group_id': group_id,
+                'users': users,
+                'membership': Membership(users),
+                'creation_time': creation_time,
+                'updated_time': creation_time
+            }
+            with self.transaction() as db:
+                self.save_group(db, group)
+            self.groups[group_id] = group
+            logging.debug(f"Group {group_id} created")
+            return group
+
+    def add_user_to_group(self, group_id, user_id, server_id):
+        with self.get_group_lock(group_id):
+            group = self.groups[group_id]
+            group['users'].setdefault(server_id, []).append(user_id)
+            group['updated_time'] = get_timestamp()
+            change = self.membership_change(group, added=[user_id])
+            with self.transaction() as db:
+                self.save_group(db, group)
+                if change is not None:
+                    self.append_change(db, group_id, change)
+            logging.debug(f"{user_id} joined {group_id}")
+
+    def remove_user_from_group(self, group_id, user_id, server_id):
+        with self.get_group_lock(group_id):
+            group = self.groups[group_id]
+            if user_id not in group['users'].get(server_id, []):
+                return
+            group['users'][server_id].remove(user_id)
+            group['updated_time'] = get_timestamp()
+            change = self.membership_change(group, removed=[user_id])
+            with self.transaction() as db:
+                self.save_group(db, group)
+                if change is not None:
+                    self.append_change(db, group_id, change)
+            logging.debug(f"{user_id} removed from {group_id}")
+
+    def remove_group_participants_server_disconnected(self, server_id):
+        event_group_ids = []
+        for group_id in list(self.groups.keys()):
+            with self.get_group_lock(group_id):
+                group = self.groups.get(group_id)
+                if not group.get('users'):
+                    continue
+                removed = group['users'].get(server_id, [])
+                group['users'][server_id] = []
+                group['updated_time'] = get_timestamp()
+                change = self.membership_change(group, removed=removed)
+                with self.transaction() as db:
+                    self.save_group(db, group)
+                    if change is not None:
+                        self.append_change(db, group_id, change)
+                if change is not None:
+                    event_group_ids.append(group_id)
+        return event_group_ids
+
+    def update_group_meta_data(self, group_id, group_meta_data, incoming_server_id):
+        if self.get_group(group_id) is None:
+            self.create_group(group_id, users={}, creation_time=group_meta_data.get('creation_time'))
+        with self.get_group_lock(group_id=group_id):
+            group = self.groups[group_id]
+            user_list = group_meta_data.get('users', [])
+            existing_list = group['users'].get(incoming_server_id, [])
+            if not len(existing_list + user_list) or Counter(existing_list) == Counter(user_list):
+                return False
+            added, removed = list_delta(existing_list, user_list)
+            group['users'][incoming_server_id] = user_list
+            group['updated_time'] = get_timestamp()
+            change = self.membership_change(group, added, removed)
+            with self.transaction() as db:
+                self.save_group(db, group)
+                if change is not None:
+                    self.append_change(db, group_id, change)
+            logging.info(f"Group {group_id} updated")
+            return change is not None
+
+    def find_insert_position(self, db, group_id, message):
+        """
+        returns the (sort_key, message_id) rows right before and after the
+        position of message in the group's ordering, None at either end
+
+        windows of the ordering are read backwards from the tail, out of
+        order messages usually belong close to it
+        """
+        window = C.SQLITE_ORDERING_WINDOW
+        upper = next_row = None
+        while True:
+            if upper is None:
+                rows = db.execute(
+                    'SELECT o.sort_key, o.message_id, m.body FROM ordering o JOIN messages m ON m.message_id = o.message_id '
+                    'WHERE o.group_id = ? ORDER BY o.sort_key DESC LIMIT ?', (group_id, window)).fetchall()
+            else:
+                rows = db.execute(
+                    'SELECT o.sort_key, o.message_id, m.body FROM ordering o JOIN messages m ON m.message_id = o.message_id '
+                    'WHERE o.group_id = ? AND o.sort_key < ? ORDER BY o.sort_key DESC LIMIT ?', (group_id, upper, window)).fetchall()
+            rows.reverse()
+            at_start = len(rows) < window
+            if not rows:
+                return None, next_row
+            if at_start or self.determine_message_order(message, RF.record_to_message(rows[0][2])) == 1:
+                break
+            next_row = rows[0][:2]
+            upper = rows[0][0]
+            window *= 2
+        left, right = 0, len(rows)
+        while left < right:
+            mid = (left + right) // 2
+            if self.determine_message_order(message, RF.record_to_message(rows[mid][2])) == 0:
+                right = mid
+            else:
+                left = mid + 1
+        previous_row = rows[left - 1][:2] if left > 0 else None
+        if left < len(rows):
+            next_row = rows[left][:2]
+        return previous_row, next_row
+
+    def renumber_ordering(self, db, group_id):
+        """
+        spreads the group's sort keys SQLITE_SORT_KEY_GAP apart again
+        """
+        message_ids = [row[0] for row in db.execute('SELECT message_id FROM ordering WHERE group_id = ? ORDER BY sort_key', (group_id,))]
+        db.executemany(
+            'UPDATE ordering SET sort_key = ? WHERE group_id = ? AND message_id = ?',
+            [(index * C.SQLITE_SORT_KEY_GAP, group_id, message_id) for index, message_id in enumerate(message_ids)]
+        )
+        logging.debug(f"Renumbered ordering of group {group_id}")
+
+    def sort_key(self, db, group_id, message_id):
+        return db.execute('SELECT sort_key FROM ordering WHERE group_id = ? AND message_id = ?', (group_id, message_id)).fetchone()[0]
+
+    def insert_new_message(self, group_id, message_id, message):
+        with self.get_group_lock(group_id):
+            with self.transaction() as db:
+                # a concurrent retry of the same message got here first
+                if db.execute('SELECT 1 FROM messages WHERE message_id = ?', (message_id,)).fetchone() is not None:
+                    return
+                self.insert_message(db, group_id, message_id, message)
+
+    def insert_message(self, db, group_id, message_id, message):
+        """
+        stores a new message and places it in the group's ordering inside the open transaction
+        """
+        db.execute('INSERT OR REPLACE INTO messages (message_id, group_id, body) VALUES (?, ?, ?)',
+            (message_id, group_id, RF.message_to_record(message)))
+        last = db.execute('SELECT sort_key, message_id FROM ordering WHERE group_id = ? ORDER BY sort_key DESC LIMIT 1', (group_id,)).fetchone()
+        ## If new message timestamp is after the last message add it to the end
+        if last is None or self.message_follows(self.read_message(db, last[1]), message):
+            sort_key = last[0] + C.SQLITE_SORT_KEY_GAP if last is not None else 0
+            change = {
+                "message_id": message_id,
+                "type": C.CHANGE_LOG_APPEND
+            }
+        else:
+            previous_row, next_row = self.find_insert_position(db, group_id, message)
+            if previous_row is None:
+                sort_key = next_row[0] - C.SQLITE_SORT_KEY_GAP
+            elif next_row is None:
+                sort_key = previous_row[0] + C.SQLITE_SORT_KEY_GAP
+            else:
+                if next_row[0] - previous_row[0] < 2:
+                    self.renumber_ordering(db, group_id)
+                    previous_row = (self.sort_key(db, group_id, previous_row[1]), previous_row[1])
+                    next_row = (self.sort_key(db, group_id, next_row[1]), next_row[1])
+                sort_key = (previous_row[0] + next_row[0]) // 2
+            change = {
+                "message_id": message_id,
+                "type": C.CHANGE_LOG_INSERT,
+                "previous_message_id": previous_row[1] if previous_row is not None else C.NEGATIVE_MESSAGE_INDEX
+            }
+        db.execute('INSERT INTO ordering (group_id, sort_key, message_id) VALUES (?, ?, ?)', (group_id, sort_key, message_id))
+        self.append_change(db, group_id, change)
+
+    def read_message(self, db, message_id):
+        """
+        reads a message through the write connection, inside the open transaction
+        """
+        return RF.record_to_message(db.execute('SELECT body FROM messages WHERE message_id = ?', (message_id,)).fetchone()[0])
+
+    def merge_messages(self, group_id, batch):
+        """
+        sorted batch is inserted message by message in one transaction, the
+        gapped sort keys already place a message without moving its neighbours
+        """
+        with self.transaction() as db:
+            for message in batch:
+                self.insert_message(db, group_id, message['message_id'], message)
+
+    def update_message(self, group_id, message_id, message):
+        with self.transaction() as db:
+            db.execute('UPDATE messages SET body = ? WHERE message_id = ?', (RF.message_to_record(message), message_id))
+            self.append_change(db, group_id, {
+                "message_id": message_id,
+                "type": C.CHANGE_LOG_UPDATE,
+            })
+
+    def change_log_lag(self, group_id, change_log_index):
+        if change_log_index is None:
+            return 0
+        return self.change_log_lengths.get(group_id, 0) - change_log_index
+
+    def get_messages(self, group_id, start_index=-10, change_log_index=None, subscriber=None, encoded=False, limit=None, coalesce=False, resync=False, membership_version=None):
+        """
+        called when user wants to quits history or newly joins
+        the change log stays in the database, subscriber positions are not needed
+        encoded: return serialized Message protobufs, serialized per call
+        limit, coalesce, resync, membership_version: as in Datastore.get_messages
+        """
+        group = self.get_group(group_id)
+        if group is None:
+            return []
+
+        db = self.reader()
+        with self.get_group_lock(group_id):
+            messages_list = []
+            end = self.change_log_lengths.get(group_id, 0)
+            if start_index > 0 and not resync:
+                query = ('SELECT c.type, c.message_id, c.previous_message_id, c.creation_time, c.users_delta, m.body FROM change_log c LEFT JOIN messages m ON m.message_id = c.message_id '
+                         'WHERE c.group_id = ? AND c.position >= ? ORDER BY c.position')
+                params = (group_id, change_log_index or 0)
+                if limit is not None:
+                    query += ' LIMIT ?'
+                    params += (limit,)
+                    end = min(end, (change_log_index or 0) + limit)
+                rows = db.execute(query, params).fetchall()
+                if coalesce:
+                    skip = superseded([{'type': row[0], 'message_id': row[1]} for row in rows])
+                    rows = [row for index, row in enumerate(rows) if index not in skip]
+                for change_type, _, previous_message_id, creation_time, users_delta, body in rows:
+                    if change_type in (C.CHANGE_LOG_APPEND, C.CHANGE_LOG_UPDATE):
+                        messages_list.append(RF.record_to_message(body))
+                    elif change_type == C.CHANGE_LOG_INSERT:
+                        message = RF.record_to_message(body)
+                        message['previous_message_id'] = previous_message_id
+                        messages_list.append(message)
+                    elif change_type == C.CHANGE_LOG_USERS_UPDATE:
+                        # entries of older versions carry no delta, the full list stands in for them
+                        if users_delta is None:
+                            messages_list.append(self.participant_list(group))
+                        else:
+                            messages_list.append(self.participant_delta({**json.loads(users_delta), 'creation_time': creation_time}))
+                    else:
+                        raise Exception('Unknown change type')
+            else:
+                if start_index > 0:
+                    start_index = -C.CHANGE_LOG_RESYNC_MESSAGES
+                    messages_list.append(self.resync_marker())
+                query = 'SELECT m.body FROM ordering o JOIN messages m ON m.message_id = o.message_id WHERE o.group_id = ? ORDER BY o.sort_key DESC'
+                params = (group_id,)
+                if start_index < 0:
+                    query += ' LIMIT ?'
+                    params = (group_id, -start_index)
+                snapshot = [RF.record_to_message(body) for body, in db.execute(query, params)]
+                messages_list.extend(reversed(snapshot))
+                if resync or (membership_version is not None and membership_version != group['membership'].version):
+                    messages_list.append(self.participant_list(group))
+            change_log_index = end
+
+        if encoded:
+            messages_list = [RF.message_to_delivery(message, group_id) for message in messages_list]
+        return change_log_index, messages_list
+
+    def release_change_log(self, group_id, subscriber):
+        pass
+
+    def get_history(self, group_id, cursor=None, page_size=C.HISTORY_PAGE_SIZE, direction=C.HISTORY_OLDER):
+        """
+        as Datastore.get_history, the page is read by sort key from the cursor's
+        message on, the index in the cursor is not needed
+        """
+        group = self.get_group(group_id)
+        if group is None:
+            raise Exception(f"Group {group_id} not found")
+
+        older = direction == C.HISTORY_OLDER
+        query = 'SELECT o.message_id, m.body FROM ordering o JOIN messages m ON m.message_id = o.message_id WHERE o.group_id = ?'
+        params = (group_id,)
+        db = self.reader()
+        with self.get_group_lock(group_id):
+            if cursor:
+                message_id, _ = decode_history_cursor(cursor)
+                row = db.execute('SELECT sort_key FROM ordering WHERE group_id = ? AND message_id = ?', (group_id, message_id)).fetchone()
+                if row is None:
+                    raise Exception(f"Message {message_id} of the history cursor not found in group {group_id}")
+                query += ' AND o.sort_key < ?' if older else ' AND o.sort_key > ?'
+                params += (row[0],)
+            # one row more than the page tells whether older messages are left
+            query += ' ORDER BY o.sort_key DESC LIMIT ?' if older else ' ORDER BY o.sort_key LIMIT ?'
+            rows = db.execute(query, params + (page_size + 1,)).fetchall()
+
+        if older:
+            has_older = len(rows) > page_size
+            rows = rows[:page_size]
+            rows.reverse()
+        else:
+            has_older = bool(cursor)
+            rows = rows[:page_size]
+        if not rows:
+            return [], '', cursor if direction == C.HISTORY_NEWER else ''
+        older_cursor = encode_history_cursor(rows[0][0], 0) if has_older else ''
+        newer_cursor = encode_history_cursor(rows[-1][0], 0)
+        return [RF.record_to_message(body) for _, body in rows], older_cursor, newer_cursor
@@ -1,5 +1,16 @@
+import base64
+import json
+import threading
 import uuid
+from collections import ChainMap
 from datetime import datetime
+from types import MappingProxyType
+
+import server.constants as C
+from server.vector_clock import VectorClock
+
+_timestamp_lock = threading.Lock()
+_last_timestamp = 0
 
 def get_unique_id() -> str:
     """
@@ -14,9 +25,41 @@ def get_timestamp() -> int:
     return int(datetime.now().timestamp() * 1_000_000)
 
 
-def get_monotonically_increasing_timestamp():
-    
-    pass
+def get_monotonically_increasing_timestamp() -> int:
+    """
+    returns a unique UTC timestamp in microseconds, strictly increasing across
+    all threads of the process, even if the wall clock steps back
+    replays send the messages after the last server_time a server received,
+    so timestamps of different threads must not interleave
+    """
+    global _last_timestamp
+    now = get_timestamp()
+    with _timestamp_lock:
+        _last_timestamp = max(now, _last_timestamp + 1)
+        return _last_timestamp
+
+def message_view(message, **overlay):
+    """
+    read only view of message with the overlay fields on top, message is not copied
+    """
+    return MappingProxyType(ChainMap(overlay, message))
+
+def encode_history_cursor(message_id, index) -> str:
+    """
+    opaque GetHistory cursor of the message message_id found at index
+    """
+    payload = json.dumps({'m': message_id, 'i': index}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_history_cursor(cursor: str):
+    """
+    returns (message_id, index) of a cursor made by encode_history_cursor
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(payload['m']), int(payload['i'])
+    except (ValueError, KeyError, TypeError):
+        raise Exception(f"Invalid history cursor {cursor}")
 
 def is_valid_message(message):
     
@@ -31,6 +74,15 @@ def clean_message(message: dict):
     if 'server_time' in message:
         message['server_time'] = int(message['server_time'])
 
+    if 'hlc' in message:
+        message['hlc'] = int(message['hlc'])
+    if 'hlc_2' in message:
+        message['hlc_2'] = int(message['hlc_2'])
+    if 'vector_timestamp' in message:
+        message['vector_timestamp'] = VectorClock.of(message['vector_timestamp'])
+    if 'vector_timestamp_2' in message:
+        message['vector_timestamp_2'] = VectorClock.of(message['vector_timestamp_2'])
+
     if "likes" not in message:
         message["likes"] = {}
     
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Fixed width vector clocks
+
+a clock is a tuple of counters indexed by server slot, slots follow the
+numeric order of the server ids. The {server_id: counter} maps of the
+protos and of older JSON files are only built when a message leaves the
+server or is written to disk
+"""
+import server.constants as C
+
+# ServerPoolManager reorders C.SERVER_IDS in place, slots must not depend on it
+SLOT_SERVER_IDS = tuple(sorted(C.SERVER_IDS, key=int))
+SERVER_SLOTS = {server_id: slot for slot, server_id in enumerate(SLOT_SERVER_IDS)}
+
+
+class VectorClock(tuple):
+    __slots__ = ()
+
+    def __new__(cls, counters=None):
+        if counters is None:
+            counters = (0,) * len(SLOT_SERVER_IDS)
+        return super().__new__(cls, counters)
+
+    @classmethod
+    def of(cls, value):
+        """
+        converts a {server_id: counter} map or a list of counters, clocks and None are returned as is
+        """
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            counters = [0] * len(SLOT_SERVER_IDS)
+            for server_id, counter in value.items():
+                counters[SERVER_SLOTS[str(server_id)]] = int(counter)
+            return cls(counters)
+        return cls(int(counter) for counter in value)
+
+    def __repr__(self) -> str:
+        return f'VectorClock({list(self)})'
+
+    def to_dict(self):
+        return dict(zip(SLOT_SERVER_IDS, self))
+
+    def increment(self, server_id):
+        slot = SERVER_SLOTS[str(server_id)]
+        return VectorClock(self[:slot] + (self[slot] + 1,) + self[slot + 1:])
+
+    def merge(self, other):
+        """
+        element wise maximum of both clocks
+        """
+        return VectorClock(map(max, self, other))
+
+    def compare(self, other):
+        """
+        returns 0 if self happened before other, 1 if other happened before self,
+        None if the clocks are equal or concurrent
+        """
+        less = greater = False
+        for counter, other_counter in zip(self, other):
+            if counter < other_counter:
+                less = True
+            elif counter > other_counter:
+                greater = True
+        if less and not greater:
+            return 0
+        if greater and not less:
+            return 1
+        return None
+
+
+def to_map(value):
+    """
+    {server_id: counter} map of a clock for protos, None stays None
+    """
+    if value is None:
+        return None
+    return VectorClock.of(value).to_dict()
+
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+import server.constants as C
+from server.storage.data_store import Datastore
+from server.storage.file_manager import FileManager
+from server.vector_clock import VectorClock
+
+
+@pytest.fixture
+def make_message():
+    """
+    returns a factory of NEW messages of group g
+    """
+    def make(message_id, server_id='1', vector_timestamp=None, text=None, **fields):
+        message = {
+            'group_id': fields.pop('group_id', 'g'),
+            'user_id': f'user{server_id}',
+            'creation_time': fields.pop('creation_time', 1_700_000_000_000_000),
+            'text': text or [f'text of {message_id}'],
+            'message_id': message_id,
+            'likes': {},
+            'message_type': C.NEW,
+            'vector_timestamp': vector_timestamp or {server_id: 1},
+            'server_id': server_id,
+        }
+        message.update(fields)
+        return message
+    return make
+
+
+@pytest.fixture
+def random_messages(make_message):
+    """
+    returns n NEW messages of three servers that only sometimes see each
+    other's clocks, saving them in order makes appends as well as inserts
+    """
+    def make(n, seed=0, group_id='g'):
+        rng = random.Random(seed)
+        clocks = {server_id: {'1': 0, '2': 0, '3': 0} for server_id in ('1', '2', '3')}
+        messages = []
+        for i in range(n):
+            server_id = rng.choice(('1', '2', '3'))
+            clock = clocks[server_id]
+            if rng.random() < 0.3:
+                other = clocks[rng.choice(('1', '2', '3'))]
+                for sid in clock:
+                    clock[sid] = max(clock[sid], other[sid])
+            clock[server_id] += 1
+            messages.append(make_message(f'{group_id}-m{i:04d}', server_id=server_id, vector_timestamp=dict(clock), group_id=group_id))
+        return messages
+    return make
+
+
+@pytest.fixture
+def open_datastore(tmp_path):
+    """
+    returns a factory of Datastores on tmp_path, eager recovery in this
+    process and no background compaction unless asked for, every store is
+    closed at teardown
+    """
+    opened = []
+
+    def open_store(root=None, **kwargs):
+        kwargs.setdefault('lazy_recovery', False)
+        kwargs.setdefault('recovery_workers', 1)
+        kwargs.setdefault('message_storage', C.MESSAGE_STORAGE_MEMORY)
+        kwargs.setdefault('compaction', False)
+        file_manager = FileManager(str(root or tmp_path), **kwargs.pop('file_manager_options', {}))
+        datastore = Datastore(file_manager, server_id='1', **kwargs)
+        opened.append(datastore)
+        return datastore
+
+    yield open_store
+    for datastore in opened:
+        shut_down(datastore)
+
+
+@pytest.fixture
+def close_datastore():
+    """
+    stops a Datastore and flushes its files, e.g. before reopening its root
+    """
+    return shut_down
+
+
+def shut_down(datastore):
+    if getattr(datastore, 'closed', False):
+        return
+    datastore.closed = True
+    datastore.close()
+    datastore.file_manager.close()
+
+
+class PoolManagerDouble:
+    """
+    the parts of ServerPoolManager the servicer uses for local clients,
+    stamps messages as server 1 and keeps what would be sent to other servers
+    """
+    def __init__(self) -> None:
+        self.vector_timestamp = VectorClock()
+        self.sent = []
+
+    def register_callback(self, key, func):
+        pass
+
+    def timestamp_message(self, message):
+        self.vector_timestamp = self.vector_timestamp.increment('1')
+        message['vector_timestamp'] = self.vector_timestamp
+
+    def send_msg_to_connected_servers(self, message, event_type=C.MESSAGE_EVENT):
+        self.sent.append((event_type, message))
+
+
+@pytest.fixture
+def make_servicer(open_datastore):
+    """
+    returns a factory of ChatServerServicers of server 1 on a fresh Datastore
+    """
+    from run_chat_server import ChatServerServicer
+
+    def make(data_store=None, servicer_class=ChatServerServicer, **kwargs):
+        data_store = data_store or open_datastore()
+        return servicer_class(data_store, PoolManagerDouble(), data_store.file_manager, '1', **kwargs)
+    return make
@@ -0,0 +1,80 @@
+import os
+
+from server.storage.append_log import SegmentedAppendLog, parse_segment_name, segment_path
+
+
+def read_all(paths):
+    data = b''
+    for path in paths:
+        with open(path, 'rb') as f:
+            data += f.read()
+    return data
+
+
+def test_segment_names_round_trip():
+    assert segment_path('/data/g_messages.bin', 0) == '/data/g_messages.bin'
+    assert parse_segment_name(os.path.basename(segment_path('/data/g_messages.bin', 3))) == ('g_messages.bin', 3)
+    assert parse_segment_name('g_messages.bin') == ('g_messages.bin', 0)
+
+
+def test_rolls_segments_by_size_and_keeps_order(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path), segment_size=10)
+    records = [f'{i:04d}\n'.encode() for i in range(10)]
+    for record in records:
+        log.append('g.log', record)
+    paths = log.segments('g.log')
+    assert len(paths) == 5
+    assert all(os.path.getsize(path) <= 10 for path in paths)
+    assert read_all(paths) == b''.join(records)
+    log.close()
+
+
+def test_header_starts_every_segment(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path), segment_size=8)
+    log.headers['.bin'] = b'HD'
+    for i in range(4):
+        log.append('g.bin', b'abcd')
+    log.append('g.log', b'abcd')
+    for path in log.segments('g.bin'):
+        with open(path, 'rb') as f:
+            assert f.read().startswith(b'HD')
+    assert read_all(log.segments('g.log')) == b'abcd'
+    log.close()
+
+
+def test_reopened_log_appends_to_the_last_segment(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path), segment_size=10)
+    for i in range(5):
+        log.append('g.log', f'{i:04d}\n'.encode())
+    log.close()
+    log = SegmentedAppendLog(str(tmp_path), segment_size=10)
+    log.append('g.log', b'last\n')
+    paths = log.segments('g.log')
+    assert len(paths) == 3
+    assert read_all(paths).endswith(b'0004\nlast\n')
+    log.close()
+
+
+def test_handles_over_the_limit_are_closed(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path), max_open_files=2)
+    for i in range(5):
+        log.append(f'{i}.log', b'x')
+    assert len(log._handles) == 2
+    for i in range(5):
+        log.append(f'{i}.log', b'y')
+    for i in range(5):
+        assert read_all(log.segments(f'{i}.log')) == b'xy'
+    log.close()
+
+
+def test_roll_and_remove_sealed_segments(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path))
+    assert not log.roll('g.log')
+    log.append('g.log', b'a')
+    assert log.roll('g.log')
+    log.append('g.log', b'b')
+    sealed = log.sealed_segments('g.log')
+    assert read_all(sealed) == b'a'
+    log.remove_segments('g.log', sealed + log.segments('g.log')[-1:])
+    assert read_all(log.segments('g.log')) == b'b'
+    log.close()
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from run_chat_server import AsyncChatServerServicer
+
+
+class ContextDouble:
+    def done(self):
+        return False
+
+    async def abort(self, code, details):
+        raise Exception(details)
+
+
+def cancel_after_first_wait(consume):
+    async def run():
+        task = asyncio.ensure_future(consume())
+        # long enough for the stream to read its backlog and wait for a notify
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await task
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+
+
+def test_cancelled_get_messages_closes_the_stream_and_raises(make_servicer):
+    servicer = make_servicer(servicer_class=AsyncChatServerServicer)
+    servicer.data_store.create_group('g')
+    request = SimpleNamespace(message_start_idx=-10, user_id='alice', group_id='g', session_id='session', membership_version=0)
+
+    async def consume():
+        async for _ in servicer.GetMessages(request, ContextDouble()):
+            pass
+
+    cancel_after_first_wait(consume)
+    assert servicer.get_stream_stats() == {}
+    assert 'session' not in servicer.data_store.get_group('g')['change_log'].cursors
+
+
+def test_cancelled_health_check_ends_the_session_and_raises(make_servicer):
+    servicer = make_servicer(servicer_class=AsyncChatServerServicer)
+    servicer.data_store.create_group('g')
+    servicer.data_store.save_session_info('session', user_id='alice', group_id='g')
+
+    async def requests():
+        yield SimpleNamespace(session_id='session')
+        await asyncio.Event().wait()
+
+    async def consume():
+        await servicer.HealthCheck(requests(), ContextDouble())
+
+    cancel_after_first_wait(consume)
+    assert servicer.data_store.get_session_info('session')['is_active'] is False
@@ -0,0 +1,59 @@
+import bisect
+import random
+
+import pytest
+
+from server.storage.block_list import BlockList
+
+
+@pytest.mark.parametrize('block_size', (1, 2, 3, 8, 1024))
+def test_random_inserts_match_list(block_size):
+    rng = random.Random(block_size)
+    expected = list(range(20))
+    items = BlockList(expected, block_size=block_size)
+    for value in range(20, 600):
+        operation = rng.random()
+        if operation < 0.3:
+            items.append(value)
+            expected.append(value)
+        else:
+            index = rng.randint(-len(expected) - 3, len(expected) + 3)
+            items.insert(index, value)
+            expected.insert(index, value)
+        assert len(items) == len(expected)
+    assert list(items) == expected
+    for index in range(-len(expected), len(expected)):
+        assert items[index] == expected[index]
+    for _ in range(200):
+        start, stop = rng.randint(-700, 700), rng.randint(-700, 700)
+        assert items[start:stop] == expected[start:stop]
+        assert items[start:stop:3] == expected[start:stop:3]
+    assert items[:] == expected
+    assert items[-10:] == expected[-10:]
+
+
+@pytest.mark.parametrize('index', (-1000, 1000))
+def test_out_of_range_index_raises(index):
+    with pytest.raises(IndexError):
+        BlockList(range(10), block_size=4)[index]
+
+
+def test_empty_list():
+    items = BlockList(block_size=4)
+    assert len(items) == 0
+    assert items[:] == []
+    assert items.bisect(lambda item: True) == 0
+    items.insert(5, 'a')
+    assert list(items) == ['a']
+
+
+@pytest.mark.parametrize('block_size', (1, 3, 16))
+def test_bisect_matches_bisect_module(block_size):
+    rng = random.Random(block_size)
+    values = sorted(rng.randint(0, 1000) for _ in range(300))
+    items = BlockList(block_size=block_size)
+    for value in values[::-1]:
+        items.insert(0, value)
+    for probe in range(-5, 1010, 7):
+        assert items.bisect(lambda item: probe < item) == bisect.bisect_right(values, probe)
+        assert items.bisect(lambda item: probe <= item) == bisect.bisect_left(values, probe)
@@ -0,0 +1,53 @@
+import random
+
+import server.constants as C
+from server.storage import recovery
+
+
+def hlc_messages(random_messages, n, seed=0):
+    rng = random.Random(seed)
+    messages = random_messages(n, seed=seed)
+    for message, hlc in zip(messages, rng.sample(range(3 * n), n)):
+        message['hlc'] = hlc
+    return messages
+
+
+def test_bulk_save_matches_sequential_saves(open_datastore, random_messages, tmp_path):
+    messages = hlc_messages(random_messages, 150)
+    sequential = open_datastore(root=tmp_path / 'sequential', ordering=C.ORDERING_HLC)
+    bulk = open_datastore(root=tmp_path / 'bulk', ordering=C.ORDERING_HLC)
+    for message in messages[:50]:
+        sequential.save_message(dict(message))
+        bulk.save_message(dict(message))
+    for message in messages[50:]:
+        sequential.save_message(dict(message))
+    shuffled = [dict(message) for message in messages[50:]]
+    random.Random(2).shuffle(shuffled)
+    bulk.save_messages_bulk('g', shuffled)
+    assert list(bulk.get_group('g')['message_ids']) == list(sequential.get_group('g')['message_ids'])
+
+
+def test_bulk_change_log_replays_to_the_same_ordering(open_datastore, close_datastore, random_messages):
+    messages = random_messages(120)
+    datastore = open_datastore()
+    for message in messages[:60]:
+        datastore.save_message(message)
+    datastore.save_messages_bulk('g', messages[60:])
+    expected = list(datastore.get_group('g')['message_ids'])
+    close_datastore(datastore)
+
+    data = recovery.load_group(recovery.group_file_paths(datastore.file_manager, 'g'))
+    assert data['message_ids'] == expected
+    assert data['change_log_length'] == 120
+
+
+def test_bulk_save_skips_known_messages_and_applies_updates(open_datastore, make_message):
+    datastore = open_datastore()
+    first = make_message('m0', vector_timestamp={'1': 1})
+    datastore.save_message(dict(first))
+    liked = make_message('m0', vector_timestamp={'1': 1}, vector_timestamp_2={'1': 2}, message_type=C.LIKE_COMMANDS[0], likes={'user2': 1})
+    batch = [dict(first), make_message('m1', vector_timestamp={'1': 2}), make_message('m1', vector_timestamp={'1': 2}), liked]
+    datastore.save_messages_bulk('g', batch)
+    assert list(datastore.get_group('g')['message_ids']) == ['m0', 'm1']
+    assert datastore.messages['m0']['likes'] == {'user2': 1}
+    assert datastore.change_log_lengths['g'] == 2
@@ -0,0 +1,117 @@
+import server.constants as C
+from server.storage.change_log import ChangeLog, superseded
+
+
+def change(i, change_type=C.CHANGE_LOG_APPEND, message_id=None):
+    return {'type': change_type, 'message_id': message_id or f'm{i}'}
+
+
+def test_entries_without_subscribers_are_dropped():
+    log = ChangeLog(capacity=100)
+    log.extend(change(i) for i in range(5))
+    assert len(log) == 5
+    assert log.stats()['entries'] == 0
+    assert log.since(0) is None
+    assert log.since(5) == []
+
+
+def test_lagging_cursor_keeps_entries_until_capacity():
+    log = ChangeLog(capacity=10)
+    log.advance('slow', 0)
+    log.advance('fast', 0)
+    for i in range(8):
+        log.append(change(i))
+        log.advance('fast', len(log))
+    assert log.low_water_mark() == 0
+    assert [entry['message_id'] for entry in log.since(0)] == [f'm{i}' for i in range(8)]
+
+    log.advance('slow', 5)
+    assert log.stats()['start'] == 5
+    assert log.since(4) is None
+    assert [entry['message_id'] for entry in log.since(5)] == ['m5', 'm6', 'm7']
+
+    # the slow reader falls behind the capacity and has to resync
+    for i in range(8, 30):
+        log.append(change(i))
+    assert log.stats() == {'entries': 10, 'start': 20, 'end': 30, 'subscribers': 2}
+    assert log.since(5) is None
+    log.advance('slow', len(log))
+    log.advance('fast', len(log))
+    assert log.stats()['entries'] == 0
+
+
+def test_release_lets_entries_go():
+    log = ChangeLog(capacity=100)
+    log.advance('reader', 0)
+    log.extend(change(i) for i in range(3))
+    assert log.stats()['entries'] == 3
+    log.release('reader')
+    assert log.stats() == {'entries': 0, 'start': 3, 'end': 3, 'subscribers': 0}
+
+
+def test_since_limit():
+    log = ChangeLog()
+    log.advance('reader', 0)
+    log.extend(change(i) for i in range(10))
+    assert [entry['message_id'] for entry in log.since(2, limit=3)] == ['m2', 'm3', 'm4']
+    assert len(log.since(8, limit=5)) == 2
+
+
+def test_since_encoded_encodes_each_entry_once():
+    log = ChangeLog()
+    log.advance('a', 0)
+    log.extend(change(i) for i in range(4))
+    calls = []
+
+    def encode(entry):
+        calls.append(entry['message_id'])
+        return entry['message_id'].encode()
+
+    assert log.since_encoded(0, encode) == [b'm0', b'm1', b'm2', b'm3']
+    assert log.since_encoded(1, encode, limit=2) == [b'm1', b'm2']
+    assert calls == ['m0', 'm1', 'm2', 'm3']
+    log.append(change(4))
+    assert log.since_encoded(3, encode) == [b'm3', b'm4']
+    assert calls == ['m0', 'm1', 'm2', 'm3', 'm4']
+
+
+def test_superseded_updates():
+    changes = [
+        change(0, C.CHANGE_LOG_UPDATE, 'a'),
+        change(1, C.CHANGE_LOG_USERS_UPDATE),
+        change(2, C.CHANGE_LOG_UPDATE, 'b'),
+        change(3, C.CHANGE_LOG_UPDATE, 'a'),
+        change(4, C.CHANGE_LOG_USERS_UPDATE),
+    ]
+    assert superseded(changes) == {0}
+
+
+def test_updates_fold_into_the_append_of_the_read():
+    changes = [
+        change(0, C.CHANGE_LOG_APPEND, 'a'),
+        change(1, C.CHANGE_LOG_UPDATE, 'a'),
+        change(2, C.CHANGE_LOG_INSERT, 'b'),
+        change(3, C.CHANGE_LOG_UPDATE, 'c'),
+        change(4, C.CHANGE_LOG_UPDATE, 'a'),
+        change(5, C.CHANGE_LOG_UPDATE, 'b'),
+    ]
+    folded = set()
+    assert superseded(changes, folded) == {1, 4, 5}
+    assert folded == {0, 2}
+
+
+def test_since_encoded_reencodes_folded_appends():
+    log = ChangeLog()
+    log.advance('a', 0)
+    state = {'m0': 1}
+
+    def encode(entry):
+        return f"{entry['message_id']}:{state[entry['message_id']]}".encode()
+
+    log.append(change(0))
+    assert log.since_encoded(0, encode) == [b'm0:1']
+    state['m0'] = 2
+    log.append(change(1, C.CHANGE_LOG_UPDATE, 'm0'))
+    assert log.since_encoded(0, encode, coalesce=True) == [b'm0:2']
+    # readers that do not coalesce keep getting every change
+    assert log.since_encoded(0, encode) == [b'm0:1', b'm0:2']
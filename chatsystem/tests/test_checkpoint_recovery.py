@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import server.constants as C
+from server.storage import recovery
+
+
+@pytest.fixture(autouse=True)
+def small_checkpoint_interval(monkeypatch):
+    monkeypatch.setattr(C, 'CHANGE_LOG_CHECKPOINT_INTERVAL', 7)
+
+
+def save_all(datastore, messages, bulk=False):
+    if bulk:
+        datastore.save_messages_bulk('g', messages)
+        return
+    for message in messages:
+        datastore.save_message(message)
+
+
+@pytest.mark.parametrize('record_format', (C.RECORD_FORMAT_BINARY, C.RECORD_FORMAT_TEXT))
+def test_checkpoint_and_tail_equal_full_replay(tmp_path, open_datastore, close_datastore, random_messages, record_format):
+    datastore = open_datastore(record_format=record_format)
+    messages = random_messages(60)
+    save_all(datastore, messages[:40])
+    save_all(datastore, messages[40:], bulk=True)
+    expected = list(datastore.get_group('g')['message_ids'])
+    close_datastore(datastore)
+
+    paths = recovery.group_file_paths(datastore.file_manager, 'g')
+    from_checkpoint = recovery.load_group(paths)
+    assert from_checkpoint['checkpoint_offset'] > 0
+    assert from_checkpoint['change_log_length'] == 60
+
+    os.remove(paths['checkpoint'])
+    full_replay = recovery.load_group(paths)
+    assert full_replay['checkpoint_offset'] == 0
+    assert full_replay['message_ids'] == from_checkpoint['message_ids'] == expected
+
+
+def test_reopened_store_keeps_ordering_and_checkpoints(tmp_path, open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    messages = random_messages(50)
+    save_all(datastore, messages[:30])
+    close_datastore(datastore)
+
+    reopened = open_datastore()
+    assert reopened.checkpoint_offsets['g'] > 0
+    save_all(reopened, messages[30:])
+    expected = list(reopened.get_group('g')['message_ids'])
+    assert sorted(expected) == sorted(message['message_id'] for message in messages)
+    close_datastore(reopened)
+
+    assert list(open_datastore().get_group('g')['message_ids']) == expected
+
+
+def test_unreadable_checkpoint_falls_back_to_full_replay(tmp_path, open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    save_all(datastore, random_messages(20))
+    expected = list(datastore.get_group('g')['message_ids'])
+    close_datastore(datastore)
+
+    paths = recovery.group_file_paths(datastore.file_manager, 'g')
+    with open(paths['checkpoint'], 'w') as f:
+        f.write('{"offset": 1')
+    data = recovery.load_group(paths)
+    assert data['checkpoint_offset'] == 0
+    assert data['message_ids'] == expected
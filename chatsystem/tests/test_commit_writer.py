@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import server.constants as C
+from server.storage.append_log import SegmentedAppendLog
+from server.storage.commit_writer import CommitWriter
+from server.storage.file_manager import FileManager
+
+
+def read_file(log, file):
+    data = b''
+    for path in log.segments(file):
+        with open(path, 'rb') as f:
+            data += f.read()
+    return data
+
+
+@pytest.mark.parametrize('durability', C.DURABILITY_MODES)
+def test_appends_from_many_threads_keep_per_thread_order(tmp_path, durability):
+    log = SegmentedAppendLog(str(tmp_path))
+    writer = CommitWriter(log, durability=durability, max_batch_size=7)
+
+    def append(thread):
+        for i in range(200):
+            writer.append(f'{thread % 2}.log', f'{thread}:{i}\n'.encode())
+
+    threads = [threading.Thread(target=append, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+    log.close()
+    for file in ('0.log', '1.log'):
+        lines = read_file(log, file).decode().splitlines()
+        assert len(lines) == 400
+        for thread in {int(line.split(':')[0]) for line in lines}:
+            assert [int(line.split(':')[1]) for line in lines if line.startswith(f'{thread}:')] == list(range(200))
+
+
+def test_operations_run_in_order_with_appends(tmp_path):
+    log = SegmentedAppendLog(str(tmp_path))
+    writer = CommitWriter(log)
+    seen = []
+    writer.append('g.log', b'a')
+    def read():
+        log.flush('g.log')
+        seen.append(read_file(log, 'g.log'))
+    writer.submit(read)
+    writer.append('g.log', b'b')
+    writer.drain()
+    assert seen == [b'a']
+    assert read_file(log, 'g.log') == b'ab'
+    writer.close()
+    log.close()
+
+
+def test_unknown_durability_mode_is_rejected(tmp_path):
+    with pytest.raises(Exception):
+        CommitWriter(SegmentedAppendLog(str(tmp_path)), durability='sometimes')
+
+
+@pytest.mark.parametrize('group_commit', [True, False])
+def test_file_manager_reads_its_own_appends(tmp_path, group_commit):
+    file_manager = FileManager(str(tmp_path), group_commit=group_commit)
+    for i in range(50):
+        file_manager.append('g.txt', {'i': i})
+    file_manager.write('g.json', {'group_id': 'g'})
+    assert len(file_manager.readlines('g.txt')) == 50
+    assert file_manager.read('g.json') == '{"group_id": "g"}'
+    file_manager.close()
@@ -0,0 +1,128 @@
+import os
+import threading
+
+import pytest
+
+import server.constants as C
+from server.storage import recovery
+from server.storage.message_store import MappedMessageStore
+
+
+def like(message, user_id, count):
+    liked = dict(message)
+    liked['likes'] = {user_id: count}
+    liked['message_type'] = C.LIKE_COMMANDS[0]
+    return liked
+
+
+@pytest.mark.parametrize('record_format', (C.RECORD_FORMAT_BINARY, C.RECORD_FORMAT_TEXT))
+def test_compact_group_keeps_latest_versions(open_datastore, close_datastore, make_message, record_format):
+    datastore = open_datastore(record_format=record_format)
+    messages = [make_message(f'm{i}', vector_timestamp={'1': i + 1}) for i in range(5)]
+    for message in messages:
+        datastore.save_message(dict(message))
+    for version in range(1, 4):
+        for message in messages[:3]:
+            datastore.update_message('g', message['message_id'], like(message, 'user2', version))
+    paths = recovery.group_file_paths(datastore.file_manager, 'g')
+    key = 'messages' if record_format == C.RECORD_FORMAT_BINARY else 'text_messages'
+    assert recovery.load_group(paths)['superseded_versions'] == 9
+
+    reclaimed = datastore.compactor.compact_group('g')
+    assert reclaimed > 0
+    data = recovery.load_group(recovery.group_file_paths(datastore.file_manager, 'g'))
+    assert data['superseded_versions'] == 0
+    assert {message_id: message['likes'] for message_id, message in data['messages'].items()} == {
+        'm0': {'user2': 3}, 'm1': {'user2': 3}, 'm2': {'user2': 3}, 'm3': {}, 'm4': {}}
+    assert datastore.get_compaction_stats()['compactions'] == 1
+    assert len(recovery.group_file_paths(datastore.file_manager, 'g')[key]) <= 2
+
+
+def test_writes_during_compaction_are_kept(open_datastore, close_datastore, make_message):
+    datastore = open_datastore()
+    for i in range(50):
+        datastore.save_message(make_message(f'm{i}', vector_timestamp={'1': i + 1}))
+    for i in range(50):
+        datastore.update_message('g', f'm{i}', like(make_message(f'm{i}', vector_timestamp={'1': i + 1}), 'user2', 1))
+    writer = threading.Thread(target=lambda: [datastore.save_message(make_message(f'n{i}', vector_timestamp={'1': 100 + i})) for i in range(50)])
+    writer.start()
+    datastore.compactor.compact_group('g')
+    writer.join()
+    close_datastore(datastore)
+
+    reopened = open_datastore()
+    assert len(reopened.get_group('g')['message_ids']) == 100
+    assert all(reopened.messages[f'm{i}']['likes'] == {'user2': 1} for i in range(50))
+
+
+def test_compact_only_groups_over_threshold(open_datastore, make_message):
+    datastore = open_datastore()
+    datastore.compactor.min_superseded = 2
+    for group_id in ('a', 'b'):
+        message = make_message(f'{group_id}0', group_id=group_id)
+        datastore.save_message(dict(message))
+        datastore.update_message(group_id, message['message_id'], like(message, 'user2', 1))
+    datastore.update_message('a', 'a0', like(make_message('a0', group_id='a'), 'user2', 2))
+    datastore.compactor.compact()
+    assert datastore.compactor.superseded == {'b': 1}
+    assert datastore.get_compaction_stats()['compactions'] == 1
+
+
+def store_size(root):
+    return sum(os.path.getsize(os.path.join(root, f)) for f in os.listdir(root))
+
+
+def test_message_store_compaction_drops_superseded_segments(tmp_path, make_message):
+    root = str(tmp_path)
+    store = MappedMessageStore(root, segment_size=1024)
+    for version in range(20):
+        for i in range(5):
+            store[f'm{i}'] = make_message(f'm{i}', text=[f'version {version}'])
+    size_before = store_size(root)
+    segments_before = len(os.listdir(root))
+
+    reclaimed = store.compact(min_garbage_ratio=0.5)
+    assert reclaimed > 0
+    assert store_size(root) == size_before - reclaimed
+    assert len(os.listdir(root)) < segments_before
+    assert all(store[f'm{i}']['text'] == ['version 19'] for i in range(5))
+    store['m0'] = make_message('m0', text=['after compaction'])
+    store.close()
+
+    reopened = MappedMessageStore(root, segment_size=1024)
+    assert sorted(reopened.keys()) == [f'm{i}' for i in range(5)]
+    assert reopened['m0']['text'] == ['after compaction']
+    assert all(reopened[f'm{i}']['text'] == ['version 19'] for i in range(1, 5))
+    reopened.close()
+
+
+def test_message_store_compaction_keeps_live_records(tmp_path, make_message):
+    root = str(tmp_path)
+    store = MappedMessageStore(root, segment_size=600)
+    for i in range(12):
+        store[f'm{i}'] = make_message(f'm{i}')
+    # only the first messages get new versions, older segments stay partly live
+    for version in range(10):
+        store['m0'] = make_message('m0', text=[f'version {version}'])
+    store.compact(min_garbage_ratio=0.1)
+    store.close()
+
+    reopened = MappedMessageStore(root, segment_size=600)
+    assert sorted(reopened.keys()) == sorted(f'm{i}' for i in range(12))
+    assert reopened['m0']['text'] == ['version 9']
+    assert reopened['m11']['message_id'] == 'm11'
+    reopened.compact(min_garbage_ratio=0.0)
+    assert all(reopened[f'm{i}']['message_id'] == f'm{i}' for i in range(12))
+    reopened.close()
+
+
+def test_datastore_compacts_mapped_store(open_datastore, make_message):
+    datastore = open_datastore(message_storage=C.MESSAGE_STORAGE_MMAP)
+    datastore.messages.segment_size = 1024
+    message = make_message('m0')
+    datastore.save_message(dict(message))
+    for version in range(30):
+        datastore.update_message('g', 'm0', like(message, 'user2', version))
+    datastore.compactor.compact()
+    assert datastore.get_compaction_stats()['message_store_bytes_reclaimed'] > 0
+    assert datastore.messages['m0']['likes'] == {'user2': 29}
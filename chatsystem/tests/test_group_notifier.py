@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+from server.group_notifier import GroupNotifier
+
+
+def test_notify_before_wait_is_not_lost():
+    notifier = GroupNotifier()
+    seen = notifier.sequence('g')
+    notifier.notify('g')
+    assert notifier.wait('g', seen, timeout=0) == seen + 1
+
+
+def test_wait_times_out_without_notify():
+    notifier = GroupNotifier()
+    seen = notifier.sequence('g')
+    notifier.notify('other')
+    assert notifier.wait('g', seen, timeout=0.01) == seen
+
+
+def test_every_waiter_wakes():
+    notifier = GroupNotifier()
+    seen = notifier.sequence('g')
+    woken = []
+    threads = [threading.Thread(target=lambda: woken.append(notifier.wait('g', seen, timeout=5))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    notifier.notify('g')
+    for thread in threads:
+        thread.join()
+    assert woken == [seen + 1] * 3
+
+
+def test_wait_async_wakes_on_notify_from_thread():
+    notifier = GroupNotifier()
+
+    async def wait():
+        seen = notifier.sequence('g')
+        waiter = asyncio.ensure_future(notifier.wait_async('g', seen))
+        await asyncio.sleep(0)
+        threading.Thread(target=notifier.notify, args=('g',)).start()
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(wait()) == 1
+
+
+def test_cancelled_async_waiters_are_removed():
+    notifier = GroupNotifier()
+
+    async def cancel_waiters():
+        waiters = [asyncio.ensure_future(notifier.wait_async('g', 0)) for _ in range(3)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        await asyncio.gather(waiters[0], return_exceptions=True)
+        assert len(notifier._async_waiters['g']) == 2
+        for waiter in waiters[1:]:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(cancel_waiters())
+    assert notifier._async_waiters == {}
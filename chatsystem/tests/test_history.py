@@ -0,0 +1,91 @@
+import pytest
+
+import chat_system_pb2
+import server.constants as C
+from server.storage.file_manager import FileManager
+from server.storage.sqlite_store import SqliteDatastore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def history_store(request, open_datastore, tmp_path):
+    if request.param == 'memory':
+        yield open_datastore(ordering=C.ORDERING_HLC)
+        return
+    store = SqliteDatastore(FileManager(str(tmp_path / 'sqlite'), group_commit=False), server_id='1', ordering=C.ORDERING_HLC)
+    yield store
+    store.close()
+    store.file_manager.close()
+
+
+def save(store, make_message, message_id, hlc):
+    store.save_message(make_message(message_id, hlc=hlc))
+
+
+def page_ids(page):
+    return [message['message_id'] for message in page[0]]
+
+
+def test_walk_older_across_inserts(history_store, make_message):
+    for i in range(1, 11):
+        save(history_store, make_message, f'm{i:02d}', i * 10)
+    page = history_store.get_history('g', page_size=3)
+    assert page_ids(page) == ['m08', 'm09', 'm10']
+    seen = page_ids(page)
+    # out-of-order messages land next to pages already read and pages still ahead
+    save(history_store, make_message, 'x85', 85)
+    save(history_store, make_message, 'x15', 15)
+    while page[1]:
+        page = history_store.get_history('g', cursor=page[1], page_size=3)
+        seen = page_ids(page) + seen
+    assert seen == ['m01', 'x15', 'm02', 'm03', 'm04', 'm05', 'm06', 'm07', 'm08', 'm09', 'm10']
+
+    # walking newer from the oldest page picks up the insert behind the first page
+    newer = []
+    cursor = page[2]
+    while True:
+        page = history_store.get_history('g', cursor=cursor, page_size=4, direction=C.HISTORY_NEWER)
+        if not page[0]:
+            break
+        newer.extend(page_ids(page))
+        cursor = page[2]
+    assert newer == ['m02', 'm03', 'm04', 'm05', 'm06', 'm07', 'm08', 'x85', 'm09', 'm10']
+    # the last cursor waits for later messages
+    save(history_store, make_message, 'm11', 110)
+    assert page_ids(history_store.get_history('g', cursor=cursor, direction=C.HISTORY_NEWER)) == ['m11']
+
+
+def test_cursor_of_another_group_fails(history_store, make_message):
+    save(history_store, make_message, 'm01', 10)
+    history_store.save_message(make_message('h01', group_id='h', hlc=20))
+    cursor = history_store.get_history('h')[2]
+    with pytest.raises(Exception):
+        history_store.get_history('g', cursor=cursor)
+
+
+class ContextDouble:
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+
+def test_get_history_rejects_bad_requests(make_servicer, make_message):
+    servicer = make_servicer()
+    servicer.data_store.save_message(make_message('m01'))
+    context = ContextDouble()
+    servicer.GetHistory(chat_system_pb2.HistoryRequest(group_id='g', direction='sideways'), context)
+    assert context.code.name == 'INVALID_ARGUMENT'
+    context = ContextDouble()
+    servicer.GetHistory(chat_system_pb2.HistoryRequest(group_id='missing'), context)
+    assert context.code.name == 'NOT_FOUND'
+    page = servicer.GetHistory(chat_system_pb2.HistoryRequest(group_id='g', page_size=10), ContextDouble())
+    assert [message.message_id for message in page.messages] == ['m01']
+    assert page.older_cursor == ''
+
+
+def test_empty_pages_keep_the_newer_cursor(history_store, make_message):
+    save(history_store, make_message, 'm01', 10)
+    cursor = history_store.get_history('g')[2]
+    assert history_store.get_history('g', cursor=cursor, direction=C.HISTORY_NEWER) == ([], '', cursor)
+    assert history_store.get_history('g', cursor=cursor) == ([], '', '')
@@ -0,0 +1,61 @@
+import threading
+
+import server.constants as C
+
+from server import hlc as hlc_module
+from server.hlc import HybridLogicalClock, physical_time, split
+
+
+def test_now_is_strictly_increasing_when_the_wall_clock_steps_back(monkeypatch):
+    clock = HybridLogicalClock()
+    first = clock.now()
+    monkeypatch.setattr(hlc_module, 'physical_time', lambda: first - (1000 << C.HLC_LOGICAL_BITS))
+    timestamps = [clock.now() for _ in range(100)]
+    assert timestamps == list(range(first + 1, first + 101))
+    assert split(timestamps[-1]) == (split(first)[0], split(first)[1] + 100)
+
+
+def test_update_passes_remote_timestamps():
+    clock = HybridLogicalClock()
+    local = clock.now()
+    remote = local + (5000 << C.HLC_LOGICAL_BITS)
+    received = clock.update(remote)
+    assert received > remote
+    assert clock.now() > received
+    # an older remote timestamp still moves the clock forward
+    assert clock.update(local) > received
+
+
+def test_now_follows_physical_time():
+    clock = HybridLogicalClock()
+    before = physical_time()
+    assert split(clock.now())[0] >= split(before)[0]
+
+
+def test_timestamps_are_unique_across_threads():
+    clock = HybridLogicalClock()
+    results = [[] for _ in range(4)]
+
+    def stamp(out):
+        for i in range(2000):
+            out.append(clock.update(i) if i % 3 == 0 else clock.now())
+
+    threads = [threading.Thread(target=stamp, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for out in results:
+        assert out == sorted(out)
+    timestamps = [timestamp for out in results for timestamp in out]
+    assert len(set(timestamps)) == len(timestamps)
+
+
+def test_causal_messages_order_by_hlc(open_datastore, make_message):
+    datastore = open_datastore(ordering=C.ORDERING_HLC)
+    sender, receiver = HybridLogicalClock(), HybridLogicalClock()
+    first = make_message('m0', server_id='2', hlc=sender.now())
+    reply = make_message('m1', server_id='1', hlc=receiver.update(first['hlc']))
+    datastore.save_message(reply)
+    datastore.save_message(first)
+    assert list(datastore.get_group('g')['message_ids']) == ['m0', 'm1']
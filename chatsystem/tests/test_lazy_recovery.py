@@ -0,0 +1,42 @@
+import server.constants as C
+
+
+def test_groups_load_on_first_access(open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    for group_id in ('a', 'b'):
+        datastore.save_messages_bulk(group_id, random_messages(15, group_id=group_id))
+    expected = {group_id: list(datastore.get_group(group_id)['message_ids']) for group_id in ('a', 'b')}
+    close_datastore(datastore)
+
+    reopened = open_datastore(lazy_recovery=True)
+    assert reopened.unloaded_groups == {'a', 'b'}
+    assert len(reopened.groups.get('a')['message_ids']) == 0
+    assert list(reopened.get_group('a')['message_ids']) == expected['a']
+    assert reopened.unloaded_groups == {'b'}
+    assert reopened.get_messages('b', start_index=-100)[1][-1]['message_id'] == expected['b'][-1]
+    assert not reopened.unloaded_groups
+
+
+def test_lazy_group_accepts_new_messages(open_datastore, close_datastore, random_messages):
+    messages = random_messages(20)
+    datastore = open_datastore()
+    datastore.save_messages_bulk('g', messages[:10])
+    close_datastore(datastore)
+
+    reopened = open_datastore(lazy_recovery=True)
+    for message in messages[10:]:
+        reopened.save_message(message)
+    assert 'g' not in reopened.unloaded_groups
+    assert sorted(reopened.get_group('g')['message_ids']) == sorted(message['message_id'] for message in messages)
+    assert reopened.change_log_lengths['g'] == 20
+
+
+def test_memory_storage_does_not_load_unread_groups(open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    datastore.save_messages_bulk('g', random_messages(5))
+    close_datastore(datastore)
+
+    reopened = open_datastore(lazy_recovery=True, message_storage=C.MESSAGE_STORAGE_MEMORY)
+    assert 'g-m0000' not in reopened.messages
+    reopened.get_group('g')
+    assert 'g-m0000' in reopened.messages
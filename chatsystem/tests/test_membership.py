@@ -0,0 +1,60 @@
+import server.constants as C
+from server.storage.membership import Membership, list_delta
+
+
+def test_list_delta_counts_repeated_user_ids():
+    assert list_delta(['a', 'b', 'b'], ['b', 'c']) == (['c'], ['a', 'b'])
+    assert list_delta(['a'], ['a']) == ([], [])
+
+
+def test_membership_counts_sessions_and_servers():
+    membership = Membership({'1': ['alice', 'bob'], '2': ['alice']})
+    assert sorted(membership.users()) == ['alice', 'bob']
+    assert membership.apply(removed=['alice']) == ([], [])
+    assert 'alice' in membership
+    assert membership.version == 0
+    assert membership.apply(removed=['alice', 'carol']) == ([], ['alice'])
+    assert membership.version == 1
+
+
+def test_joining_and_leaving_in_the_same_change_is_not_a_change():
+    membership = Membership()
+    assert membership.apply(added=['alice'], removed=['alice']) == ([], [])
+    assert 'alice' not in membership
+    assert membership.version == 0
+
+
+def deltas(messages):
+    return [(message['users_joined'], message['users_left'], message['membership_version'])
+            for message in messages if message.get('message_type') == C.PARTICIPANT_DELTA]
+
+
+def test_subscribers_get_deltas(open_datastore):
+    data_store = open_datastore()
+    data_store.create_group('g')
+    index, messages = data_store.get_messages('g', start_index=-10, subscriber='reader', membership_version=0)
+    assert messages == []
+    data_store.add_user_to_group('g', 'alice', server_id='1')
+    data_store.add_user_to_group('g', 'alice', server_id='2')
+    data_store.add_user_to_group('g', 'bob', server_id='1')
+    data_store.remove_user_from_group('g', 'alice', server_id='1')
+    index, messages = data_store.get_messages('g', start_index=1, change_log_index=index, subscriber='reader')
+    assert deltas(messages) == [(['alice'], [], 1), (['bob'], [], 2)]
+    assert data_store.get_participants('g')[1] == 2
+
+    # another server's user list is applied as one delta
+    data_store.update_group_meta_data('g', {'users': ['carol']}, '2')
+    _, messages = data_store.get_messages('g', start_index=1, change_log_index=index, subscriber='reader')
+    assert deltas(messages) == [(['carol'], ['alice'], 3)]
+
+
+def test_first_read_sends_the_list_only_when_outdated(open_datastore):
+    data_store = open_datastore()
+    data_store.create_group('g')
+    data_store.add_user_to_group('g', 'alice', server_id='1')
+    _, version = data_store.get_participants('g')
+    _, messages = data_store.get_messages('g', start_index=-10, membership_version=version)
+    assert messages == []
+    _, messages = data_store.get_messages('g', start_index=-10, membership_version=version - 1)
+    assert [message['message_type'] for message in messages] == [C.PARTICIPANT_LIST]
+    assert messages[0]['users'] == ['alice']
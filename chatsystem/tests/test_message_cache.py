@@ -0,0 +1,69 @@
+import pytest
+
+import server.constants as C
+from server.storage.message_cache import MessageCache
+
+
+def message(creation_time):
+    return {'creation_time': creation_time}
+
+
+def test_lru_evicts_least_recently_used():
+    cache = MessageCache(max_bytes=30, policy=C.MESSAGE_CACHE_POLICY_LRU)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, message(0), 10)
+    cache.get('a')
+    cache.put('d', message(0), 10)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.bytes == 30
+    assert cache.stats()['evictions'] == 1
+
+
+def test_age_evicts_oldest_creation_time_first():
+    cache = MessageCache(max_bytes=30, policy=C.MESSAGE_CACHE_POLICY_AGE)
+    cache.put('new', message(3), 10)
+    cache.put('old', message(1), 10)
+    cache.put('mid', message(2), 10)
+    cache.get('old')
+    cache.put('newest', message(4), 10)
+    assert cache.get('old') is None
+    assert {key for key in ('new', 'mid', 'newest') if cache.get(key) is not None} == {'new', 'mid', 'newest'}
+
+
+def test_replacing_an_entry_updates_its_size_and_age():
+    cache = MessageCache(max_bytes=24, policy=C.MESSAGE_CACHE_POLICY_AGE)
+    cache.put('a', message(1), 10)
+    cache.put('b', message(2), 10)
+    cache.put('a', message(3), 5)
+    assert cache.bytes == 15
+    cache.put('c', message(4), 10)
+    # b is now the oldest, the stale heap entry of a is skipped
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.bytes == 15
+
+
+def test_single_entry_larger_than_budget_is_kept():
+    cache = MessageCache(max_bytes=10)
+    cache.put('big', message(0), 100)
+    assert cache.get('big') is not None
+    cache.put('small', message(0), 1)
+    assert cache.get('big') is None
+    assert len(cache) == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(Exception):
+        MessageCache(policy='random')
+
+
+def test_mapped_datastore_reads_evicted_messages(open_datastore, make_message):
+    data_store = open_datastore(message_storage=C.MESSAGE_STORAGE_MMAP)
+    data_store.messages._cache = MessageCache(max_bytes=200)
+    for i in range(50):
+        data_store.save_message(make_message(f'm{i:02d}', vector_timestamp={'1': i + 1}, text=[f'text {i}']))
+    assert data_store.messages._cache.bytes <= 200
+    _, messages = data_store.get_messages('g', start_index=0)
+    assert [message['text'] for message in messages] == [[f'text {i}'] for i in range(50)]
+    assert data_store.get_message_cache_stats()['evictions'] > 0
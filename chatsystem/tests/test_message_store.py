@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from server.storage import record_format as RF
+from server.storage.message_cache import MessageCache
+from server.storage.message_store import MappedMessageStore
+
+
+def segment_files(root):
+    return sorted(f for f in os.listdir(root) if f.startswith('segment_'))
+
+
+def test_latest_version_survives_reopen(tmp_path, make_message):
+    store = MappedMessageStore(str(tmp_path))
+    for i in range(5):
+        store[f'm{i}'] = make_message(f'm{i}')
+    store['m2'] = make_message('m2', text=['edited'])
+    store.close()
+
+    reopened = MappedMessageStore(str(tmp_path))
+    assert sorted(reopened.keys()) == [f'm{i}' for i in range(5)]
+    assert reopened['m2']['text'] == ['edited']
+    assert 'm5' not in reopened
+    with pytest.raises(KeyError):
+        reopened['m5']
+    reopened.close()
+
+
+def test_segments_roll_and_messages_are_read_back_after_eviction(tmp_path, make_message):
+    store = MappedMessageStore(str(tmp_path), segment_size=400, cache=MessageCache(max_bytes=200))
+    for i in range(20):
+        store[f'm{i}'] = make_message(f'm{i}')
+    assert len(segment_files(str(tmp_path))) > 1
+    assert all(store[f'm{i}']['message_id'] == f'm{i}' for i in range(20))
+    assert store.cache_stats()['evictions'] > 0
+    store.close()
+
+
+@pytest.mark.parametrize('cut', (1, RF.RECORD_HEADER_SIZE + 3, 20))
+def test_torn_tail_is_truncated_before_appending(tmp_path, make_message, cut):
+    root = str(tmp_path)
+    store = MappedMessageStore(root)
+    for i in range(3):
+        store[f'm{i}'] = make_message(f'm{i}')
+    store.close()
+    path = os.path.join(root, segment_files(root)[-1])
+    intact_size = os.path.getsize(path)
+    # a crash in the middle of writing m3
+    key = b'm3'
+    payload = len(key).to_bytes(2, 'little') + key + RF.message_to_record(make_message('m3'))
+    with open(path, 'ab') as f:
+        f.write(RF.encode_record(payload)[:cut])
+
+    reopened = MappedMessageStore(root)
+    assert os.path.getsize(path) == intact_size
+    assert 'm3' not in reopened
+    reopened['m4'] = make_message('m4')
+    reopened.close()
+
+    again = MappedMessageStore(root)
+    assert sorted(again.keys()) == ['m0', 'm1', 'm2', 'm4']
+    assert again['m4']['message_id'] == 'm4'
+    again.close()
+
+
+def test_corrupted_record_is_not_indexed(tmp_path, make_message):
+    root = str(tmp_path)
+    store = MappedMessageStore(root)
+    for i in range(3):
+        store[f'm{i}'] = make_message(f'm{i}')
+    store.close()
+    path = os.path.join(root, segment_files(root)[-1])
+    with open(path, 'r+b') as f:
+        f.seek(-3, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-3, os.SEEK_END)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+    reopened = MappedMessageStore(root)
+    assert sorted(reopened.keys()) == ['m0', 'm1']
+    reopened['m2'] = make_message('m2', text=['rewritten'])
+    reopened.close()
+    assert MappedMessageStore(root)['m2']['text'] == ['rewritten']
+
+
+def test_torn_header_of_new_segment_is_rewritten(tmp_path, make_message):
+    root = str(tmp_path)
+    MappedMessageStore(root).close()
+    path = os.path.join(root, segment_files(root)[-1])
+    with open(path, 'r+b') as f:
+        f.truncate(3)
+    store = MappedMessageStore(root)
+    store['m0'] = make_message('m0')
+    store.close()
+    assert MappedMessageStore(root)['m0']['message_id'] == 'm0'
@@ -0,0 +1,33 @@
+import pytest
+
+import chat_system_pb2
+import server.constants as C
+from server.storage import record_format as RF
+from server.storage.utils import message_view
+
+
+def test_view_overlays_without_copying(make_message):
+    message = make_message('m1')
+    view = message_view(message, previous_message_id='m0')
+    assert view['previous_message_id'] == 'm0'
+    assert view['text'] == message['text']
+    assert view.get('missing') is None
+    assert 'previous_message_id' not in message
+    # later changes of the stored message show through
+    message['likes'] = {'user2': 1}
+    assert view['likes'] == {'user2': 1}
+    with pytest.raises(TypeError):
+        view['text'] = ['changed']
+
+
+def test_delivered_insert_carries_previous_message_id(open_datastore, make_message):
+    data_store = open_datastore()
+    data_store.save_message(make_message('m1', server_id='2', vector_timestamp={'2': 1}))
+    index, _ = data_store.get_messages('g', start_index=-10, subscriber='reader')
+    data_store.save_message(make_message('m0', server_id='1', vector_timestamp={'1': 1}))
+    _, payloads = data_store.get_messages('g', start_index=1, change_log_index=index, subscriber='reader', encoded=True)
+    delivered = chat_system_pb2.Message.FromString(payloads[0])
+    assert delivered.message_id == 'm0'
+    assert delivered.previous_message_id == C.NEGATIVE_MESSAGE_INDEX
+    assert 'previous_message_id' not in data_store.messages['m0']
+    assert RF.message_to_client(data_store.messages['m0'], 'g').previous_message_id == ''
@@ -0,0 +1,33 @@
+from server.storage import recovery
+
+
+def test_parallel_recovery_equals_sequential(open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    group_ids = [f'group{i}' for i in range(5)]
+    for seed, group_id in enumerate(group_ids):
+        messages = random_messages(30, seed=seed, group_id=group_id)
+        datastore.save_messages_bulk(group_id, messages[:20])
+        for message in messages[20:]:
+            datastore.save_message(message)
+    close_datastore(datastore)
+
+    sequential = open_datastore(recovery_workers=1)
+    parallel = open_datastore(recovery_workers=3)
+    for group_id in group_ids:
+        assert list(parallel.get_group(group_id)['message_ids']) == list(sequential.get_group(group_id)['message_ids'])
+        assert parallel.change_log_lengths[group_id] == sequential.change_log_lengths[group_id] == 30
+        for message_id in sequential.get_group(group_id)['message_ids']:
+            assert parallel.messages[message_id] == sequential.messages[message_id]
+
+
+def test_load_groups_parallel_yields_every_group(open_datastore, close_datastore, random_messages):
+    datastore = open_datastore()
+    for seed in range(3):
+        datastore.save_messages_bulk(f'group{seed}', random_messages(10, seed=seed, group_id=f'group{seed}'))
+    close_datastore(datastore)
+
+    paths_by_group = {group_id: recovery.group_file_paths(datastore.file_manager, group_id) for group_id in ('group0', 'group1', 'group2')}
+    loaded = dict(recovery.load_groups_parallel(paths_by_group, workers=2))
+    assert set(loaded) == set(paths_by_group)
+    for group_id, paths in paths_by_group.items():
+        assert loaded[group_id]['message_ids'] == recovery.load_group(paths)['message_ids']
@@ -0,0 +1,46 @@
+import chat_system_pb2
+import server.constants as C
+from server import snowflake
+
+
+def post(servicer, message_id, text='hello'):
+    request = chat_system_pb2.Message(group_id='g', user_id='alice', text=[text], message_id=message_id, message_type=C.NEW)
+    return servicer.PostMessage(request, None)
+
+
+def group_messages(servicer):
+    return [servicer.data_store.messages[message_id] for message_id in servicer.data_store.get_group('g')['message_ids']]
+
+
+def test_retried_post_is_stored_once(make_servicer):
+    servicer = make_servicer()
+    assert post(servicer, 'client-id-1').status
+    assert post(servicer, 'client-id-1').status
+    messages = group_messages(servicer)
+    assert len(messages) == 1
+    assert snowflake.from_string(messages[0]['message_id']) is not None
+    # the retry is not replicated again either
+    assert len(servicer.spm.sent) == 1
+
+
+def test_distinct_posts_get_increasing_snowflake_ids(make_servicer):
+    servicer = make_servicer()
+    for i in range(5):
+        post(servicer, f'client-id-{i}', text=f'message {i}')
+    post(servicer, '', text='without client id')
+    messages = group_messages(servicer)
+    assert [message['text'] for message in messages] == [[f'message {i}'] for i in range(5)] + [['without client id']]
+    message_ids = [message['message_id'] for message in messages]
+    assert message_ids == sorted(message_ids)
+    assert len(set(message_ids)) == 6
+
+
+def test_posted_id_map_is_bounded(make_servicer, monkeypatch):
+    monkeypatch.setattr(C, 'POSTED_MESSAGE_IDS_SIZE', 3)
+    servicer = make_servicer()
+    first = servicer.posted_message_id('a')
+    for client_id in ('b', 'c'):
+        servicer.posted_message_id(client_id)
+    assert servicer.posted_message_id('a') == first
+    servicer.posted_message_id('d')
+    assert list(servicer.posted_message_ids) == ['c', 'a', 'd']
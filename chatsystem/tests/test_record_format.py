@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+import server.constants as C
+from server.storage import record_format as RF
+from server.vector_clock import VectorClock
+
+
+def make_message(i):
+    return {
+        'group_id': 'g',
+        'user_id': f'user{i}',
+        'creation_time': 1_700_000_000_000_000 + i,
+        'text': [f'message {i}'],
+        'message_id': f'm{i:04d}',
+        'likes': {'user9': 1} if i % 2 else {},
+        'message_type': 'new',
+        'vector_timestamp': {'1': i, '2': 1},
+        'server_id': '1',
+    }
+
+
+def write_records(path, payloads, kind=RF.RECORD_KIND_MESSAGE):
+    with open(path, 'wb') as f:
+        f.write(RF.file_header(kind))
+        for payload in payloads:
+            f.write(RF.encode_record(payload))
+
+
+def test_message_round_trip():
+    message = make_message(3)
+    decoded = RF.record_to_message(RF.message_to_record(message))
+    assert decoded['message_id'] == message['message_id']
+    assert decoded['text'] == message['text']
+    assert decoded['likes'] == message['likes']
+    assert decoded['creation_time'] == message['creation_time']
+    assert decoded['vector_timestamp'] == VectorClock.of(message['vector_timestamp'])
+
+
+def test_change_round_trip():
+    change = {'type': C.CHANGE_LOG_INSERT, 'message_id': 'm2', 'previous_message_id': 'm1'}
+    assert RF.record_to_change(RF.change_to_record(change)) == change
+    assert RF.text_to_change('INSERT:m2:m1') == change
+
+
+def test_read_records_across_segments_with_skip(tmp_path):
+    payloads = [RF.message_to_record(make_message(i)) for i in range(6)]
+    paths = [str(tmp_path / 'a'), str(tmp_path / 'b')]
+    write_records(paths[0], payloads[:3])
+    write_records(paths[1], payloads[3:])
+    assert list(RF.read_records(paths, RF.RECORD_KIND_MESSAGE)) == payloads
+    assert list(RF.read_records(paths, RF.RECORD_KIND_MESSAGE, skip=4)) == payloads[4:]
+
+
+def test_torn_tail_stops_reading(tmp_path):
+    payloads = [RF.message_to_record(make_message(i)) for i in range(3)]
+    path = str(tmp_path / 'g')
+    write_records(path, payloads)
+    with open(path, 'ab') as f:
+        f.write(RF.encode_record(payloads[0])[:-5])
+    assert list(RF.read_records([path], RF.RECORD_KIND_MESSAGE)) == payloads
+
+
+def test_crc_mismatch_stops_reading(tmp_path):
+    payloads = [RF.message_to_record(make_message(i)) for i in range(3)]
+    path = str(tmp_path / 'g')
+    write_records(path, payloads)
+    # flip a byte inside the second payload
+    offset = RF.FILE_HEADER_SIZE + RF.RECORD_HEADER_SIZE + len(payloads[0]) + RF.RECORD_HEADER_SIZE + 2
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xff]))
+    assert list(RF.read_records([path], RF.RECORD_KIND_MESSAGE)) == payloads[:1]
+
+
+def test_wrong_record_kind_is_rejected(tmp_path):
+    path = str(tmp_path / 'g')
+    write_records(path, [b'x'], kind=RF.RECORD_KIND_CHANGE_LOG)
+    with pytest.raises(Exception):
+        list(RF.read_records([path], RF.RECORD_KIND_MESSAGE))
+
+
+def test_convert_text_files(tmp_path):
+    root = str(tmp_path)
+    messages = [make_message(i) for i in range(3)]
+    with open(os.path.join(root, f'g{C.TEXT_MESSAGES_FILE_SUFFIX}'), 'w') as f:
+        for message in messages:
+            f.write(json.dumps(message) + '\n')
+    with open(os.path.join(root, f'g{C.TEXT_CHANGE_LOG_FILE_SUFFIX}'), 'w') as f:
+        f.write('APPEND:m0000\nINSERT:m0001:m0000\n')
+    RF.convert_text_files(root)
+    assert not os.path.exists(os.path.join(root, f'g{C.TEXT_MESSAGES_FILE_SUFFIX}'))
+    decoded = [RF.record_to_message(payload) for payload in RF.read_records([os.path.join(root, f'g{C.MESSAGES_FILE_SUFFIX}')], RF.RECORD_KIND_MESSAGE)]
+    assert [message['message_id'] for message in decoded] == ['m0000', 'm0001', 'm0002']
+    changes = [RF.record_to_change(payload) for payload in RF.read_records([os.path.join(root, f'g{C.CHANGE_LOG_FILE_SUFFIX}')], RF.RECORD_KIND_CHANGE_LOG)]
+    assert changes[1] == {'type': 'INSERT', 'message_id': 'm0001', 'previous_message_id': 'm0000'}
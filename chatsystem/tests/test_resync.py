@@ -0,0 +1,112 @@
+import pytest
+
+import chat_system_pb2
+import server.constants as C
+from server.storage.file_manager import FileManager
+from server.storage.sqlite_store import SqliteDatastore
+
+
+class ClientView:
+    """
+    the message list the clients build from a GetMessages stream
+    """
+    def __init__(self) -> None:
+        self.message_ids = []
+        self.messages = {}
+        self.resyncs = 0
+
+    def apply(self, payloads):
+        for payload in payloads:
+            message = chat_system_pb2.Message.FromString(payload)
+            if message.message_type == C.RESYNC:
+                self.message_ids, self.messages = [], {}
+                self.resyncs += 1
+                continue
+            if message.message_type in (C.PARTICIPANT_LIST, C.PARTICIPANT_DELTA):
+                continue
+            previous_message_id = message.previous_message_id
+            if previous_message_id and previous_message_id != C.NEGATIVE_MESSAGE_INDEX and previous_message_id not in self.messages:
+                continue
+            if message.message_id not in self.messages:
+                if not previous_message_id:
+                    self.message_ids.append(message.message_id)
+                elif previous_message_id == C.NEGATIVE_MESSAGE_INDEX:
+                    self.message_ids.insert(0, message.message_id)
+                else:
+                    self.message_ids.insert(self.message_ids.index(previous_message_id) + 1, message.message_id)
+            self.messages[message.message_id] = dict(message.likes)
+
+
+def like(make_message, message_id, version):
+    return make_message(message_id, vector_timestamp={'1': 1000 + version}, vector_timestamp_2={'1': 1000 + version},
+                        message_type=C.LIKE_COMMANDS[0], likes={'user2': version % 2})
+
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(C, 'STREAM_BUFFER_SIZE', 5)
+
+
+def test_client_view_matches_server_after_resync(make_servicer, make_message, small_buffer):
+    servicer = make_servicer(slow_consumer_policy=C.SLOW_CONSUMER_SNAPSHOT)
+    data_store = servicer.data_store
+    for i in range(4):
+        data_store.save_message(make_message(f'm{i:03d}', vector_timestamp={'1': i + 1}))
+    view = ClientView()
+    stats = servicer.open_stream('g', 'alice', 'session')
+    index, payloads = servicer.read_stream(stats, 'g', 'session', -10, None)
+    view.apply(payloads)
+    assert view.message_ids == ['m000', 'm001', 'm002', 'm003']
+
+    # the client misses more than the buffer: new messages and likes of messages it has
+    for i in range(4, 30):
+        data_store.save_message(make_message(f'm{i:03d}', vector_timestamp={'1': i + 1}))
+    data_store.save_message(like(make_message, 'm001', 1))
+    index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+    view.apply(payloads)
+
+    assert view.resyncs == 1
+    server_ids = list(data_store.get_group('g')['message_ids'])[-C.CHANGE_LOG_RESYNC_MESSAGES:]
+    assert view.message_ids == server_ids
+    assert view.messages == {message_id: data_store.messages[message_id]['likes'] for message_id in server_ids}
+
+    # later changes apply on top of the snapshot
+    data_store.save_message(make_message('m030', vector_timestamp={'1': 31}))
+    index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+    view.apply(payloads)
+    assert view.message_ids == server_ids + ['m030']
+
+
+def test_resync_after_change_log_dropped_entries(open_datastore, make_message):
+    data_store = open_datastore()
+    data_store.create_group('g')
+    data_store.get_group('g')['change_log'].capacity = 3
+    index, _ = data_store.get_messages('g', start_index=-10, subscriber='reader')
+    data_store.get_group('g')['change_log'].release('reader')
+    for i in range(6):
+        data_store.save_message(make_message(f'm{i}', vector_timestamp={'1': i + 1}))
+    _, messages = data_store.get_messages('g', start_index=1, change_log_index=index, subscriber='reader')
+    assert messages[0]['message_type'] == C.RESYNC
+    assert [message.get('message_id') for message in messages[1:-1]] == [f'm{i}' for i in range(6)]
+    assert messages[-1]['message_type'] == C.PARTICIPANT_LIST
+
+
+def test_first_read_has_no_resync_marker(open_datastore, make_message):
+    data_store = open_datastore()
+    data_store.save_message(make_message('m0'))
+    _, messages = data_store.get_messages('g', start_index=-10)
+    assert [message['message_type'] for message in messages] == [C.NEW]
+
+
+def test_sqlite_snapshot_starts_with_resync_marker(tmp_path, make_message):
+    store = SqliteDatastore(FileManager(str(tmp_path), group_commit=False), server_id='1')
+    for i in range(15):
+        store.save_message(make_message(f'm{i:02d}', vector_timestamp={'1': i + 1}))
+    _, messages = store.get_messages('g', start_index=1, change_log_index=0, resync=True)
+    assert messages[0]['message_type'] == C.RESYNC
+    assert [message['message_id'] for message in messages[1:-1]] == [f'm{i:02d}' for i in range(5, 15)]
+    assert messages[-1]['message_type'] == C.PARTICIPANT_LIST
+    _, messages = store.get_messages('g', start_index=-3)
+    assert [message['message_id'] for message in messages] == ['m12', 'm13', 'm14']
+    store.close()
+    store.file_manager.close()
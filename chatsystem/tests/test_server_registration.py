@@ -0,0 +1,57 @@
+import asyncio
+from concurrent import futures
+
+import grpc
+
+import chat_system_pb2
+import chat_system_pb2_grpc
+from run_chat_server import AsyncChatServerServicer, add_chat_servicer_to_server
+
+
+def stream_request():
+    return chat_system_pb2.Group(group_id='g', user_id='alice', session_id='session', message_start_idx=-10)
+
+
+def test_sync_server_serves_the_servicer(make_servicer, make_message):
+    servicer = make_servicer()
+    servicer.data_store.save_message(make_message('m1'))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_chat_servicer_to_server(servicer, server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    try:
+        with grpc.insecure_channel(f'localhost:{port}') as channel:
+            stub = chat_system_pb2_grpc.ChatServerStub(channel)
+            page = stub.GetHistory(chat_system_pb2.HistoryRequest(group_id='g'), timeout=5)
+            assert [message.message_id for message in page.messages] == ['m1']
+            # GetMessages streams the serialized messages as they are
+            stream = stub.GetMessages(stream_request(), timeout=5)
+            assert next(stream).message_id == 'm1'
+            stream.cancel()
+        # the stream's thread sees the cancellation on its next wakeup
+        servicer.notifier.notify('g')
+    finally:
+        server.stop(None)
+
+
+def test_async_server_serves_the_servicer(make_servicer, make_message):
+    servicer = make_servicer(servicer_class=AsyncChatServerServicer)
+    servicer.data_store.save_message(make_message('m1'))
+
+    async def run():
+        server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=4))
+        add_chat_servicer_to_server(servicer, server)
+        port = server.add_insecure_port('localhost:0')
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f'localhost:{port}') as channel:
+                stub = chat_system_pb2_grpc.ChatServerStub(channel)
+                page = await stub.GetHistory(chat_system_pb2.HistoryRequest(group_id='g'), timeout=5)
+                assert [message.message_id for message in page.messages] == ['m1']
+                stream = stub.GetMessages(stream_request(), timeout=5)
+                assert (await stream.read()).message_id == 'm1'
+                stream.cancel()
+        finally:
+            await server.stop(None)
+
+    asyncio.run(run())
@@ -0,0 +1,93 @@
+import pytest
+
+import chat_system_pb2
+import server.constants as C
+from server.storage.file_manager import FileManager
+from server.storage.sqlite_store import SqliteDatastore
+
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(C, 'STREAM_BUFFER_SIZE', 5)
+
+
+def open_lagging_stream(make_servicer, make_message, policy, backlog=12):
+    servicer = make_servicer(slow_consumer_policy=policy, coalesce_updates=False)
+    servicer.data_store.save_message(make_message('m00', vector_timestamp={'1': 1}))
+    stats = servicer.open_stream('g', 'alice', 'session')
+    index, _ = servicer.read_stream(stats, 'g', 'session', -10, None)
+    for i in range(1, backlog + 1):
+        servicer.data_store.save_message(make_message(f'm{i:02d}', vector_timestamp={'1': i + 1}))
+    return servicer, stats, index
+
+
+def message_ids(payloads):
+    return [chat_system_pb2.Message.FromString(payload).message_id for payload in payloads]
+
+
+def test_unknown_policy_is_rejected(make_servicer):
+    with pytest.raises(Exception):
+        make_servicer(slow_consumer_policy='drop')
+
+
+def test_block_reads_the_backlog_a_buffer_at_a_time(make_servicer, make_message, small_buffer):
+    servicer, stats, index = open_lagging_stream(make_servicer, make_message, C.SLOW_CONSUMER_BLOCK)
+    reads = []
+    while servicer.data_store.change_log_lag('g', index) > 0:
+        index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+        reads.append(message_ids(payloads))
+    assert [len(read) for read in reads] == [5, 5, 2]
+    assert sum(reads, []) == [f'm{i:02d}' for i in range(1, 13)]
+    assert stats['slow_reads'] == 2
+    assert stats['max_lag'] == 12
+
+
+def test_coalesce_sends_each_liked_message_once(make_servicer, make_message, small_buffer):
+    servicer, stats, index = open_lagging_stream(make_servicer, make_message, C.SLOW_CONSUMER_COALESCE, backlog=0)
+    for version in range(1, 9):
+        servicer.data_store.save_message(make_message('m00', vector_timestamp={'1': 100 + version}, vector_timestamp_2={'1': 100 + version},
+                                                      message_type=C.LIKE_COMMANDS[0], likes={f'user{version}': 1}))
+    index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+    assert message_ids(payloads) == ['m00']
+    assert dict(chat_system_pb2.Message.FromString(payloads[0]).likes) == servicer.data_store.messages['m00']['likes']
+    assert stats['coalesced'] == 7
+    assert servicer.data_store.change_log_lag('g', index) == 0
+
+
+def test_streams_within_the_buffer_are_not_coalesced(make_servicer, make_message, small_buffer):
+    servicer, stats, index = open_lagging_stream(make_servicer, make_message, C.SLOW_CONSUMER_COALESCE, backlog=0)
+    for version in range(1, 4):
+        servicer.data_store.save_message(make_message('m00', vector_timestamp={'1': 100 + version}, vector_timestamp_2={'1': 100 + version},
+                                                      message_type=C.LIKE_COMMANDS[0], likes={f'user{version}': 1}))
+    index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+    assert message_ids(payloads) == ['m00'] * 3
+    assert stats['slow_reads'] == 0
+
+
+def test_disconnect_closes_the_stream(make_servicer, make_message, small_buffer):
+    servicer, stats, index = open_lagging_stream(make_servicer, make_message, C.SLOW_CONSUMER_DISCONNECT)
+    assert servicer.read_stream(stats, 'g', 'session', 1, index) == (index, None)
+    assert stats['slow_reads'] == 1
+
+
+@pytest.mark.parametrize('storage', ['memory', 'sqlite'])
+def test_likes_fold_into_the_new_message(storage, make_servicer, make_message, open_datastore, tmp_path):
+    if storage == 'sqlite':
+        data_store = SqliteDatastore(FileManager(str(tmp_path), group_commit=False), server_id='1')
+    else:
+        data_store = open_datastore()
+    servicer = make_servicer(data_store, coalesce_updates=True)
+    servicer.data_store.create_group('g')
+    stats = servicer.open_stream('g', 'alice', 'session')
+    index, _ = servicer.read_stream(stats, 'g', 'session', -10, None)
+    servicer.data_store.save_message(make_message('m00', vector_timestamp={'1': 1}))
+    for version in range(1, 4):
+        servicer.data_store.save_message(make_message('m00', vector_timestamp={'1': 100 + version}, vector_timestamp_2={'1': 100 + version},
+                                                      message_type=C.LIKE_COMMANDS[0], likes={f'user{version}': 1}))
+    index, payloads = servicer.read_stream(stats, 'g', 'session', 1, index)
+    assert message_ids(payloads) == ['m00']
+    assert dict(chat_system_pb2.Message.FromString(payloads[0]).likes) == {'user3': 1}
+    assert stats['coalesced'] == 3
+    if storage == 'sqlite':
+        data_store.close()
+        data_store.file_manager.close()
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+import server.constants as C
+from server.storage.file_manager import FileManager
+from server.storage.sqlite_store import SqliteDatastore
+
+
+@pytest.fixture
+def open_sqlite(tmp_path):
+    opened = []
+
+    def open_store(ordering=C.ORDERING_VECTOR):
+        file_manager = FileManager(str(tmp_path), group_commit=False)
+        store = SqliteDatastore(file_manager, server_id='1', ordering=ordering)
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
+        store.file_manager.close()
+
+
+def ordering(store, group_id='g'):
+    return [message['message_id'] for message in store.get_messages(group_id, start_index=0)[1]]
+
+
+def test_ordering_matches_file_datastore(open_sqlite, open_datastore, random_messages, tmp_path):
+    # hybrid logical clocks order every pair of messages, so both stores must agree
+    rng = random.Random(1)
+    messages = random_messages(200)
+    for message in messages:
+        message['hlc'] = rng.randint(0, 150)
+    store = open_sqlite(ordering=C.ORDERING_HLC)
+    datastore = open_datastore(root=tmp_path / 'files', ordering=C.ORDERING_HLC)
+    for message in messages:
+        store.save_message(dict(message))
+        datastore.save_message(dict(message))
+    assert ordering(store) == list(datastore.get_group('g')['message_ids'])
+    assert store.change_log_lengths['g'] == 200
+
+
+def test_lengths_and_ordering_survive_reopen(open_sqlite, random_messages):
+    messages = random_messages(30)
+    store = open_sqlite()
+    store.save_messages_bulk('g', messages[:20])
+    expected = ordering(store)
+    store.close()
+
+    reopened = open_sqlite()
+    assert reopened.change_log_lengths['g'] == 20
+    assert ordering(reopened) == expected
+    for message in messages[20:]:
+        reopened.save_message(dict(message))
+    assert reopened.change_log_lengths['g'] == 30
+
+
+def test_rolled_back_transaction_keeps_change_log_length(open_sqlite, make_message):
+    store = open_sqlite()
+    store.save_message(make_message('m0', vector_timestamp={'1': 1}))
+    with pytest.raises(RuntimeError):
+        with store.transaction() as db:
+            store.append_change(db, 'g', {'message_id': 'm0', 'type': C.CHANGE_LOG_UPDATE})
+            raise RuntimeError('fail before commit')
+    assert store.change_log_lengths['g'] == 1
+    # the next change takes the position the rolled back one had
+    store.save_message(make_message('m1', vector_timestamp={'1': 2}))
+    assert store.change_log_lengths['g'] == 2
+    index, messages = store.get_messages('g', start_index=1, change_log_index=0)
+    assert index == 2
+    assert [message['message_id'] for message in messages] == ['m0', 'm1']
+
+
+def test_change_log_read_returns_inserts_and_updates(open_sqlite, make_message):
+    store = open_sqlite()
+    store.save_message(make_message('m1', server_id='2', vector_timestamp={'2': 1}))
+    store.save_message(make_message('m0', server_id='1', vector_timestamp={'1': 1}))
+    liked = make_message('m1', server_id='2', vector_timestamp={'2': 1}, message_type=C.LIKE_COMMANDS[0], likes={'user1': 1}, vector_timestamp_2={'2': 2})
+    store.save_message(liked)
+    index, messages = store.get_messages('g', start_index=1, change_log_index=0)
+    assert index == 3
+    assert [message['message_id'] for message in messages] == ['m1', 'm0', 'm1']
+    assert messages[1]['previous_message_id'] == C.NEGATIVE_MESSAGE_INDEX
+    assert messages[2]['likes'] == {'user1': 1}
+    assert ordering(store) == ['m0', 'm1']
+
+
+def test_inherited_datastore_state(open_sqlite, make_message):
+    store = open_sqlite()
+    store.save_message(make_message('m1'))
+    stats = store.get_compaction_stats()
+    assert stats['compactions'] == 0
+    assert store.unloaded_groups == set()
+    assert store.get_message_cache_stats() is None
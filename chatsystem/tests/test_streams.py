@@ -0,0 +1,32 @@
+def open_and_read(servicer, group_id, session_id):
+    stats = servicer.open_stream(group_id, 'alice', session_id)
+    servicer.read_stream(stats, group_id, session_id, 1, 0)
+    return stats
+
+
+def cursors(servicer, group_id):
+    return servicer.data_store.get_group(group_id)['change_log'].cursors
+
+
+def test_closing_a_replaced_stream_keeps_the_session_cursor(make_servicer):
+    servicer = make_servicer()
+    servicer.data_store.create_group('g')
+    old = open_and_read(servicer, 'g', 'session')
+    new = open_and_read(servicer, 'g', 'session')
+    servicer.close_stream('g', 'session', old)
+    assert 'session' in cursors(servicer, 'g')
+    assert servicer.get_stream_stats()['session']['group_id'] == 'g'
+    servicer.close_stream('g', 'session', new)
+    assert 'session' not in cursors(servicer, 'g')
+    assert servicer.get_stream_stats() == {}
+
+
+def test_closing_a_stream_of_another_group_releases_its_cursor(make_servicer):
+    servicer = make_servicer()
+    for group_id in ('a', 'b'):
+        servicer.data_store.create_group(group_id)
+    old = open_and_read(servicer, 'a', 'session')
+    open_and_read(servicer, 'b', 'session')
+    servicer.close_stream('a', 'session', old)
+    assert 'session' not in cursors(servicer, 'a')
+    assert 'session' in cursors(servicer, 'b')
@@ -0,0 +1,58 @@
+import threading
+
+from server.storage import utils
+from server.storage.utils import get_monotonically_increasing_timestamp
+
+
+def test_timestamps_increase_across_threads():
+    lock = threading.Lock()
+    timestamps = []
+
+    def stamp():
+        for _ in range(2000):
+            # the shared list is in the order the timestamps were handed out
+            with lock:
+                timestamps.append(get_monotonically_increasing_timestamp())
+
+    threads = [threading.Thread(target=stamp) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(earlier < later for earlier, later in zip(timestamps, timestamps[1:]))
+
+
+def test_unique_without_shared_ordering():
+    results = [[] for _ in range(4)]
+
+    def stamp(out):
+        for _ in range(5000):
+            out.append(get_monotonically_increasing_timestamp())
+
+    threads = [threading.Thread(target=stamp, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    timestamps = [timestamp for out in results for timestamp in out]
+    assert len(set(timestamps)) == len(timestamps)
+
+
+def test_wall_clock_stepping_back(monkeypatch):
+    first = get_monotonically_increasing_timestamp()
+    monkeypatch.setattr(utils, 'get_timestamp', lambda: first - 60_000_000)
+    assert [get_monotonically_increasing_timestamp() for _ in range(3)] == [first + 1, first + 2, first + 3]
+    monkeypatch.setattr(utils, 'get_timestamp', lambda: first + 10_000_000)
+    assert get_monotonically_increasing_timestamp() == first + 10_000_000
+
+
+def test_threads_taking_turns_with_a_frozen_clock(monkeypatch):
+    now = get_monotonically_increasing_timestamp() + 1000
+    monkeypatch.setattr(utils, 'get_timestamp', lambda: now)
+    timestamps = []
+    for _ in range(3):
+        for _ in range(2):
+            thread = threading.Thread(target=lambda: timestamps.append(get_monotonically_increasing_timestamp()))
+            thread.start()
+            thread.join()
+    assert timestamps == list(range(now, now + 6))
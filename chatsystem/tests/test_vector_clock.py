@@ -0,0 +1,55 @@
+import random
+
+from server.vector_clock import SLOT_SERVER_IDS, VectorClock, to_map
+
+
+def test_of_accepts_maps_lists_and_clocks():
+    clock = VectorClock.of({'2': 3, 1: 1})
+    assert clock.to_dict() == {'1': 1, '2': 3, '3': 0, '4': 0, '5': 0}
+    assert VectorClock.of(clock) is clock
+    assert VectorClock.of(['1', 3, 0, 0, 0]) == VectorClock((1, 3, 0, 0, 0))
+    assert VectorClock.of(None) is None
+    assert VectorClock() == (0,) * len(SLOT_SERVER_IDS)
+    assert to_map(None) is None
+    assert to_map({'3': 2}) == {'1': 0, '2': 0, '3': 2, '4': 0, '5': 0}
+
+
+def test_increment_and_merge():
+    clock = VectorClock().increment('2').increment('2').increment(5)
+    assert clock.to_dict()['2'] == 2 and clock.to_dict()['5'] == 1
+    assert isinstance(clock, VectorClock)
+    assert VectorClock.of({'1': 4, '2': 1}).merge(VectorClock.of({'1': 2, '2': 3})) == VectorClock.of({'1': 4, '2': 3})
+
+
+def test_compare():
+    older = VectorClock.of({'1': 1})
+    newer = VectorClock.of({'1': 1, '2': 1})
+    concurrent = VectorClock.of({'3': 1})
+    assert older.compare(newer) == 0
+    assert newer.compare(older) == 1
+    assert older.compare(concurrent) is None
+    assert older.compare(older) is None
+
+
+def compare_dicts(clock, other):
+    """
+    the {server_id: counter} comparison the clocks replace
+    """
+    less = any(clock.get(s, 0) < other.get(s, 0) for s in SLOT_SERVER_IDS)
+    greater = any(clock.get(s, 0) > other.get(s, 0) for s in SLOT_SERVER_IDS)
+    if less and not greater:
+        return 0
+    if greater and not less:
+        return 1
+    return None
+
+
+def random_map(rng):
+    return {server_id: rng.randint(0, 3) for server_id in SLOT_SERVER_IDS if rng.random() < 0.7}
+
+
+def test_compare_matches_dict_comparison():
+    rng = random.Random(0)
+    for _ in range(500):
+        clock, other = random_map(rng), random_map(rng)
+        assert VectorClock.of(clock).compare(VectorClock.of(other)) == compare_dicts(clock, other)